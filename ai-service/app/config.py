@@ -23,6 +23,16 @@ load_dotenv()
 
 class Settings:
     PROJECT_NAME: str = "AutoCre8 AI Backend"
+
+    # Production server (python -m app.server): preforked workers, and on SIGTERM
+    # how long to keep serving while /ready fails, then how long in-flight
+    # requests, streams and jobs get to finish
+    HOST: str = os.getenv("HOST", "0.0.0.0")
+    PORT: int = int(os.getenv("PORT", "8000"))
+    # Workers each keep their own in-memory state (see app/server.py); raise with care
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+    DRAIN_DELAY_SECONDS: float = float(os.getenv("DRAIN_DELAY_SECONDS", "5"))
+    GRACEFUL_TIMEOUT_SECONDS: int = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "75"))
     
     # OpenAI
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY")
@@ -33,9 +43,140 @@ class Settings:
     GOOGLE_APPLICATION_CREDENTIALS: str = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
     GOOGLE_LOCATION: str = os.getenv("GOOGLE_LOCATION", "global")
     GOOGLE_MODEL: str = os.getenv("GOOGLE_MODEL","gemini-3-pro-preview")
-    
+    GEMINI_REQUEST_TIMEOUT: float = float(os.getenv("GEMINI_REQUEST_TIMEOUT", "60"))
+
+    # Provider connections (one pool per worker): OpenAI's HTTP pool size and how long
+    # idle connections are kept, the Vertex gRPC keepalive ping interval (Google
+    # rejects much more frequent pings), and refreshing the Google token this long
+    # before it expires. OPENAI_BASE_URL points OpenAI calls elsewhere (a proxy, a stand-in).
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")
+    PROVIDER_POOL_MAX_CONNECTIONS: int = int(os.getenv("PROVIDER_POOL_MAX_CONNECTIONS", "32"))
+    PROVIDER_POOL_MAX_KEEPALIVE: int = int(os.getenv("PROVIDER_POOL_MAX_KEEPALIVE", "16"))
+    PROVIDER_KEEPALIVE_SECONDS: float = float(os.getenv("PROVIDER_KEEPALIVE_SECONDS", "90"))
+    PROVIDER_CONNECT_TIMEOUT: float = float(os.getenv("PROVIDER_CONNECT_TIMEOUT", "5"))
+    VERTEX_GRPC_KEEPALIVE_SECONDS: float = float(os.getenv("VERTEX_GRPC_KEEPALIVE_SECONDS", "300"))
+    GOOGLE_CREDENTIALS_REFRESH_MARGIN_SECONDS: float = float(os.getenv("GOOGLE_CREDENTIALS_REFRESH_MARGIN_SECONDS", "600"))
+    # Ceiling on one provider call per endpoint, SDK retries included ("endpoint=seconds,...")
+    PROVIDER_TIMEOUTS: dict = {
+        name.strip(): float(seconds) for name, _, seconds in (
+            item.partition("=") for item in os.getenv(
+                "PROVIDER_TIMEOUTS", "preview=60,resize=90,assistant=90,conversion=60"
+            ).split(",") if item.strip()
+        )
+    }
+    # Open provider connections and fetch a Google token at worker startup
+    PROVIDER_WARMUP: bool = os.getenv("PROVIDER_WARMUP", "false").lower() == "true"
+    PROVIDER_WARMUP_CONNECTIONS: int = int(os.getenv("PROVIDER_WARMUP_CONNECTIONS", "2"))
+
+    # Model routing: assistant turns and LLM conversions that look simple (small
+    # HTML, a property-level edit, no screenshot, at most ROUTING_MAX_ASSETS assets)
+    # go to the fast model; a fast result that fails validation is redone on the
+    # strong one. Off unless enabled and a fast model is set (e.g. gpt-4o-mini,
+    # gemini-2.5-flash); a provider without one stays on its strong model.
+    MODEL_ROUTING: bool = os.getenv("MODEL_ROUTING", "false").lower() == "true"
+    OPENAI_FAST_MODEL: str = os.getenv("OPENAI_FAST_MODEL", "")
+    GOOGLE_FAST_MODEL: str = os.getenv("GOOGLE_FAST_MODEL", "")
+    ROUTING_MAX_ELEMENTS: int = int(os.getenv("ROUTING_MAX_ELEMENTS", "40"))
+    ROUTING_MAX_HTML_BYTES: int = int(os.getenv("ROUTING_MAX_HTML_BYTES", "16000"))
+    ROUTING_MAX_PROMPT_CHARS: int = int(os.getenv("ROUTING_MAX_PROMPT_CHARS", "300"))
+    ROUTING_MAX_ASSETS: int = int(os.getenv("ROUTING_MAX_ASSETS", "1"))
+
     # LLM Settings
     LLM_TEMPERATURE: float = float(os.getenv("LLM_TEMPERATURE", "0.7"))
     LLM_MAX_TOKENS: int = int(os.getenv("LLM_MAX_TOKENS", "4096"))
 
+    # Compile supported Fabric objects locally, LLM only for the rest
+    NATIVE_PREVIEW_COMPILER: bool = os.getenv("NATIVE_PREVIEW_COMPILER", "true").lower() == "true"
+
+    # Strip Fabric defaults and round numbers in canvas JSON sent to the LLM
+    CANVAS_JSON_COMPACT: bool = os.getenv("CANVAS_JSON_COMPACT", "true").lower() == "true"
+
+    # Check model HTML (container size, positioning, image URLs, truncation), repair
+    # it locally where possible and retry the call once otherwise
+    HTML_VALIDATION: bool = os.getenv("HTML_VALIDATION", "true").lower() == "true"
+
+    # Cache each object's preview fragment by content hash, so a preview only
+    # compiles/translates the objects that changed since an earlier one
+    PREVIEW_FRAGMENT_CACHE: bool = os.getenv("PREVIEW_FRAGMENT_CACHE", "true").lower() == "true"
+    PREVIEW_FRAGMENT_CACHE_MAX_ENTRIES: int = int(os.getenv("PREVIEW_FRAGMENT_CACHE_MAX_ENTRIES", "20000"))
+    PREVIEW_FRAGMENT_CACHE_MAX_BYTES: int = int(os.getenv("PREVIEW_FRAGMENT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+    # Parse our own HTML subset into Fabric objects, LLM only for the rest
+    NATIVE_HTML_PARSER: bool = os.getenv("NATIVE_HTML_PARSER", "true").lower() == "true"
+
+    # Tag preview elements with their source object and reuse the original object when
+    # an element comes back to conversion untouched (per-process LRU)
+    IDENTITY_MAP_ENABLED: bool = os.getenv("IDENTITY_MAP_ENABLED", "true").lower() == "true"
+    IDENTITY_MAP_MAX_ENTRIES: int = int(os.getenv("IDENTITY_MAP_MAX_ENTRIES", "10000"))
+    IDENTITY_MAP_MAX_BYTES: int = int(os.getenv("IDENTITY_MAP_MAX_BYTES", str(64 * 1024 * 1024)))
+    IDENTITY_MAP_TTL_SECONDS: float = float(os.getenv("IDENTITY_MAP_TTL_SECONDS", "86400"))
+
+    # Compute resize variation 1 (proportional scaling) locally, LLM only for variation 2
+    LOCAL_PROPORTIONAL_RESIZE: bool = os.getenv("LOCAL_PROPORTIONAL_RESIZE", "true").lower() == "true"
+
+    # Admission control: concurrent calls and waiting room per provider (429 beyond that)
+    OPENAI_MAX_CONCURRENCY: int = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+    OPENAI_MAX_QUEUE: int = int(os.getenv("OPENAI_MAX_QUEUE", "32"))
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+    GEMINI_MAX_QUEUE: int = int(os.getenv("GEMINI_MAX_QUEUE", "32"))
+    SCHEDULER_MAX_WAIT_SECONDS: float = float(os.getenv("SCHEDULER_MAX_WAIT_SECONDS", "30"))
+
+    # Hedging: re-issue preview/assistant calls on the other provider when the
+    # primary is slower than its HEDGE_PERCENTILE latency (first valid result wins)
+    HEDGING_ENABLED: bool = os.getenv("HEDGING_ENABLED", "false").lower() == "true"
+    HEDGE_PERCENTILE: float = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    HEDGE_DEFAULT_DELAY_SECONDS: float = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "10"))
+    HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "1"))
+
+    # Batch resize: concurrent Gemini calls per batch request
+    GEMINI_BATCH_CONCURRENCY: int = int(os.getenv("GEMINI_BATCH_CONCURRENCY", "4"))
+
+    # Assistant edits come back as element operations applied locally (full HTML on failure)
+    ASSISTANT_PATCH_EDITS: bool = os.getenv("ASSISTANT_PATCH_EDITS", "true").lower() == "true"
+
+    # Assistant chat history: past this budget, older turns become a summary
+    CHAT_HISTORY_TOKEN_BUDGET: int = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "3000"))
+    CHAT_HISTORY_KEEP_TURNS: int = int(os.getenv("CHAT_HISTORY_KEEP_TURNS", "3"))
+    CHAT_HISTORY_SUMMARY_TOKENS: int = int(os.getenv("CHAT_HISTORY_SUMMARY_TOKENS", "400"))
+
+    # Vision inputs: fetched once, downscaled and cached as data URLs
+    ASSET_PIPELINE_ENABLED: bool = os.getenv("ASSET_PIPELINE_ENABLED", "true").lower() == "true"
+    ASSET_MAX_SIDE: int = int(os.getenv("ASSET_MAX_SIDE", "1024"))
+    ASSET_CACHE_MAX_BYTES: int = int(os.getenv("ASSET_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    ASSET_REVALIDATE_SECONDS: float = float(os.getenv("ASSET_REVALIDATE_SECONDS", "300"))
+    ASSET_FETCH_TIMEOUT: float = float(os.getenv("ASSET_FETCH_TIMEOUT", "10"))
+    # Hosts assets may be fetched from ("cdn.example.com,.example.org": a leading dot
+    # allows subdomains); empty allows any host that resolves to a public address.
+    # Downloads larger than ASSET_MAX_FETCH_BYTES are abandoned.
+    ASSET_ALLOWED_HOSTS: list = [h.strip().lower() for h in os.getenv("ASSET_ALLOWED_HOSTS", "").split(",") if h.strip()]
+    ASSET_MAX_FETCH_BYTES: int = int(os.getenv("ASSET_MAX_FETCH_BYTES", str(20 * 1024 * 1024)))
+
+    # Response cache (memory LRU + optional SQLite file)
+    CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+    CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    CACHE_TTL_SECONDS: float = float(os.getenv("CACHE_TTL_SECONDS", "86400"))
+    # Sampled (temperature > 0) results, i.e. resize and the assistant: 0 leaves them
+    # uncached, so asking again gives a new answer rather than the same one
+    CACHE_NONDETERMINISTIC_TTL_SECONDS: float = float(os.getenv("CACHE_NONDETERMINISTIC_TTL_SECONDS", "0"))
+    CACHE_DISK_PATH: str = os.getenv("CACHE_DISK_PATH", "")
+    CACHE_DISK_MAX_BYTES: int = int(os.getenv("CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+    # Comma separated: preview, resize, assistant, conversion
+    CACHE_DISABLED_ENDPOINTS: list = [e.strip() for e in os.getenv("CACHE_DISABLED_ENDPOINTS", "").split(",") if e.strip()]
+
+    # Background jobs (/api/jobs/*): concurrent workers, waiting jobs before 429,
+    # and how long finished results stay retrievable
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_MAX_PENDING: int = int(os.getenv("JOB_MAX_PENDING", "100"))
+    JOB_TTL_SECONDS: float = float(os.getenv("JOB_TTL_SECONDS", "3600"))
+    # SQLite file for job state shared by all server workers on this host (empty: in
+    # memory, one process only; python -m app.server picks a file when --workers > 1)
+    JOB_STORE_PATH: str = os.getenv("JOB_STORE_PATH", "")
+
+    # Stage timings (Server-Timing header) for this share of requests; a request
+    # with "X-Trace: 1" is always traced. TRACE_LOG also prints them as JSON.
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+    TRACE_LOG: bool = os.getenv("TRACE_LOG", "false").lower() == "true"
+
 settings = Settings()
\ No newline at end of file
@@ -1,15 +1,43 @@
-from fastapi import FastAPI
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from app.schemas import (
     PreviewRequest, PreviewResponse,
     ResizeRequest, ResizeResponse,
-    EditRequest, EditResponse
+    BatchResizeRequest, BatchResizeResponse, SizeResult,
+    EditRequest, EditResponse,
+    JobResponse
 )
+from app.config import settings
+from app.services.jobs import Job, JobManager
+from app.services.lifecycle import lifecycle
 from app.services.llm_service import LLMService
 from app.schemas import ConversionRequest, FabricOutput
+from app.services.metrics import (
+    FALLBACK_RESPONSES, HTTP_LATENCY, HTTP_REQUESTS, PAYLOAD_BYTES, REGISTRY
+)
+from app.services import tracing
+from app.services.fast_json import FastJSONResponse
+from app.services.scheduler import Overloaded
+from app.services.streaming import sse_event
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await llm_service.start()
+    lifecycle.start()
+    yield
+    # Requests have drained by now; jobs get what is left of the shutdown budget
+    lifecycle.begin_drain()
+    await jobs.drain(lifecycle.remaining(settings.GRACEFUL_TIMEOUT_SECONDS))
+    await jobs.close()
+    await llm_service.close()
 
-app = FastAPI(title="AutoCre8 AI Backend")
+app = FastAPI(title="AutoCre8 AI Backend", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,140 +49,436 @@ app.add_middleware(
 
 # Initialize Service
 llm_service = LLMService()
+jobs = JobManager.from_settings(settings)
+REGISTRY.collector(llm_service.metric_samples)
+REGISTRY.collector(jobs.metric_samples)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Latency and status per route template (time to first byte for streams)."""
+    started = time.monotonic()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    endpoint = getattr(route, "path", "unmatched")
+    HTTP_LATENCY.observe(time.monotonic() - started, endpoint=endpoint, method=request.method)
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    return response
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """Stage timings for sampled requests, as Server-Timing (time to headers for streams)."""
+    if not tracing.sampled(settings.TRACE_SAMPLE_RATE, forced=request.headers.get("x-trace") == "1"):
+        return await call_next(request)
+    trace, token = tracing.start(f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+    finally:
+        tracing.finish(token)
+    response.headers["Server-Timing"] = trace.server_timing()
+    response.headers["Timing-Allow-Origin"] = "*"
+    if settings.TRACE_LOG:
+        print(tracing.log_line(trace))
+    return response
+
+def record_payloads(**fields):
+    """Size of the large request fields, to see what callers actually send."""
+    for field, value in fields.items():
+        if not value:
+            continue
+        size = len(value) if isinstance(value, str) else len(json.dumps(value, separators=(",", ":")))
+        PAYLOAD_BYTES.observe(size, field=field)
+
+async def until_disconnect(http_request: Request, awaitable):
+    """
+    Await an LLM call, cancelling it if the client goes away so coalesced
+    calls are only dropped once their last waiter has disconnected.
+    """
+    task = asyncio.ensure_future(awaitable)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=0.5)
+        if done:
+            return task.result()
+        if await http_request.is_disconnected():
+            print("[INFO] Client disconnected, dropping request")
+            task.cancel()
+            raise asyncio.CancelledError()
+
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded):
+    """Queue for a provider is full: shed load instead of queueing forever."""
+    print(f"[WARN] Shedding {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=429,
+        content={"success": False, "detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+def event_stream(endpoint: str, events, on_error) -> StreamingResponse:
+    """Wrap an (event, data) async generator as Server-Sent Events."""
+    async def body():
+        try:
+            async for event, data in events:
+                yield sse_event(event, data)
+        except Exception as e:
+            print(f"[ERROR] Stream failed: {str(e)}")
+            FALLBACK_RESPONSES.inc(endpoint=endpoint)
+            payload = on_error(e)
+            if isinstance(e, Overloaded):
+                payload["retry_after"] = e.retry_after
+            yield sse_event("error", payload)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/health")
 async def health():
     return {"status": "ok", "mode": "Hybrid (OpenAI + Gemini)"}
 
-# 1. CANVAS → HTML (OpenAI)
-@app.post("/api/preview/generate", response_model=PreviewResponse)
-async def generate_preview(request: PreviewRequest):
-    """Generate HTML preview from Fabric.js canvas using OpenAI"""
+@app.get("/ready")
+async def ready():
+    """Readiness for load balancers: 503 until startup has finished and once the worker is draining."""
+    status = lifecycle.status()
+    status["provider_calls"] = {name: limiter.active for name, limiter in llm_service.scheduler.limiters.items()}
+    status["jobs_running"] = jobs.stats()["running"]
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/api/stats")
+async def stats():
+    """Queue depth, wait times, cache and asset pipeline counters."""
+    return {**llm_service.stats(), "jobs": jobs.stats()}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (this worker's counters only)."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# 1. CANVAS → HTML (Local compiler, OpenAI fallback)
+async def build_preview(request: PreviewRequest) -> PreviewResponse:
+    canvas_data = request.canvas_data
+    objects = canvas_data.get("objects", [])
+    html = await llm_service.generate_from_canvas(canvas_data)
+    print(f"[SUCCESS] Generated HTML ({len(html)} chars)")
+    with tracing.span("respond"):
+        return PreviewResponse(
+            success=True,
+            preview_html=html,
+            width=canvas_data.get("width", 800),
+            height=canvas_data.get("height", 600),
+            object_count=len(objects)
+        )
+
+@app.post("/api/preview/generate", response_model=PreviewResponse, response_class=FastJSONResponse)
+async def generate_preview(request: PreviewRequest, http_request: Request):
+    """Generate HTML preview from Fabric.js canvas (OpenAI only for unsupported objects)"""
     canvas_data = request.canvas_data
     width = canvas_data.get("width", 800)
     height = canvas_data.get("height", 600)
     objects = canvas_data.get("objects", [])
 
     print(f"\n[INFO] Generating preview {width}x{height} with {len(objects)} objects")
+    record_payloads(canvas_data=canvas_data)
 
     try:
-        html = await llm_service.generate_from_canvas(canvas_data)
-        print(f"[SUCCESS] Generated HTML ({len(html)} chars)")
-        
-        return PreviewResponse(
-            success=True,
-            preview_html=html,
-            width=width,
-            height=height,
-            object_count=len(objects)
-        )
+        return FastJSONResponse(await until_disconnect(http_request, build_preview(request)))
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"[ERROR] Canvas generation failed: {str(e)}")
+        FALLBACK_RESPONSES.inc(endpoint="preview")
         bg = canvas_data.get("background", "#ffffff")
         if not isinstance(bg, str):
             bg = "#ffffff"
-        return PreviewResponse(
+        return FastJSONResponse(PreviewResponse(
             success=False,
             preview_html=f'<div style="position:relative;width:{width}px;height:{height}px;background:{bg};"><p style="color:red;padding:20px;">Error generating preview</p></div>',
             width=width,
             height=height,
             object_count=len(objects)
-        )
+        ))
 
-# 2. RESIZE (Gemini)
-@app.post("/api/preview/resize", response_model=ResizeResponse)
-async def resize_preview(request: ResizeRequest):
-    """Generate 2 layout variations for new canvas size using Gemini"""
-    print(f"\n[INFO] Resizing to {request.target_width}x{request.target_height}")
-    
-    try:
-        result = await llm_service.generate_resize_variations(
-            request.current_preview_html,
-            request.target_width,
-            request.target_height
-        )
-        print(f"[SUCCESS] Generated 2 resize variations")
-        
+# 2. RESIZE (Local proportional scaling, Gemini for the creative layout)
+async def build_resize(request: ResizeRequest) -> ResizeResponse:
+    result = await llm_service.generate_resize_variations(
+        request.current_preview_html,
+        request.target_width,
+        request.target_height
+    )
+    print(f"[SUCCESS] Generated 2 resize variations")
+    with tracing.span("respond"):
         return ResizeResponse(
             success=True,
             variation_1_html=result.variation_1_html,
             variation_2_html=result.variation_2_html
         )
+
+@app.post("/api/preview/resize", response_model=ResizeResponse, response_class=FastJSONResponse)
+async def resize_preview(request: ResizeRequest, http_request: Request):
+    """Generate 2 layout variations for new canvas size using Gemini"""
+    print(f"\n[INFO] Resizing to {request.target_width}x{request.target_height}")
+    record_payloads(current_preview_html=request.current_preview_html)
+    
+    try:
+        return FastJSONResponse(await until_disconnect(http_request, build_resize(request)))
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"[ERROR] Resize failed: {str(e)}")
+        FALLBACK_RESPONSES.inc(endpoint="resize")
         fallback = f'<div style="position:relative;width:{request.target_width}px;height:{request.target_height}px;background:#ffffff;"><p style="color:red;padding:20px;">Error resizing</p></div>'
-        return ResizeResponse(
+        return FastJSONResponse(ResizeResponse(
             success=False,
             variation_1_html=fallback,
             variation_2_html=fallback
-        )
+        ))
+
+@app.post("/api/preview/resize/stream")
+async def resize_preview_stream(request: ResizeRequest):
+    """
+    Streaming variant of /api/preview/resize (text/event-stream):
+    - variation: {index, html} as soon as each layout is complete
+    - done: same payload as the JSON endpoint
+    - error: same payload as the JSON endpoint's failure response
+    """
+    print(f"\n[INFO] Streaming resize to {request.target_width}x{request.target_height}")
+    record_payloads(current_preview_html=request.current_preview_html)
+    fallback = f'<div style="position:relative;width:{request.target_width}px;height:{request.target_height}px;background:#ffffff;"><p style="color:red;padding:20px;">Error resizing</p></div>'
+
+    return event_stream(
+        "resize_stream",
+        llm_service.stream_resize_variations(
+            request.current_preview_html,
+            request.target_width,
+            request.target_height
+        ),
+        lambda e: {"success": False, "variation_1_html": fallback, "variation_2_html": fallback}
+    )
+
+def size_result(size: tuple[int, int], result) -> SizeResult:
+    width, height = size
+    if isinstance(result, Exception):
+        return SizeResult(target_width=width, target_height=height, success=False, error=str(result))
+    return SizeResult(target_width=width, target_height=height, success=True, **result.model_dump())
+
+@app.post("/api/preview/resize/batch", response_model=BatchResizeResponse, response_class=FastJSONResponse)
+async def resize_preview_batch(request: BatchResizeRequest, http_request: Request):
+    """
+    Resize one design to many formats at once. Sizes run concurrently
+    (capped per provider); sizes sharing an aspect ratio are generated once.
+    Results keep the request order, duplicates removed.
+    """
+    sizes = list(dict.fromkeys((s.width, s.height) for s in request.sizes))
+    print(f"\n[INFO] Batch resizing to {', '.join(f'{w}x{h}' for w, h in sizes)}")
+    record_payloads(current_preview_html=request.current_preview_html)
+
+    async def collect():
+        return {size: result async for size, result in llm_service.batch_resize_variations(request.current_preview_html, sizes)}
+
+    results = await until_disconnect(http_request, collect())
+    ordered = [size_result(size, results[size]) for size in sizes]
+    failed = sum(not r.success for r in ordered)
+    if failed:
+        print(f"[ERROR] Batch resize: {failed}/{len(ordered)} sizes failed")
+        FALLBACK_RESPONSES.inc(failed, endpoint="resize_batch")
+    else:
+        print(f"[SUCCESS] Generated {len(ordered)} sizes")
+    return FastJSONResponse(BatchResizeResponse(success=not failed, results=ordered))
+
+@app.post("/api/preview/resize/batch/stream")
+async def resize_preview_batch_stream(request: BatchResizeRequest):
+    """
+    Streaming variant of /api/preview/resize/batch (text/event-stream):
+    - result: one SizeResult per size, in completion order
+    - done: {success, count}
+    """
+    sizes = list(dict.fromkeys((s.width, s.height) for s in request.sizes))
+    print(f"\n[INFO] Streaming batch resize to {len(sizes)} sizes")
+    record_payloads(current_preview_html=request.current_preview_html)
+
+    async def events():
+        failed = 0
+        async for size, result in llm_service.batch_resize_variations(request.current_preview_html, sizes):
+            item = size_result(size, result)
+            if not item.success:
+                failed += 1
+                FALLBACK_RESPONSES.inc(endpoint="resize_batch_stream")
+            yield "result", item.model_dump()
+        yield "done", {"success": not failed, "count": len(sizes)}
+
+    return event_stream("resize_batch_stream", events(), lambda e: {"success": False, "error": str(e)})
 
 # 3. AI CHAT ASSISTANT (Gemini Multimodal)
-@app.post("/api/ai/assistant", response_model=EditResponse)
-async def edit_design(request: EditRequest):
+async def build_edit(request: EditRequest) -> EditResponse:
+    history = llm_service.compact_chat_history(request.chat_history)
+    result = await llm_service.edit_design_multimodal(
+        current_html=request.current_html,
+        user_prompt=request.user_prompt,
+        chat_history=history,
+        assets=request.selected_assets,
+        screenshot=request.current_render_image,
+        brand_context=request.brand_context
+    )
+    print(f"[SUCCESS] AI Edit completed")
+    with tracing.span("respond"):
+        return EditResponse(
+            success=True,
+            html=result.html,
+            explanation=result.explanation or "Design updated successfully.",
+            history_tokens_saved=history.tokens_saved
+        )
+
+@app.post("/api/ai/assistant", response_model=EditResponse, response_class=FastJSONResponse)
+async def edit_design(request: EditRequest, http_request: Request):
     """
     Multimodal AI editing using Gemini:
     - Takes HTML + User Prompt + Chat History
     - Optionally: Assets (Images) + Screenshot
     - Returns: Updated HTML + Explanation 
+    Long chat histories are compacted to CHAT_HISTORY_TOKEN_BUDGET first.
     """
     print(f"\n[INFO] AI Edit request: '{request.user_prompt[:50]}...'")
     print(f"[INFO] Assets: {len(request.selected_assets)}, Screenshot: {bool(request.current_render_image)}")
+    record_payloads(current_html=request.current_html, screenshot=request.current_render_image)
      # Debug log for brand
     if request.brand_context:
         print(f"[INFO] Using Brand Context: {request.brand_context}")
     
     try:
-        result = await llm_service.edit_design_multimodal(
-            current_html=request.current_html,
-            user_prompt=request.user_prompt,
-            chat_history=request.chat_history,
-            assets=request.selected_assets,
-            screenshot=request.current_render_image,
-            brand_context=request.brand_context
-        )
-        
-        print(f"[SUCCESS] AI Edit completed")
-        
-        return EditResponse(
-            success=True,
-            html=result.html,
-            explanation=result.explanation or "Design updated successfully."
-        )
+        return FastJSONResponse(await until_disconnect(http_request, build_edit(request)))
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"[ERROR] AI Edit failed: {str(e)}")
-        return EditResponse(
+        FALLBACK_RESPONSES.inc(endpoint="assistant")
+        return FastJSONResponse(EditResponse(
             success=False, 
             html=request.current_html, 
             explanation=f"Error: {str(e)}"
-        )
+        ))
     
 
 
-# 4. CONVERT HTML -> CANVAS (OpenAI)
+@app.post("/api/ai/assistant/stream")
+async def edit_design_stream(request: EditRequest):
+    """
+    Streaming variant of /api/ai/assistant (text/event-stream):
+    - html: {delta} raw HTML chunks while the model writes
+    - explanation: {explanation}
+    - done / error: same payloads as the JSON endpoint
+    """
+    print(f"\n[INFO] Streaming AI Edit request: '{request.user_prompt[:50]}...'")
+    record_payloads(current_html=request.current_html, screenshot=request.current_render_image)
+
+    return event_stream(
+        "assistant_stream",
+        llm_service.stream_edit_design(
+            current_html=request.current_html,
+            user_prompt=request.user_prompt,
+            chat_history=request.chat_history,
+            assets=request.selected_assets,
+            screenshot=request.current_render_image,
+            brand_context=request.brand_context
+        ),
+        lambda e: {"success": False, "html": request.current_html, "explanation": f"Error: {str(e)}"}
+    )
+
+
+# 4. CONVERT HTML -> CANVAS (Native parser, OpenAI fallback)
+async def build_conversion(request: ConversionRequest) -> FabricOutput:
+    result = await llm_service.convert_html_to_fabric(
+        html_content=request.html_content,
+        canvas_width=request.canvas_width,
+        canvas_height=request.canvas_height
+    )
+    print(f"[SUCCESS] Converted {len(result.objects)} objects.")
+    return result
 
-@app.post("/api/conversion/html-to-fabric", response_model=FabricOutput)
-async def convert_to_fabric(request: ConversionRequest):
+@app.post("/api/conversion/html-to-fabric", response_model=FabricOutput, response_class=FastJSONResponse)
+async def convert_to_fabric(request: ConversionRequest, http_request: Request):
     """
     Takes the AI-generated HTML and converts it back to 
     Fabric.js objects so they are editable on the canvas.
     """
     print(f"\n[INFO] Converting HTML to Fabric Objects...")
     print(f"[INFO] Canvas size: {request.canvas_width}x{request.canvas_height}")
+    record_payloads(html_content=request.html_content)
     
     try:
-        result = await llm_service.convert_html_to_fabric(
-            html_content=request.html_content,
-            canvas_width=request.canvas_width,
-            canvas_height=request.canvas_height
-        )
-        print(f"[SUCCESS] Converted {len(result.objects)} objects.")
-        print(result)
-        return result
+        return FastJSONResponse(await until_disconnect(http_request, build_conversion(request)))
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"[ERROR] Conversion failed: {str(e)}")
+        FALLBACK_RESPONSES.inc(endpoint="conversion")
         # Return empty safe fallback
-        return FabricOutput(objects=[], background="#ffffff")
+        return FastJSONResponse(FabricOutput(objects=[], background="#ffffff"))
+
+# 5. BACKGROUND JOBS (submit now, fetch the result later)
+
+def job_response(job: Job) -> JobResponse:
+    data = job.to_dict()
+    return JobResponse(job_id=data.pop("id"), **data)
+
+async def submit_job(kind: str, build) -> FastJSONResponse:
+    """Queue build() on the job workers; the stored result is its response body."""
+    async def run():
+        return (await build()).model_dump()
+
+    job = await jobs.submit(kind, run)
+    print(f"[INFO] Queued {kind} job {job.id}")
+    return FastJSONResponse(job_response(job), status_code=202)
+
+@app.post("/api/jobs/preview", response_model=JobResponse, response_class=FastJSONResponse, status_code=202)
+async def submit_preview_job(request: PreviewRequest):
+    record_payloads(canvas_data=request.canvas_data)
+    return await submit_job("preview", lambda: build_preview(request))
+
+@app.post("/api/jobs/resize", response_model=JobResponse, response_class=FastJSONResponse, status_code=202)
+async def submit_resize_job(request: ResizeRequest):
+    record_payloads(current_preview_html=request.current_preview_html)
+    return await submit_job("resize", lambda: build_resize(request))
+
+@app.post("/api/jobs/assistant", response_model=JobResponse, response_class=FastJSONResponse, status_code=202)
+async def submit_edit_job(request: EditRequest):
+    record_payloads(current_html=request.current_html, screenshot=request.current_render_image)
+    return await submit_job("assistant", lambda: build_edit(request))
+
+@app.post("/api/jobs/conversion", response_model=JobResponse, response_class=FastJSONResponse, status_code=202)
+async def submit_conversion_job(request: ConversionRequest):
+    record_payloads(html_content=request.html_content)
+    return await submit_job("conversion", lambda: build_conversion(request))
+
+@app.get("/api/jobs/{job_id}", response_model=JobResponse, response_class=FastJSONResponse)
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=60)):
+    """Job state; with ?wait=N, long-poll up to N seconds for it to finish."""
+    job = await jobs.wait(job_id, wait) if wait else await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return FastJSONResponse(job_response(job))
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Job state as text/event-stream:
+    - status: the JobResponse on every change, the last one finished
+    """
+    if await jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+
+    async def events():
+        async for job in jobs.watch(job_id):
+            yield "status", job_response(job).model_dump()
+
+    return event_stream("job_events", events(), lambda e: {"job_id": job_id, "error": str(e)})
+
+@app.delete("/api/jobs/{job_id}", response_model=JobResponse, response_class=FastJSONResponse)
+async def cancel_job(job_id: str):
+    job = await jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return FastJSONResponse(job_response(job))
 
 if __name__ == "__main__":
     import uvicorn
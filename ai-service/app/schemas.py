@@ -22,6 +22,26 @@ class ResizeResponse(BaseModel):
     variation_1_html: str
     variation_2_html: str
 
+class TargetSize(BaseModel):
+    width: int = Field(gt=0)
+    height: int = Field(gt=0)
+
+class BatchResizeRequest(BaseModel):
+    current_preview_html: str
+    sizes: List[TargetSize] = Field(min_length=1, max_length=20)
+
+class SizeResult(BaseModel):
+    target_width: int
+    target_height: int
+    success: bool
+    variation_1_html: str = ""
+    variation_2_html: str = ""
+    error: Optional[str] = None
+
+class BatchResizeResponse(BaseModel):
+    success: bool
+    results: List[SizeResult]
+
 # ============  (CHAT & ASSETS) ============
 
 class ChatMessage(BaseModel):
@@ -64,6 +84,7 @@ class EditResponse(BaseModel):
     success: bool
     html: str
     explanation: str
+    history_tokens_saved: int = 0
 
 # ============ LLM OUTPUT STRUCTURES ============
 
@@ -75,6 +96,32 @@ class ResizeOutput(BaseModel):
     variation_1_html: str = Field(description="First layout - proportional scaling")
     variation_2_html: str = Field(description="Second layout - optimized arrangement")
 
+class EditOperation(BaseModel):
+    """One element-level change, addressed by the data-eid shown in CURRENT HTML"""
+    op: Literal["update", "insert", "delete", "reorder"]
+    id: str = Field(description="data-eid of the target element (for insert: the parent element)")
+    style: Optional[Dict[str, Optional[str]]] = Field(
+        None, description="update: CSS properties to set; empty string or null removes a property"
+    )
+    text: Optional[str] = Field(None, description="update: new text content of a text element")
+    attrs: Optional[Dict[str, Optional[str]]] = Field(
+        None, description="update: attributes to set such as src or alt; null removes"
+    )
+    html: Optional[str] = Field(None, description="insert: HTML fragment for the new element(s)")
+    index: Optional[int] = Field(
+        None, description="insert/reorder: position among the parent's child elements (omit to append)"
+    )
+
+class PatchOutput(BaseModel):
+    operations: List[EditOperation] = Field(
+        description="Element operations applied in order; empty if the request needs a full redesign"
+    )
+    explanation: Optional[str] = Field(description="Brief explanation of changes (b/w 10-20 words only)")
+
+class CreativeResizeOutput(BaseModel):
+    """Model output when variation 1 is scaled locally"""
+    variation_2_html: str = Field(description="Optimized arrangement for the new canvas size")
+
 
 
 # ============ 4. CONVERSION MODELS (HTML -> FABRIC) ============
@@ -93,4 +140,18 @@ class FabricOutput(BaseModel):
     background: Union[str, Dict[str, Any]] = Field(default="#ffffff")
     
     # Objects list
-    objects: List[Dict[str, Any]] = Field(default=[], description="List of Fabric objects")
\ No newline at end of file
+    objects: List[Dict[str, Any]] = Field(default=[], description="List of Fabric objects")
+
+# ============ 5. BACKGROUND JOBS ============
+
+class JobResponse(BaseModel):
+    """A background job; result holds the same body the endpoint returns directly"""
+    job_id: str
+    kind: Literal["preview", "resize", "assistant", "conversion"]
+    status: Literal["queued", "running", "succeeded", "failed", "cancelled"]
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
@@ -0,0 +1,181 @@
+"""
+Production entry point: preforked uvicorn workers sharing one socket.
+
+    python -m app.server [--workers N] [--host 0.0.0.0] [--port 8000]
+
+The master imports the app and the provider SDKs once, binds the socket and
+forks WEB_CONCURRENCY workers, so each worker starts warm and shares the
+imported code copy-on-write. Provider clients, HTTP pools and the disk cache
+connection are created lazily inside each worker: none of them survive a
+fork. Workers that die are replaced.
+
+On SIGTERM or SIGINT each worker stops being ready (/ready answers 503) but
+keeps serving for DRAIN_DELAY_SECONDS so load balancers can take it out of
+rotation. It then stops accepting connections and lets in-flight requests,
+streams and background jobs finish within GRACEFUL_TIMEOUT_SECONDS. Workers
+still alive after that are killed.
+
+Workers share nothing but the socket and files on disk. Per worker, so a
+request may land on a worker that has not seen the previous one:
+
+- /metrics: a scrape reaches one worker; samples carry a worker="<pid>" label
+- the identity map (IDENTITY_MAP_*) and the preview fragment cache
+- the memory tier of the response cache (the CACHE_DISK_PATH tier is shared)
+- the asset cache and provider pools
+- background jobs, unless JOB_STORE_PATH names a shared file (set
+  automatically when --workers > 1)
+
+WEB_CONCURRENCY therefore defaults to 1: scale out with more workers only
+when the hit rates of these caches matter less than the extra throughput.
+"""
+import argparse
+import os
+import signal
+import tempfile
+import time
+import traceback
+
+import uvicorn
+
+from app.config import settings
+from app.services.lifecycle import lifecycle
+
+# A worker that dies sooner than this after starting is respawned with a pause
+MIN_WORKER_LIFETIME = 1.0
+# Extra time the master allows past the drain before killing workers
+KILL_GRACE_SECONDS = 5
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn.Server whose first SIGTERM starts a drain instead of shutting down at once."""
+
+    def __init__(self, config: uvicorn.Config, drain_delay: float):
+        super().__init__(config)
+        self.drain_delay = drain_delay
+
+    def handle_exit(self, sig, frame):
+        if sig == signal.SIGTERM and self.drain_delay > 0 and not lifecycle.draining:
+            lifecycle.begin_drain()
+            return
+        lifecycle.begin_drain()
+        super().handle_exit(sig, frame)
+
+    async def on_tick(self, counter: int) -> bool:
+        if lifecycle.draining and lifecycle.draining_for() >= self.drain_delay:
+            self.should_exit = True
+        return await super().on_tick(counter)
+
+
+class Master:
+    def __init__(self, config: uvicorn.Config, workers: int):
+        self.config = config
+        self.workers = workers
+        self.children: dict[int, float] = {}  # pid -> started at
+        self.stopping = False
+
+    def _run_worker(self, sock):
+        # Handlers inherited from the master must not run here
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+        DrainingServer(self.config, settings.DRAIN_DELAY_SECONDS).run(sockets=[sock])
+
+    def spawn(self, sock):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker(sock)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+
+    def _reap(self) -> list[tuple[int, float]]:
+        """(pid, lifetime) of every child that has exited."""
+        exited = []
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            started = self.children.pop(pid, None)
+            if started is not None:
+                exited.append((pid, time.monotonic() - started))
+                if not self.stopping:
+                    print(f"[WARN] Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+        return exited
+
+    def _stop(self, sig, frame):
+        self.stopping = True
+
+    def run(self):
+        sock = self.config.bind_socket()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        print(f"[INFO] Master {os.getpid()} serving on {self.config.host}:{self.config.port} "
+              f"with {self.workers} workers")
+        for _ in range(self.workers):
+            self.spawn(sock)
+
+        while not self.stopping:
+            for _, lifetime in self._reap():
+                if self.stopping:
+                    break
+                if lifetime < MIN_WORKER_LIFETIME:
+                    time.sleep(MIN_WORKER_LIFETIME)  # crash loop: don't spin
+                self.spawn(sock)
+            time.sleep(0.2)
+
+        self.shutdown()
+        sock.close()
+
+    def shutdown(self):
+        print(f"[INFO] Draining {len(self.children)} workers")
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + settings.DRAIN_DELAY_SECONDS + settings.GRACEFUL_TIMEOUT_SECONDS + KILL_GRACE_SECONDS
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            print(f"[WARN] Worker {pid} did not drain in time, killing it")
+            os.kill(pid, signal.SIGKILL)
+        while self.children:
+            self._reap()
+            time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the AI service with preforked workers.")
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--workers", type=int, default=settings.WEB_CONCURRENCY)
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    if workers > 1 and not settings.JOB_STORE_PATH:
+        # Job state has to be visible to every worker, not just the one that took the job
+        settings.JOB_STORE_PATH = os.path.join(tempfile.gettempdir(), f"autocre8-jobs-{args.port}.sqlite3")
+        print(f"[INFO] Sharing job state between workers in {settings.JOB_STORE_PATH}")
+
+    # Preload: everything imported here is shared by the forked workers
+    from app.main import app, llm_service
+    llm_service.preload()
+
+    config = uvicorn.Config(
+        app,
+        host=args.host,
+        port=args.port,
+        lifespan="on",
+        proxy_headers=True,
+        timeout_graceful_shutdown=settings.GRACEFUL_TIMEOUT_SECONDS,
+    )
+    Master(config, workers).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Fetch, downscale and cache images sent to the vision model.
+
+Asset URLs point at full-resolution originals. Each URL is fetched once,
+shrunk to a vision-sized JPEG/PNG and kept as a data URL in a byte-bounded
+LRU. Stale entries are revalidated with If-None-Match, so an unchanged image
+costs a 304 rather than a download and re-encode. The fetcher is pluggable
+(any async callable returning a FetchResult) so tests can serve images from
+a local stand-in.
+"""
+import asyncio
+import base64
+import binascii
+import io
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import httpx
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.services.singleflight import SingleFlight
+
+
+@dataclass
+class FetchResult:
+    status: int
+    body: bytes = b""
+    etag: str | None = None
+    content_type: str | None = None
+
+
+class FetchRefused(ValueError):
+    """An asset URL we will not fetch (host not allowed, private address, too large)."""
+
+
+class HttpFetcher:
+    """
+    Default fetcher: one pooled httpx client, conditional GETs.
+
+    Asset URLs come from clients, so every hop (redirects included) must be
+    an allowed host, or with no allow-list a host that resolves only to
+    public addresses, and bodies are streamed under a byte cap.
+    """
+
+    def __init__(self, timeout: float = 10.0, allowed_hosts=(), max_bytes: int = 20 * 1024 * 1024,
+                 max_redirects: int = 5):
+        self.timeout = timeout
+        self.allowed_hosts = [host.lower() for host in allowed_hosts]
+        self.max_bytes = max_bytes
+        self.max_redirects = max_redirects
+        self._client = None
+
+    def _allowed(self, host: str) -> bool:
+        return any(host == allowed or (allowed.startswith(".") and host.endswith(allowed))
+                   for allowed in self.allowed_hosts)
+
+    async def _check(self, url: httpx.URL):
+        if url.scheme not in ("http", "https") or not url.host:
+            raise FetchRefused(f"not an http(s) URL: {url}")
+        host = url.host.lower()
+        if self.allowed_hosts:
+            if not self._allowed(host):
+                raise FetchRefused(f"host {host} is not in ASSET_ALLOWED_HOSTS")
+            return
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, url.port or (443 if url.scheme == "https" else 80))
+        except OSError as e:
+            raise FetchRefused(f"cannot resolve {host} ({e})") from None
+        for *_, sockaddr in infos:
+            address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+            if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+                address = address.ipv4_mapped
+            if not address.is_global or address.is_multicast:
+                raise FetchRefused(f"{host} resolves to non-public address {address}")
+
+    async def __call__(self, url: str, etag: str | None = None) -> FetchResult:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, follow_redirects=False)
+        headers = {"If-None-Match": etag} if etag else {}
+        target = httpx.URL(url)
+        for _ in range(self.max_redirects + 1):
+            await self._check(target)
+            async with self._client.stream("GET", target, headers=headers) as response:
+                if response.is_redirect:
+                    target = target.join(response.headers["location"])
+                    continue
+                body = await self._read(response) if response.status_code == 200 else b""
+                return FetchResult(
+                    status=response.status_code,
+                    body=body,
+                    etag=response.headers.get("etag"),
+                    content_type=response.headers.get("content-type"),
+                )
+        raise FetchRefused(f"more than {self.max_redirects} redirects")
+
+    async def _read(self, response: httpx.Response) -> bytes:
+        length = response.headers.get("content-length", "")
+        if length.isdigit() and int(length) > self.max_bytes:
+            raise FetchRefused(f"{length} bytes is over the {self.max_bytes} byte limit")
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body += chunk
+            if len(body) > self.max_bytes:
+                raise FetchRefused(f"over the {self.max_bytes} byte limit")
+        return bytes(body)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def downscale(data: bytes, max_side: int, quality: int = 85) -> tuple[bytes, str]:
+    """Shrink to fit max_side x max_side. Returns (bytes, mime type)."""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side))
+        out = io.BytesIO()
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if has_alpha:
+            # Logos and cut-outs keep their alpha
+            image.save(out, format="PNG", optimize=True)
+            return out.getvalue(), "image/png"
+        image.convert("RGB").save(out, format="JPEG", quality=quality, optimize=True)
+        return out.getvalue(), "image/jpeg"
+
+
+def to_data_url(data: bytes, mime: str) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def decode_data_url(url: str) -> bytes | None:
+    header, _, payload = url.partition(",")
+    if not header.endswith(";base64"):
+        return None
+    try:
+        return base64.b64decode(payload, validate=False)
+    except (binascii.Error, ValueError):
+        return None
+
+
+@dataclass
+class _Entry:
+    data_url: str
+    etag: str | None
+    checked_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.data_url)
+
+
+class AssetPipeline:
+    def __init__(
+        self,
+        fetcher=None,
+        max_side: int = 1024,
+        quality: int = 85,
+        max_bytes: int = 64 * 1024 * 1024,
+        revalidate_after: float = 300,
+    ):
+        self.fetcher = fetcher or HttpFetcher()
+        self.max_side = max_side
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self.bytes = 0
+        self._entries = OrderedDict()  # url -> _Entry
+        self._lock = threading.Lock()
+        self._inflight = SingleFlight()
+        self.hits = 0
+        self.revalidated = 0
+        self.fetched = 0
+        self.failures = 0
+        self.bytes_saved = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "AssetPipeline":
+        return cls(
+            fetcher=HttpFetcher(
+                timeout=settings.ASSET_FETCH_TIMEOUT,
+                allowed_hosts=settings.ASSET_ALLOWED_HOSTS,
+                max_bytes=settings.ASSET_MAX_FETCH_BYTES,
+            ),
+            max_side=settings.ASSET_MAX_SIDE,
+            max_bytes=settings.ASSET_CACHE_MAX_BYTES,
+            revalidate_after=settings.ASSET_REVALIDATE_SECONDS,
+        )
+
+    async def prepare(self, url: str) -> str:
+        """
+        A compact data URL for the image at `url`. Falls back to the original
+        URL if it can't be fetched or decoded, so the model still sees it.
+        """
+        if not url:
+            return url
+        if url.startswith("data:"):
+            # Screenshots: nothing to fetch or reuse, just shrink
+            data = decode_data_url(url)
+            if data is None:
+                return url
+            return await self._shrink(data, url) or url
+        if not url.startswith(("http://", "https://")):
+            return url
+        try:
+            return await self._inflight.do(url, lambda: self._load(url))
+        except Exception as e:
+            self.failures += 1
+            print(f"[ASSETS] Using original URL for {url[:80]} ({e})")
+            return url
+
+    async def prepare_all(self, urls: list[str]) -> dict[str, str]:
+        unique = list(dict.fromkeys(u for u in urls if u))
+        prepared = await asyncio.gather(*(self.prepare(u) for u in unique))
+        return dict(zip(unique, prepared))
+
+    async def _load(self, url: str) -> str:
+        entry = self._get(url)
+        if entry is not None and time.time() - entry.checked_at < self.revalidate_after:
+            self.hits += 1
+            return entry.data_url
+
+        result = await self.fetcher(url, entry.etag if entry else None)
+        if result.status == 304 and entry is not None:
+            self.revalidated += 1
+            entry.checked_at = time.time()
+            return entry.data_url
+        if result.status != 200 or not result.body:
+            raise ValueError(f"HTTP {result.status}")
+
+        self.fetched += 1
+        data_url = await self._shrink(result.body, url)
+        if data_url is None:
+            raise ValueError("not a decodable image")
+        self._put(url, _Entry(data_url, result.etag, time.time()))
+        return data_url
+
+    async def _shrink(self, data: bytes, url: str) -> str | None:
+        try:
+            small, mime = await asyncio.to_thread(downscale, data, self.max_side, self.quality)
+        except (UnidentifiedImageError, OSError, ValueError) as e:
+            print(f"[ASSETS] Could not decode {url[:80]} ({e})")
+            return None
+        self.bytes_saved += max(len(data) - len(small), 0)
+        return to_data_url(small, mime)
+
+    def _get(self, url: str) -> _Entry | None:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def _put(self, url: str, entry: _Entry):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(url, None)
+            if old is not None:
+                self.bytes -= old.size
+            self._entries[url] = entry
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.size
+
+    async def close(self):
+        close = getattr(self.fetcher, "close", None)
+        if close is not None:
+            await close()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "fetched": self.fetched,
+            "failures": self.failures,
+            "bytes_saved": self.bytes_saved,
+        }
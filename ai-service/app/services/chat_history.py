@@ -0,0 +1,148 @@
+"""
+Token-budgeted chat history for the assistant.
+
+The last few turns are kept verbatim; older messages are folded into a
+compact rolling summary. The current design always travels separately as
+`current_html`, so HTML pasted into older messages is stale and dropped.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+from app.schemas import ChatMessage
+from app.services.html_tree import VOID_TAGS
+from app.services.tokens import estimate_tokens, message_tokens
+
+HTML_PLACEHOLDER = "[HTML omitted]"
+
+_FENCE_RE = re.compile(r"```[\w-]*\s*<[\s\S]*?```")
+# One tag: <name ...>, </name>, <name/>, or <!doctype ...>/<!-- ... -->. [^<>] keeps each
+# match within the text up to the next bracket, so a scan is linear in the message
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z][\w-]*)(?:[\s/][^<>]*)?>|<![^<>]*>")
+_PLACEHOLDER_RUN_RE = re.compile(re.escape(HTML_PLACEHOLDER) + r"(?:\s*" + re.escape(HTML_PLACEHOLDER) + r")+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s")
+
+# Longest excerpt of one message kept in the summary
+SUMMARY_LINE_CHARS = 160
+# Characters of one message looked at when stripping HTML; the rest is cut
+STRIP_MAX_CHARS = 32_000
+
+
+@dataclass
+class CompactHistory:
+    summary: str | None = None
+    turns: list[ChatMessage] = field(default_factory=list)
+    tokens_before: int = 0
+    tokens_after: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def payload(self) -> dict:
+        """What actually reaches the model, for cache keys."""
+        return {"summary": self.summary, "turns": self.turns}
+
+
+def strip_html(text: str) -> str:
+    """
+    Replace each run of markup (tags and the text inside them) with one
+    placeholder, keeping the prose around it. One pass over the tags: an
+    open-tag stack tells markup text from prose, void tags never open.
+    """
+    if len(text) > STRIP_MAX_CHARS:
+        text = text[:STRIP_MAX_CHARS] + "…"
+    text = _FENCE_RE.sub(HTML_PLACEHOLDER, text)
+    pieces, open_tags, open_counts = [], [], Counter()
+    position = 0
+    for match in _TAG_RE.finditer(text):
+        if not open_tags:
+            pieces.append(text[position:match.start()])
+            pieces.append(HTML_PLACEHOLDER)
+        position = match.end()
+        closing, name = match.group(1), (match.group(2) or "").lower()
+        if not name:
+            continue  # doctype or comment
+        if closing:
+            # Close up to the matching open tag; a stray close tag changes nothing
+            while open_counts[name]:
+                top = open_tags.pop()
+                open_counts[top] -= 1
+                if top == name:
+                    break
+        elif name not in VOID_TAGS and not match.group(0).endswith("/>"):
+            open_tags.append(name)
+            open_counts[name] += 1
+    if not open_tags:
+        pieces.append(text[position:])
+    return _PLACEHOLDER_RUN_RE.sub(HTML_PLACEHOLDER, "".join(pieces))
+
+
+def _excerpt(text: str) -> str:
+    text = " ".join(strip_html(text).split())
+    first = _SENTENCE_RE.split(text, maxsplit=1)[0]
+    if len(first) > SUMMARY_LINE_CHARS:
+        first = first[:SUMMARY_LINE_CHARS - 1].rstrip() + "…"
+    return first
+
+
+def _split_turns(history: list[ChatMessage]) -> list[list[ChatMessage]]:
+    """A turn starts at each user message and includes the replies that follow."""
+    turns = []
+    for message in history:
+        if message.role == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _summarize(messages: list[ChatMessage], max_tokens: int) -> str | None:
+    """Newest excerpts that fit in max_tokens, oldest first."""
+    if not messages:
+        return None
+    lines, used = [], 0
+    for message in reversed(messages):
+        line = f"- {message.role.capitalize()}: {_excerpt(message.content)}"
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        lines.append(line)
+        used += cost
+    omitted = len(messages) - len(lines)
+    if omitted:
+        lines.append(f"- ({omitted} earlier messages omitted)")
+    return "\n".join(reversed(lines))
+
+
+def compact_history(
+    history: list[ChatMessage],
+    budget: int,
+    keep_turns: int,
+    summary_tokens: int,
+) -> CompactHistory:
+    """
+    History within `budget` tokens is left alone. Otherwise keep the last
+    `keep_turns` turns verbatim and summarize the rest, within budget. Recent
+    turns that still don't fit have their HTML stripped, then are folded into
+    the summary oldest-first (the latest turn is always kept).
+    """
+    tokens_before = sum(message_tokens(m.content) for m in history)
+    if tokens_before <= budget:
+        return CompactHistory(None, list(history), tokens_before, tokens_before)
+
+    turns = _split_turns(history)
+    recent = turns[-keep_turns:] if keep_turns > 0 else []
+    older = [m for turn in turns[:len(turns) - len(recent)] for m in turn]
+
+    def recent_cost():
+        return sum(message_tokens(m.content) for turn in recent for m in turn)
+
+    if recent_cost() > budget - summary_tokens:
+        recent = [[ChatMessage(role=m.role, content=strip_html(m.content)) for m in turn] for turn in recent]
+    while len(recent) > 1 and recent_cost() > budget - summary_tokens:
+        older.extend(recent.pop(0))
+
+    summary = _summarize(older, min(summary_tokens, max(budget - recent_cost(), 0)))
+    kept = [m for turn in recent for m in turn]
+    tokens_after = sum(message_tokens(m.content) for m in kept) + (message_tokens(summary) if summary else 0)
+    return CompactHistory(summary, kept, tokens_before, tokens_after)
@@ -0,0 +1,190 @@
+"""
+Compact Fabric.js object JSON before it goes into a prompt.
+
+Fabric's toObject() writes every property, most of them at their default
+value, with full float precision. Here properties equal to the Fabric 6
+default are dropped, numbers are rounded, scaleX/scaleY are folded into the
+sizes where that is exact, and the result is serialized without whitespace.
+The prompts state the defaults the model should assume for missing keys.
+"""
+import json
+from dataclasses import dataclass
+
+from app.services.tokens import estimate_tokens
+
+# Decimal places kept for every number (positions, sizes, path points, stops)
+PRECISION = 2
+
+# FabricObject defaults (Fabric 6 toObject output)
+OBJECT_DEFAULTS = {
+    "originX": "left",
+    "originY": "top",
+    "left": 0,
+    "top": 0,
+    "scaleX": 1,
+    "scaleY": 1,
+    "flipX": False,
+    "flipY": False,
+    "skewX": 0,
+    "skewY": 0,
+    "angle": 0,
+    "opacity": 1,
+    "visible": True,
+    "fill": "rgb(0,0,0)",
+    "fillRule": "nonzero",
+    "paintFirst": "fill",
+    "globalCompositeOperation": "source-over",
+    "stroke": None,
+    "strokeWidth": 1,
+    "strokeDashArray": None,
+    "strokeDashOffset": 0,
+    "strokeLineCap": "butt",
+    "strokeLineJoin": "miter",
+    "strokeMiterLimit": 4,
+    "strokeUniform": False,
+    "shadow": None,
+    "backgroundColor": "",
+    "clipPath": None,
+}
+
+TEXT_DEFAULTS = {
+    "fontSize": 40,
+    "fontWeight": "normal",
+    "fontFamily": "Times New Roman",
+    "fontStyle": "normal",
+    "lineHeight": 1.16,
+    "underline": False,
+    "overline": False,
+    "linethrough": False,
+    "textAlign": "left",
+    "textBackgroundColor": "",
+    "charSpacing": 0,
+    "direction": "ltr",
+    "path": None,
+    "pathStartOffset": 0,
+    "pathSide": "left",
+    "pathAlign": "baseline",
+    "minWidth": 20,
+    "splitByGrapheme": False,
+}
+
+TYPE_DEFAULTS = {
+    "rect": {"rx": 0, "ry": 0},
+    "circle": {"startAngle": 0, "endAngle": 360, "counterClockwise": False},
+    "image": {"cropX": 0, "cropY": 0, "crossOrigin": None},
+}
+
+SHADOW_DEFAULTS = {
+    "color": "rgb(0,0,0)",
+    "blur": 0,
+    "offsetX": 0,
+    "offsetY": 0,
+    "affectStroke": False,
+    "nonScaling": False,
+}
+
+# Editor state that doesn't change how the object looks
+EDITOR_KEYS = {
+    "selectable", "evented", "hasControls", "hasBorders", "hoverCursor", "moveCursor",
+    "lockMovementX", "lockMovementY", "lockRotation", "lockScalingX", "lockScalingY",
+    "borderColor", "cornerColor", "cornerSize", "cornerStyle", "transparentCorners", "padding",
+}
+
+# Types whose geometry is just width/height (+ corner radii): scale folds in exactly
+BOX_TYPES = {"rect", "triangle", "image", "ellipse"}
+TEXT_TYPES = {"text", "i-text", "textbox"}
+# Types with one length (radius, font size) that only fold a uniform scale
+UNIFORM_TYPES = {"circle"} | TEXT_TYPES
+
+
+def _type(obj: dict) -> str:
+    kind = str(obj.get("type", "")).lower()
+    return {"fabricimage": "image", "itext": "i-text", "fabrictext": "text"}.get(kind, kind)
+
+
+def _round(value):
+    if isinstance(value, float):
+        rounded = round(value, PRECISION)
+        return int(rounded) if rounded.is_integer() else rounded
+    if isinstance(value, list):
+        return [_round(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _round(v) for k, v in value.items()}
+    return value
+
+
+def _is_default(value, default) -> bool:
+    if value == default:
+        return True
+    # "Nothing" is written as null, [] or "" depending on property and Fabric version
+    return default is None and value in ([], {}, "")
+
+
+def _fold_scale(obj: dict, kind: str):
+    """Multiply scaleX/scaleY into the sizes when the result renders identically."""
+    sx, sy = obj.get("scaleX", 1), obj.get("scaleY", 1)
+    if sx == 1 and sy == 1:
+        return
+    if not isinstance(sx, (int, float)) or not isinstance(sy, (int, float)):
+        return
+    uniform = abs(sx - sy) < 1e-9
+    stroked = obj.get("stroke") and not obj.get("strokeUniform")
+    if kind in UNIFORM_TYPES and not uniform:
+        return
+    if kind not in BOX_TYPES | UNIFORM_TYPES or (stroked and not uniform):
+        return
+    if kind == "image" and (obj.get("cropX") or obj.get("cropY")):
+        return
+
+    for key, factor in (("width", sx), ("height", sy), ("rx", sx), ("ry", sy)):
+        if isinstance(obj.get(key), (int, float)):
+            obj[key] = obj[key] * factor
+    if kind == "circle" and isinstance(obj.get("radius"), (int, float)):
+        obj["radius"] *= sx
+    if kind in TEXT_TYPES:
+        obj["fontSize"] = obj.get("fontSize", TEXT_DEFAULTS["fontSize"]) * sx
+    if stroked:
+        obj["strokeWidth"] = obj.get("strokeWidth", OBJECT_DEFAULTS["strokeWidth"]) * sx
+    obj["scaleX"] = obj["scaleY"] = 1
+
+
+def compact_object(obj: dict) -> dict:
+    """One Fabric object without default-valued keys, rounded and with scale folded in."""
+    kind = _type(obj)
+    obj = dict(obj)
+    _fold_scale(obj, kind)
+    defaults = {**OBJECT_DEFAULTS, **(TEXT_DEFAULTS if kind in TEXT_TYPES else TYPE_DEFAULTS.get(kind, {}))}
+
+    compact = {}
+    for key, value in obj.items():
+        if key in EDITOR_KEYS or key == "version":
+            continue
+        if key in defaults and _is_default(value, defaults[key]):
+            continue
+        if key in ("styles", "filters") and not value:
+            continue
+        if key == "shadow" and isinstance(value, dict):
+            value = {k: v for k, v in value.items() if not (k in SHADOW_DEFAULTS and v == SHADOW_DEFAULTS[k])}
+        if key == "objects" and isinstance(value, list):
+            # Groups: children are objects too
+            value = [compact_object(child) if isinstance(child, dict) else child for child in value]
+        compact[key] = _round(value)
+    return compact
+
+
+@dataclass
+class CompactObjects:
+    json: str
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.tokens_before - self.tokens_after, 0)
+
+
+def compact_objects_json(objects: list[dict]) -> CompactObjects:
+    """Serialize objects for a prompt, compacted, with before/after token estimates."""
+    before = estimate_tokens(json.dumps(objects, indent=2))
+    text = json.dumps([compact_object(obj) for obj in objects], separators=(",", ":"), ensure_ascii=False)
+    return CompactObjects(json=text, tokens_before=before, tokens_after=estimate_tokens(text))
@@ -0,0 +1,516 @@
+"""
+Deterministic Fabric.js -> HTML compiler.
+
+Covers the mapping the preview prompt used to describe (rect, circle, ellipse,
+triangle, line, text/textbox/i-text and image) without calling a model.
+Anything it can't represent faithfully is left as an empty slot so the caller
+can translate only those objects with the LLM and splice them back in z-order.
+"""
+import html
+import math
+import re
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+
+# Fabric 6 serializes class names ("Rect", "IText", "FabricImage" ...),
+# older canvases use the lowercase names from the prompt.
+TYPE_ALIASES = {
+    "rect": "rect",
+    "circle": "circle",
+    "ellipse": "ellipse",
+    "triangle": "triangle",
+    "line": "line",
+    "text": "text",
+    "fabrictext": "text",
+    "i-text": "i-text",
+    "itext": "i-text",
+    "textbox": "textbox",
+    "image": "image",
+    "fabricimage": "image",
+}
+
+TEXT_TYPES = {"text", "i-text", "textbox"}
+
+ORIGIN_FACTORS = {"left": 0.0, "top": 0.0, "center": 0.5, "right": 1.0, "bottom": 1.0}
+
+# Canvas composite operations that have an identical CSS mix-blend-mode
+BLEND_MODES = {
+    "multiply", "screen", "overlay", "darken", "lighten", "color-dodge",
+    "color-burn", "hard-light", "soft-light", "difference", "exclusion",
+    "hue", "saturation", "color", "luminosity",
+}
+
+
+class UnsupportedObject(Exception):
+    """Raised when an object needs the LLM fallback."""
+
+
+@dataclass
+class CompiledCanvas:
+    width: float
+    height: float
+    background: str
+    fragments: list = field(default_factory=list)
+    # z-index -> original Fabric object for every empty slot in `fragments`
+    unsupported: dict = field(default_factory=dict)
+
+    def render(self, translated: dict | None = None) -> str:
+        """Assemble the container, filling empty slots from `translated`."""
+        translated = translated or {}
+        parts = []
+        for index, fragment in enumerate(self.fragments):
+            if fragment is None:
+                fragment = translated.get(index, "")
+            if fragment:
+                parts.append(fragment)
+        return (
+            f'<div style="position:relative;width:{_num(self.width)}px;height:{_num(self.height)}px;'
+            f'background:{self.background};overflow:hidden;">'
+            + "".join(parts)
+            + "</div>"
+        )
+
+
+# ============ VALUE HELPERS ============
+
+def _num(value) -> str:
+    """Compact CSS number: at most 2 decimals, no trailing zeros."""
+    text = f"{float(value):.2f}".rstrip("0").rstrip(".")
+    return "0" if text in ("-0", "") else text
+
+
+def _style_attr(styles: list[str]) -> str:
+    return html.escape(";".join(styles) + ";", quote=True)
+
+
+def _float(obj: dict, key: str, default: float = 0.0) -> float:
+    value = obj.get(key, default)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise UnsupportedObject(f"non-numeric {key}")
+
+
+def _origin(value, default: float = 0.0) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    return ORIGIN_FACTORS.get(value, default)
+
+
+def _with_opacity(color: str, opacity: float) -> str:
+    """Apply a colorStop opacity to a hex color."""
+    if opacity >= 1 or not isinstance(color, str):
+        return color
+    match = re.fullmatch(r"#([0-9a-fA-F]{3}|[0-9a-fA-F]{6})", color.strip())
+    if not match:
+        return color
+    hex_value = match.group(1)
+    if len(hex_value) == 3:
+        hex_value = "".join(c * 2 for c in hex_value)
+    r, g, b = (int(hex_value[i:i + 2], 16) for i in (0, 2, 4))
+    return f"rgba({r},{g},{b},{_num(opacity)})"
+
+
+def gradient_to_css(gradient: dict, width: float, height: float) -> str:
+    """Convert a Fabric gradient dict into a CSS gradient."""
+    coords = gradient.get("coords") or {}
+    stops = sorted(gradient.get("colorStops") or [], key=lambda s: float(s.get("offset", 0)))
+    if not stops:
+        raise UnsupportedObject("gradient without colorStops")
+
+    # Percentage units are fractions of the object's box
+    unit_x, unit_y = (width, height) if gradient.get("gradientUnits") == "percentage" else (1, 1)
+    x1 = float(coords.get("x1", 0)) * unit_x
+    y1 = float(coords.get("y1", 0)) * unit_y
+    x2 = float(coords.get("x2", 0)) * unit_x
+    y2 = float(coords.get("y2", 0)) * unit_y
+
+    css_stops = ", ".join(
+        f"{_with_opacity(s.get('color', '#000000'), float(s.get('opacity', 1)))} {_num(float(s.get('offset', 0)) * 100)}%"
+        for s in stops
+    )
+
+    kind = gradient.get("type", "linear")
+    if kind == "linear":
+        # CSS 0deg points up and turns clockwise
+        angle = math.degrees(math.atan2(x2 - x1, -(y2 - y1))) % 360
+        return f"linear-gradient({_num(angle)}deg, {css_stops})"
+    if kind == "radial":
+        radius = float(coords.get("r2", 0)) * unit_x
+        return f"radial-gradient(circle {_num(radius)}px at {_num(x2)}px {_num(y2)}px, {css_stops})"
+    raise UnsupportedObject(f"gradient type {kind}")
+
+
+def _paint(value, width: float, height: float) -> str | None:
+    """Fabric fill/stroke -> CSS color or gradient."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict) and "colorStops" in value:
+        return gradient_to_css(value, width, height)
+    # Patterns and anything else need the model
+    raise UnsupportedObject("unsupported paint")
+
+
+def _shadow(shadow) -> tuple[float, float, float, str] | None:
+    if not shadow:
+        return None
+    if isinstance(shadow, str):
+        raise UnsupportedObject("string shadow")
+    return (
+        float(shadow.get("offsetX", 0)),
+        float(shadow.get("offsetY", 0)),
+        float(shadow.get("blur", 0)),
+        shadow.get("color", "rgba(0,0,0,0.3)"),
+    )
+
+
+# ============ OBJECT COMPILER ============
+
+def _box(obj: dict, width: float, height: float) -> tuple[float, float, float]:
+    """
+    Place an un-rotated box of the given size so that, rotated about its
+    center, it lands where Fabric draws it. Returns (left, top, angle).
+    """
+    angle = _float(obj, "angle")
+    ox = _origin(obj.get("originX", "left"))
+    oy = _origin(obj.get("originY", "top"), 0.0)
+    left = _float(obj, "left")
+    top = _float(obj, "top")
+
+    # Offset from origin point to center, rotated with the object
+    dx = (0.5 - ox) * width
+    dy = (0.5 - oy) * height
+    rad = math.radians(angle)
+    cx = left + dx * math.cos(rad) - dy * math.sin(rad)
+    cy = top + dx * math.sin(rad) + dy * math.cos(rad)
+    return cx - width / 2, cy - height / 2, angle
+
+
+def _common_styles(obj: dict, width: float, height: float, extra_transform: str = "") -> list[str]:
+    if _float(obj, "skewX") or _float(obj, "skewY"):
+        raise UnsupportedObject("skew")
+    if obj.get("clipPath"):
+        raise UnsupportedObject("clipPath")
+
+    left, top, angle = _box(obj, width, height)
+    styles = [
+        "position:absolute",
+        f"left:{_num(left)}px",
+        f"top:{_num(top)}px",
+        f"width:{_num(width)}px",
+        f"height:{_num(height)}px",
+    ]
+
+    transforms = []
+    if angle:
+        transforms.append(f"rotate({_num(angle)}deg)")
+    if obj.get("flipX") or obj.get("flipY"):
+        transforms.append(f"scale({-1 if obj.get('flipX') else 1},{-1 if obj.get('flipY') else 1})")
+    if extra_transform:
+        transforms.append(extra_transform)
+    if transforms:
+        styles.append("transform:" + " ".join(transforms))
+
+    opacity = _float(obj, "opacity", 1.0)
+    if opacity < 1:
+        styles.append(f"opacity:{_num(opacity)}")
+
+    composite = obj.get("globalCompositeOperation") or "source-over"
+    if composite != "source-over":
+        if composite not in BLEND_MODES:
+            raise UnsupportedObject(f"composite {composite}")
+        styles.append(f"mix-blend-mode:{composite}")
+    return styles
+
+
+def _scaled_size(obj: dict) -> tuple[float, float, float, float]:
+    scale_x = _float(obj, "scaleX", 1.0)
+    scale_y = _float(obj, "scaleY", 1.0)
+    return _float(obj, "width") * scale_x, _float(obj, "height") * scale_y, scale_x, scale_y
+
+
+def _stroke_width(obj: dict) -> float:
+    return _float(obj, "strokeWidth", 1.0) if obj.get("stroke") else 0.0
+
+
+def _compile_shape(obj: dict, kind: str) -> str:
+    scale_x = _float(obj, "scaleX", 1.0)
+    scale_y = _float(obj, "scaleY", 1.0)
+    if kind == "circle":
+        if _float(obj, "startAngle") or _float(obj, "endAngle", 360) not in (0, 360):
+            raise UnsupportedObject("arc")
+        radius = _float(obj, "radius", _float(obj, "width") / 2)
+        base_w = base_h = radius * 2
+    elif kind == "ellipse":
+        base_w = _float(obj, "rx", _float(obj, "width") / 2) * 2
+        base_h = _float(obj, "ry", _float(obj, "height") / 2) * 2
+    else:
+        base_w = _float(obj, "width")
+        base_h = _float(obj, "height")
+
+    stroke = _stroke_width(obj)
+    if obj.get("strokeDashArray"):
+        raise UnsupportedObject("dashed stroke")
+    width = (base_w + stroke) * scale_x
+    height = (base_h + stroke) * scale_y
+
+    styles = _common_styles(obj, width, height)
+    styles.append("box-sizing:border-box")
+
+    fill = _paint(obj.get("fill", "rgb(0,0,0)"), width, height)
+    if fill:
+        styles.append(f"background:{fill}")
+
+    stroke_paint = _paint(obj.get("stroke"), width, height) if stroke else None
+    if kind == "triangle":
+        if stroke_paint:
+            raise UnsupportedObject("stroked triangle")
+        styles.append("clip-path:polygon(50% 0,100% 100%,0 100%)")
+    elif stroke_paint:
+        if stroke_paint.startswith(("linear-gradient", "radial-gradient")):
+            raise UnsupportedObject("gradient stroke")
+        styles.append(f"border:{_num(stroke * scale_x)}px solid {stroke_paint}")
+
+    if kind in ("circle", "ellipse"):
+        styles.append("border-radius:50%")
+    elif kind == "rect":
+        rx = _float(obj, "rx")
+        ry = _float(obj, "ry", rx)
+        if rx or ry:
+            styles.append(f"border-radius:{_num(rx * scale_x)}px/{_num(ry * scale_y)}px")
+
+    shadow = _shadow(obj.get("shadow"))
+    if shadow:
+        x, y, blur, color = shadow
+        styles.append(f"box-shadow:{_num(x)}px {_num(y)}px {_num(blur)}px {color}")
+
+    return f'<div style="{_style_attr(styles)}"></div>'
+
+
+def _compile_line(obj: dict) -> str:
+    scale_x = _float(obj, "scaleX", 1.0)
+    scale_y = _float(obj, "scaleY", 1.0)
+    dx = (_float(obj, "x2") - _float(obj, "x1")) * scale_x
+    dy = (_float(obj, "y2") - _float(obj, "y1")) * scale_y
+    thickness = max(_float(obj, "strokeWidth", 1.0) * scale_y, 1.0)
+    stroke = _paint(obj.get("stroke"), 0, 0)
+    if not stroke:
+        return ""
+
+    # Fabric positions the line's bounding box; draw it as a bar through its center
+    box_w = abs(dx) + _stroke_width(obj) * scale_x
+    box_h = abs(dy) + _stroke_width(obj) * scale_y
+    box_left, box_top, angle = _box(obj, box_w, box_h)
+    length = math.hypot(dx, dy)
+    line_angle = math.degrees(math.atan2(dy, dx)) + angle
+
+    styled = dict(obj, angle=0, originX="left", originY="top")
+    styled["left"] = box_left + box_w / 2 - length / 2
+    styled["top"] = box_top + box_h / 2 - thickness / 2
+    styles = _common_styles(styled, length, thickness, f"rotate({_num(line_angle)}deg)" if line_angle else "")
+    styles.append(f"background:{stroke}")
+    return f'<div style="{_style_attr(styles)}"></div>'
+
+
+def _compile_text(obj: dict, kind: str) -> str:
+    styles_map = obj.get("styles")
+    if styles_map and any(styles_map.values() if isinstance(styles_map, dict) else styles_map):
+        raise UnsupportedObject("per-character styles")
+    if obj.get("path"):
+        raise UnsupportedObject("text on path")
+
+    width, height, scale_x, scale_y = _scaled_size(obj)
+    styles = _common_styles(obj, width, height)
+
+    font_size = _float(obj, "fontSize", 40.0) * scale_y
+    styles += [
+        "margin:0",
+        f"font-size:{_num(font_size)}px",
+        f"font-family:{obj.get('fontFamily') or 'Times New Roman'}",
+        f"line-height:{_num(_float(obj, 'lineHeight', 1.16))}",
+        "white-space:pre-wrap" if kind == "textbox" else "white-space:pre",
+    ]
+    if kind == "textbox" and obj.get("splitByGrapheme"):
+        styles.append("word-break:break-all")
+
+    fill = _paint(obj.get("fill", "rgb(0,0,0)"), width, height)
+    if fill and fill.startswith(("linear-gradient", "radial-gradient")):
+        styles += [f"background:{fill}", "-webkit-background-clip:text", "background-clip:text", "color:transparent"]
+    elif fill:
+        styles.append(f"color:{fill}")
+
+    weight = obj.get("fontWeight", "normal")
+    if weight not in (None, "normal", 400, "400"):
+        styles.append(f"font-weight:{weight}")
+    if obj.get("fontStyle") in ("italic", "oblique"):
+        styles.append(f"font-style:{obj['fontStyle']}")
+
+    align = obj.get("textAlign", "left") or "left"
+    if align.startswith("justify"):
+        align = "justify"
+    if align != "left":
+        styles.append(f"text-align:{align}")
+
+    decorations = [name for key, name in (("underline", "underline"), ("linethrough", "line-through"), ("overline", "overline")) if obj.get(key)]
+    if decorations:
+        styles.append("text-decoration:" + " ".join(decorations))
+
+    char_spacing = _float(obj, "charSpacing")
+    if char_spacing:
+        styles.append(f"letter-spacing:{_num(char_spacing / 1000)}em")
+
+    if obj.get("stroke") and _float(obj, "strokeWidth", 1.0):
+        stroke = _paint(obj.get("stroke"), width, height)
+        styles.append(f"-webkit-text-stroke:{_num(_float(obj, 'strokeWidth', 1.0) * scale_y)}px {stroke}")
+
+    if obj.get("textBackgroundColor"):
+        styles.append(f"background-color:{obj['textBackgroundColor']}")
+
+    shadow = _shadow(obj.get("shadow"))
+    if shadow:
+        x, y, blur, color = shadow
+        styles.append(f"text-shadow:{_num(x)}px {_num(y)}px {_num(blur)}px {color}")
+
+    text = html.escape(str(obj.get("text", "")))
+    return f'<div style="{_style_attr(styles)}">{text}</div>'
+
+
+def _compile_image(obj: dict) -> str:
+    if _float(obj, "cropX") or _float(obj, "cropY"):
+        raise UnsupportedObject("cropped image")
+    if obj.get("filters"):
+        raise UnsupportedObject("image filters")
+    src = obj.get("src")
+    if not src:
+        raise UnsupportedObject("image without src")
+
+    width, height, _, _ = _scaled_size(obj)
+    styles = _common_styles(obj, width, height)
+    styles += ["display:block", "object-fit:fill"]
+
+    shadow = _shadow(obj.get("shadow"))
+    if shadow:
+        x, y, blur, color = shadow
+        styles.append(f"filter:drop-shadow({_num(x)}px {_num(y)}px {_num(blur)}px {color})")
+
+    return f'<img src="{html.escape(src, quote=True)}" style="{_style_attr(styles)}" alt="" />'
+
+
+def compile_object(obj: dict) -> str:
+    """Compile one Fabric object to an HTML fragment or raise UnsupportedObject."""
+    kind = TYPE_ALIASES.get(str(obj.get("type", "")).lower())
+    if kind is None:
+        raise UnsupportedObject(f"type {obj.get('type')}")
+    if obj.get("visible") is False:
+        return ""
+    if kind in TEXT_TYPES:
+        return _compile_text(obj, kind)
+    if kind == "image":
+        return _compile_image(obj)
+    if kind == "line":
+        return _compile_line(obj)
+    return _compile_shape(obj, kind)
+
+
+def canvas_objects(canvas_data: dict) -> list:
+    """The canvas objects in z-order, a backgroundImage first; one fragment each."""
+    objects = list(canvas_data.get("objects", []))
+    if isinstance(canvas_data.get("backgroundImage"), dict):
+        objects.insert(0, canvas_data["backgroundImage"])
+    return objects
+
+
+def compile_canvas(canvas_data: dict, rendered: dict | None = None) -> CompiledCanvas:
+    """
+    Compile a Fabric canvas, leaving unsupported objects for the caller.
+    `rendered` maps z-index -> a fragment already made for that object.
+    """
+    rendered = rendered or {}
+    width = canvas_data.get("width", 800)
+    height = canvas_data.get("height", 600)
+
+    background = canvas_data.get("background", "#ffffff")
+    try:
+        background = _paint(background, width, height) or "#ffffff"
+    except UnsupportedObject:
+        background = "#ffffff"
+
+    compiled = CompiledCanvas(width=width, height=height, background=background)
+
+    for index, obj in enumerate(canvas_objects(canvas_data)):
+        if index in rendered:
+            compiled.fragments.append(rendered[index])
+            continue
+        try:
+            compiled.fragments.append(compile_object(obj))
+        except (UnsupportedObject, TypeError, ValueError, AttributeError):
+            compiled.fragments.append(None)
+            compiled.unsupported[index] = obj
+
+    return compiled
+
+
+# ============ LLM FRAGMENT SPLITTING ============
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+
+class _FragmentSplitter(HTMLParser):
+    """Collects the outermost elements carrying a data-fabric-index attribute."""
+
+    def __init__(self, source: str):
+        super().__init__(convert_charrefs=False)
+        self.source = source
+        self.line_offsets = [0]
+        for line in source.splitlines(keepends=True):
+            self.line_offsets.append(self.line_offsets[-1] + len(line))
+        self.stack = []
+        self.fragments = {}
+
+    def _offset(self) -> int:
+        line, col = self.getpos()
+        return self.line_offsets[line - 1] + col
+
+    def _close(self, entry, end: int):
+        tag, start, index = entry
+        if index is not None and not any(e[2] is not None for e in self.stack):
+            self.fragments.setdefault(index, "")
+            self.fragments[index] += self.source[start:end]
+
+    def handle_starttag(self, tag, attrs):
+        start = self._offset()
+        raw_index = dict(attrs).get("data-fabric-index")
+        index = int(raw_index) if raw_index and raw_index.isdigit() else None
+        entry = (tag, start, index)
+        if tag in VOID_TAGS:
+            self._close(entry, start + len(self.get_starttag_text()))
+        else:
+            self.stack.append(entry)
+
+    def handle_startendtag(self, tag, attrs):
+        start = self._offset()
+        raw_index = dict(attrs).get("data-fabric-index")
+        index = int(raw_index) if raw_index and raw_index.isdigit() else None
+        self._close((tag, start, index), start + len(self.get_starttag_text()))
+
+    def handle_endtag(self, tag):
+        if not any(e[0] == tag for e in self.stack):
+            return
+        end = self.source.find(">", self._offset()) + 1
+        while self.stack:
+            entry = self.stack.pop()
+            if entry[0] == tag:
+                self._close(entry, end)
+                break
+
+
+def split_fragments(source: str) -> dict:
+    """Map data-fabric-index -> outer HTML of the element(s) the LLM produced for it."""
+    splitter = _FragmentSplitter(source)
+    splitter.feed(source)
+    splitter.close()
+    return splitter.fragments
@@ -0,0 +1,39 @@
+"""
+Fast JSON responses for models we have just built ourselves.
+
+Returning a pydantic model through `response_model` makes FastAPI dump it to
+a dict, validate that dict again and encode the result. Our response models
+are validated when constructed, so endpoints return FastJSONResponse instead:
+orjson encodes the model's fields as they are (large Fabric object lists and
+HTML strings are passed through, not copied), falling back to the stdlib
+encoder for anything orjson can't represent.
+"""
+import json
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _fields(value):
+    if isinstance(value, BaseModel):
+        return {name: getattr(value, name) for name in type(value).model_fields}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    try:
+        return orjson.dumps(content, default=_fields, option=OPTIONS)
+    except (TypeError, orjson.JSONEncodeError):
+        # e.g. integers beyond 64 bits, or types only FastAPI's encoder knows
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,119 @@
+"""
+Hedged calls across providers.
+
+The primary provider gets a head start equal to a percentile of its recent
+latency. If it hasn't answered by then, the same request goes to the other
+provider; the first valid result wins and the loser is cancelled. A primary
+that fails outright is hedged immediately.
+"""
+import asyncio
+import time
+from collections import deque
+
+# Latency samples kept per provider
+LATENCY_SAMPLES = 200
+
+
+class LatencyTracker:
+    def __init__(self, samples: int = LATENCY_SAMPLES):
+        self._samples: dict[str, deque] = {}
+        self.maxlen = samples
+
+    def record(self, provider: str, seconds: float):
+        self._samples.setdefault(provider, deque(maxlen=self.maxlen)).append(seconds)
+
+    def providers(self) -> list[str]:
+        return list(self._samples)
+
+    def count(self, provider: str) -> int:
+        return len(self._samples.get(provider, ()))
+
+    def percentile(self, provider: str, p: float) -> float | None:
+        samples = sorted(self._samples.get(provider, ()))
+        if not samples:
+            return None
+        return samples[min(int(len(samples) * p), len(samples) - 1)]
+
+
+class Hedger:
+    def __init__(self, percentile: float = 0.95, min_samples: int = 20, default_delay: float = 10.0,
+                 min_delay: float = 1.0):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.latency = LatencyTracker()
+        self.requests = 0
+        self.hedged = 0
+        self.wins = {"primary": 0, "secondary": 0}
+        self.failures = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "Hedger":
+        return cls(
+            percentile=settings.HEDGE_PERCENTILE,
+            min_samples=settings.HEDGE_MIN_SAMPLES,
+            default_delay=settings.HEDGE_DEFAULT_DELAY_SECONDS,
+            min_delay=settings.HEDGE_MIN_DELAY_SECONDS,
+        )
+
+    def delay_for(self, provider: str) -> float:
+        """Head start for `provider` before the hedge is sent."""
+        if self.latency.count(provider) < self.min_samples:
+            return self.default_delay
+        return max(self.latency.percentile(provider, self.percentile), self.min_delay)
+
+    async def run(self, primary: str, primary_call, secondary: str, secondary_call):
+        """
+        Await `primary_call()`, hedging with `secondary_call()` once the
+        primary is slower than usual. Both are zero-argument coroutine factories.
+        """
+        self.requests += 1
+        tasks = {asyncio.ensure_future(self._timed(primary, primary_call)): "primary"}
+        errors = {}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.delay_for(primary))
+            for task in done:
+                if task.exception() is None:
+                    self.wins["primary"] += 1
+                    return task.result()
+                errors["primary"] = task.exception()
+                tasks.pop(task)
+
+            self.hedged += 1
+            reason = "failed" if errors else "slow"
+            print(f"[HEDGE] {primary} {reason}, also asking {secondary}")
+            tasks[asyncio.ensure_future(self._timed(secondary, secondary_call))] = "secondary"
+
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    role = tasks.pop(task)
+                    if task.exception() is None:
+                        self.wins[role] += 1
+                        return task.result()
+                    errors[role] = task.exception()
+
+            self.failures += 1
+            raise errors.get("primary") or errors["secondary"]
+        finally:
+            # Cancel the loser (or everything, if our caller went away)
+            for task in tasks:
+                task.cancel()
+
+    async def _timed(self, provider: str, call):
+        started = time.monotonic()
+        result = await call()
+        self.latency.record(provider, time.monotonic() - started)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+            "primary_wins": self.wins["primary"],
+            "secondary_wins": self.wins["secondary"],
+            "both_failed": self.failures,
+            "delay_seconds": {provider: round(self.delay_for(provider), 3) for provider in self.latency.providers()},
+        }
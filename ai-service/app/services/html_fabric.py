@@ -0,0 +1,629 @@
+"""
+Native HTML/CSS -> Fabric.js 6 converter.
+
+Understands the subset our own endpoints produce: a position:relative stage
+with absolutely positioned children, inline styles, px/% offsets,
+translate(-50%,-50%) centering, rotate(), linear/radial gradients, box/text
+shadows, borders, radii and <img> tags. Nodes outside that subset (flow/flex
+layouts, SVG, tables ...) are left as empty slots for the LLM fallback.
+"""
+import math
+import re
+from dataclasses import dataclass, field
+
+from app.services.html_tree import (
+    Node, find_container, parse_html, parse_length, parse_url, split_top_level,
+)
+
+FABRIC_VERSION = "6.0.2"
+
+INLINE_TAGS = {"span", "b", "strong", "i", "em", "u", "br", "small", "a", "sup", "sub", "mark", "s", "strike", "font", "label"}
+SKIP_TAGS = {"style", "script", "meta", "link", "title", "head", "br"}
+UNSUPPORTED_TAGS = {"svg", "canvas", "video", "iframe", "table", "ul", "ol", "picture", "object", "form", "input", "select", "textarea"}
+HEADING_SCALE = {"h1": 2.0, "h2": 1.5, "h3": 1.17, "h4": 1.0, "h5": 0.83, "h6": 0.67}
+BOLD_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6", "b", "strong"}
+INHERITED = ("color", "font-family", "font-size", "font-weight", "font-style", "line-height",
+             "text-align", "letter-spacing", "text-transform", "text-shadow", "white-space")
+
+DEFAULT_LINE_HEIGHT = 1.16
+
+
+class UnsupportedNode(Exception):
+    """Raised when a node needs the LLM fallback."""
+
+
+@dataclass
+class Box:
+    left: float
+    top: float
+    width: float | None
+    height: float | None
+    origin_x: str = "left"
+    origin_y: str = "top"
+    angle: float = 0.0
+
+    def anchor(self) -> tuple[float, float]:
+        """Fabric left/top for this box's origin."""
+        x, y = self.left, self.top
+        if self.origin_x == "center" and self.width is not None:
+            x += self.width / 2
+        if self.origin_y == "center" and self.height is not None:
+            y += self.height / 2
+        return x, y
+
+    def placement(self) -> dict:
+        left, top = self.anchor()
+        props = {"left": _round(left), "top": _round(top), "originX": self.origin_x, "originY": self.origin_y}
+        if self.angle:
+            props["angle"] = _round(self.angle)
+        return props
+
+
+@dataclass
+class ParsedDesign:
+    width: int
+    height: int
+    background: str = "#ffffff"
+    # One list of Fabric objects per top-down slot; None marks an unsupported node
+    slots: list = field(default_factory=list)
+    # slot index -> (node, parent box, reason) for the LLM fallback
+    unsupported: dict = field(default_factory=dict)
+    # node -> original Fabric object for untouched preview elements, or None
+    reuse: object = None
+    reused: int = 0
+
+    def objects(self, translated: dict | None = None) -> list:
+        translated = translated or {}
+        result = []
+        for index, slot in enumerate(self.slots):
+            result.extend(translated.get(index, []) if slot is None else slot)
+        return result
+
+
+def _round(value: float) -> float:
+    value = round(float(value), 2)
+    return int(value) if value.is_integer() else value
+
+
+# ============ CSS VALUE PARSING ============
+
+def _angle(value: str) -> float:
+    value = value.strip().lower()
+    match = re.match(r"^(-?\d*\.?\d+)(deg|rad|turn|grad)?$", value)
+    if not match:
+        raise UnsupportedNode(f"angle {value}")
+    number, unit = float(match.group(1)), match.group(2) or "deg"
+    return {"deg": number, "rad": math.degrees(number), "turn": number * 360, "grad": number * 0.9}[unit]
+
+
+_SIDE_ANGLES = {
+    "to top": 0, "to right": 90, "to bottom": 180, "to left": 270,
+    "to top right": 45, "to right top": 45, "to bottom right": 135, "to right bottom": 135,
+    "to bottom left": 225, "to left bottom": 225, "to top left": 315, "to left top": 315,
+}
+
+
+def _color_stops(args: list[str], length: float) -> list[dict]:
+    stops = []
+    for arg in args:
+        tokens = split_top_level(arg, " ")
+        offset = None
+        if len(tokens) > 1:
+            offset = parse_length(tokens[1], 100.0)
+            if offset is not None and not tokens[1].endswith("%"):
+                offset = offset / length * 100 if length else None
+        stops.append({"color": tokens[0], "offset": None if offset is None else offset / 100})
+
+    # Unpositioned stops are spread evenly between their neighbours
+    if stops:
+        if stops[0]["offset"] is None:
+            stops[0]["offset"] = 0.0
+        if stops[-1]["offset"] is None:
+            stops[-1]["offset"] = 1.0
+        i = 0
+        while i < len(stops):
+            if stops[i]["offset"] is None:
+                j = i
+                while stops[j]["offset"] is None:
+                    j += 1
+                start, end = stops[i - 1]["offset"], stops[j]["offset"]
+                for k in range(i, j):
+                    stops[k]["offset"] = start + (end - start) * (k - i + 1) / (j - i + 1)
+                i = j
+            i += 1
+    return [{"offset": _round(max(0.0, min(1.0, s["offset"]))), "color": s["color"]} for s in stops]
+
+
+def parse_gradient(value: str, width: float, height: float) -> dict | None:
+    """CSS linear/radial-gradient -> Fabric gradient with object-local pixel coords."""
+    match = re.search(r"(repeating-)?(linear|radial)-gradient\((.*)\)", value, re.S)
+    if not match:
+        return None
+    if match.group(1):
+        raise UnsupportedNode("repeating gradient")
+    kind, args = match.group(2), split_top_level(match.group(3), ",")
+    width = width or 0
+    height = height or 0
+
+    if kind == "linear":
+        angle = 180.0
+        first = args[0].strip().lower()
+        if first.startswith("to "):
+            angle = _SIDE_ANGLES.get(" ".join(first.split()), 180.0)
+            args = args[1:]
+        elif re.match(r"^-?\d", first):
+            angle = _angle(first)
+            args = args[1:]
+        rad = math.radians(angle)
+        length = abs(width * math.sin(rad)) + abs(height * math.cos(rad))
+        cx, cy = width / 2, height / 2
+        dx, dy = math.sin(rad) * length / 2, -math.cos(rad) * length / 2
+        return {
+            "type": "linear",
+            "coords": {"x1": _round(cx - dx), "y1": _round(cy - dy), "x2": _round(cx + dx), "y2": _round(cy + dy)},
+            "colorStops": _color_stops(args, length),
+        }
+
+    # radial: optional "<shape> <size> at <x> <y>" prelude
+    cx, cy = width / 2, height / 2
+    radius = None
+    first = args[0].strip().lower()
+    if not _looks_like_color(first.split()[0]):
+        shape, _, position = first.partition(" at ")
+        if first.startswith("at "):
+            shape, position = "", first[3:]
+        if position:
+            coords = position.split()
+            cx = parse_length(coords[0], width) if coords else cx
+            cy = parse_length(coords[1], height) if len(coords) > 1 else cy
+            cx = width / 2 if cx is None else cx
+            cy = height / 2 if cy is None else cy
+        for token in shape.split():
+            size = parse_length(token, max(width, height))
+            if size:
+                radius = size
+                break
+        args = args[1:]
+    if radius is None:
+        # farthest-corner default
+        radius = max(math.hypot(x - cx, y - cy) for x in (0, width) for y in (0, height))
+    return {
+        "type": "radial",
+        "coords": {"x1": _round(cx), "y1": _round(cy), "r1": 0, "x2": _round(cx), "y2": _round(cy), "r2": _round(radius)},
+        "colorStops": _color_stops(args, radius),
+    }
+
+
+def _looks_like_color(token: str) -> bool:
+    return token.startswith(("#", "rgb", "hsl")) or token.isalpha() and token not in ("circle", "ellipse", "at", "closest", "farthest")
+
+
+def parse_shadow(value: str) -> dict | None:
+    """First (non-inset) box-shadow/text-shadow/drop-shadow -> Fabric shadow."""
+    if not value or value.strip() == "none":
+        return None
+    first = split_top_level(value, ",")[0]
+    tokens = split_top_level(first, " ")
+    if "inset" in tokens:
+        return None
+    lengths, color = [], "rgba(0,0,0,0.3)"
+    for token in tokens:
+        length = parse_length(token)
+        if length is not None:
+            lengths.append(length)
+        else:
+            color = token
+    lengths += [0.0] * (3 - len(lengths))
+    return {"color": color, "blur": _round(lengths[2]), "offsetX": _round(lengths[0]), "offsetY": _round(lengths[1])}
+
+
+def _sides(value: str | None, reference: float) -> list[float]:
+    """margin/padding shorthand -> [top, right, bottom, left]."""
+    values = [parse_length(v, reference) or 0.0 for v in (value or "").split()] or [0.0]
+    while len(values) < 4:
+        values.append(values[{1: 0, 2: 0, 3: 1}[len(values)]])
+    return values[:4]
+
+
+def _side(style: dict, prop: str, side: str, reference: float) -> float:
+    index = ("top", "right", "bottom", "left").index(side)
+    longhand = parse_length(style.get(f"{prop}-{side}"), reference)
+    return longhand if longhand is not None else _sides(style.get(prop), reference)[index]
+
+
+def _border(style: dict) -> tuple[float, str | None]:
+    width, color = 0.0, None
+    shorthand = style.get("border")
+    if shorthand and shorthand not in ("none", "0"):
+        for token in split_top_level(shorthand, " "):
+            length = parse_length(token)
+            if length is not None:
+                width = length
+            elif token not in ("solid", "dashed", "dotted", "double", "none"):
+                color = token
+        if color is None and width:
+            color = "#000000"
+    if style.get("border-width"):
+        width = parse_length(style["border-width"].split()[0]) or width
+    if style.get("border-color"):
+        color = style["border-color"]
+    return (width, color) if width and color else (0.0, None)
+
+
+def _background_layers(style: dict, width: float, height: float) -> tuple[str | dict | None, str | None]:
+    """Returns (fill, image_url) from background/background-color/background-image."""
+    fill, image = None, None
+    for prop in ("background", "background-color", "background-image"):
+        value = style.get(prop)
+        if not value or value in ("none", "transparent"):
+            continue
+        if "gradient(" in value:
+            layer = next(layer for layer in split_top_level(value, ",") if "gradient(" in layer)
+            fill = parse_gradient(layer, width, height)
+        elif "url(" in value:
+            image = parse_url(value)
+            color = next((t for t in split_top_level(value, " ") if _looks_like_color(t) and not t.startswith("url")), None)
+            if color and color not in ("center", "cover", "contain", "no-repeat", "top", "left", "right", "bottom", "repeat"):
+                fill = color
+        else:
+            fill = split_top_level(value, " ")[0] if prop == "background" else value
+    return fill, image
+
+
+# ============ TREE WALK ============
+
+def _inherit(inherited: dict, node: Node, style: dict) -> dict:
+    result = dict(inherited)
+    base_size = parse_length(inherited.get("font-size"), 16.0) or 16.0
+    if node.tag in HEADING_SCALE and "font-size" not in style:
+        result["font-size"] = f"{base_size * HEADING_SCALE[node.tag]}px"
+    if node.tag in BOLD_TAGS and "font-weight" not in style:
+        result["font-weight"] = "bold"
+    if node.tag in ("i", "em") and "font-style" not in style:
+        result["font-style"] = "italic"
+    for prop in INHERITED:
+        if prop in style and style[prop] != "inherit":
+            value = style[prop]
+            if prop == "font-size":
+                value = f"{parse_length(value, base_size, base_size) or base_size}px"
+            result[prop] = value
+    return result
+
+
+def _transform(value: str, box: Box):
+    for name, raw in re.findall(r"([a-zA-Z0-9]+)\(([^)]*)\)", value or ""):
+        name = name.lower()
+        args = [a.strip() for a in raw.split(",")] if "," in raw else raw.split()
+        if name in ("translate", "translatex", "translatey"):
+            tx = args[0] if name != "translatey" else "0"
+            ty = (args[1] if len(args) > 1 else "0") if name == "translate" else (args[0] if name == "translatey" else "0")
+            for axis, amount in (("x", tx), ("y", ty)):
+                size = box.width if axis == "x" else box.height
+                if amount.strip() == "-50%":
+                    if axis == "x":
+                        box.origin_x = "center"
+                    else:
+                        box.origin_y = "center"
+                    continue
+                offset = parse_length(amount, size or 0)
+                if offset is None or (amount.endswith("%") and size is None):
+                    raise UnsupportedNode(f"translate {amount}")
+                if axis == "x":
+                    box.left += offset
+                else:
+                    box.top += offset
+        elif name == "rotate":
+            box.angle += _angle(args[0])
+        else:
+            raise UnsupportedNode(f"transform {name}")
+
+
+def _resolve_box(node: Node, style: dict, parent: Box) -> Box:
+    parent_w = parent.width or 0.0
+    parent_h = parent.height or 0.0
+    width = parse_length(style.get("width"), parent_w)
+    height = parse_length(style.get("height"), parent_h)
+    if node.tag == "img":
+        width = width if width is not None else parse_length(node.attrs.get("width"))
+        height = height if height is not None else parse_length(node.attrs.get("height"))
+
+    left = parse_length(style.get("left"), parent_w)
+    top = parse_length(style.get("top"), parent_h)
+    right = parse_length(style.get("right"), parent_w)
+    bottom = parse_length(style.get("bottom"), parent_h)
+
+    if width is None and left is not None and right is not None:
+        width = parent_w - left - right
+    if height is None and top is not None and bottom is not None:
+        height = parent_h - top - bottom
+    if left is None and right is not None and width is not None:
+        left = parent_w - right - width
+    if top is None and bottom is not None and height is not None:
+        top = parent_h - bottom - height
+
+    box = Box(
+        left=parent.left + (left or 0.0) + _side(style, "margin", "left", parent_w),
+        top=parent.top + (top or 0.0) + _side(style, "margin", "top", parent_w),
+        width=width,
+        height=height,
+    )
+    _transform(style.get("transform"), box)
+
+    # CSS rotates about the box center; Fabric about its origin
+    if box.angle and box.width is not None and box.height is not None:
+        box.origin_x = box.origin_y = "center"
+    return box
+
+
+def _text_of(node: Node, inherited: dict) -> str:
+    raw = node.text_content()
+    if inherited.get("white-space", "normal") not in ("pre", "pre-wrap", "pre-line", "break-spaces"):
+        raw = "\n".join(" ".join(line.split()) for line in raw.split("\n")).strip()
+        raw = re.sub(r" *\n *", "\n", raw)
+    transform = inherited.get("text-transform")
+    if transform == "uppercase":
+        raw = raw.upper()
+    elif transform == "lowercase":
+        raw = raw.lower()
+    elif transform == "capitalize":
+        raw = raw.title()
+    return raw
+
+
+def _text_object(node: Node, style: dict, inherited: dict, box: Box, text: str) -> dict:
+    font_size = parse_length(inherited.get("font-size"), 16.0) or 16.0
+    line_height = inherited.get("line-height", "normal")
+    if line_height == "normal":
+        line_height = DEFAULT_LINE_HEIGHT
+    else:
+        px = parse_length(line_height, font_size, font_size)
+        line_height = float(line_height) if re.fullmatch(r"\d*\.?\d+", line_height) else (px / font_size if px else DEFAULT_LINE_HEIGHT)
+
+    ref_w = box.width or 0.0
+    pad_left = _side(style, "padding", "left", ref_w)
+    pad_top = _side(style, "padding", "top", ref_w)
+    pad_right = _side(style, "padding", "right", ref_w)
+    pad_bottom = _side(style, "padding", "bottom", ref_w)
+    border_box = style.get("box-sizing") == "border-box"
+
+    text_box = Box(box.left + pad_left, box.top + pad_top, box.width, box.height, box.origin_x, box.origin_y, box.angle)
+    if box.width is not None:
+        text_box.width = box.width - (pad_left + pad_right if border_box else 0)
+    lines = text.count("\n") + 1
+    text_height = lines * font_size * line_height
+
+    # Flex/line-height centering inside a sized box
+    if box.height is not None and box.origin_y == "top" and box.angle == 0:
+        inner_h = box.height - (pad_top + pad_bottom if border_box else 0)
+        if style.get("display") in ("flex", "inline-flex") and style.get("align-items") == "center":
+            text_box.top += (inner_h - text_height) / 2
+        elif style.get("display") in ("flex", "inline-flex") and style.get("align-items") == "flex-end":
+            text_box.top += inner_h - text_height
+    text_box.height = None if box.origin_y == "top" else text_box.height
+
+    align = inherited.get("text-align", "left")
+    if style.get("display") in ("flex", "inline-flex") and style.get("justify-content") == "center":
+        align = "center"
+    align = {"start": "left", "end": "right"}.get(align, align)
+
+    weight = inherited.get("font-weight", "normal")
+    weight = int(weight) if str(weight).isdigit() else ("bold" if weight in ("bold", "bolder") else "normal")
+
+    obj = {
+        "type": "textbox" if text_box.width else "i-text",
+        **text_box.placement(),
+        "text": text,
+        "fontSize": _round(font_size),
+        "fontFamily": (inherited.get("font-family") or "Arial").replace('"', "'"),
+        "fill": inherited.get("color", "#000000"),
+        "fontWeight": weight,
+        "fontStyle": "italic" if inherited.get("font-style") in ("italic", "oblique") else "normal",
+        "textAlign": align if align in ("left", "center", "right", "justify") else "left",
+        "lineHeight": _round(line_height),
+    }
+    if text_box.width:
+        obj["width"] = _round(text_box.width)
+
+    clip = style.get("-webkit-background-clip") or style.get("background-clip")
+    if clip == "text":
+        gradient, _ = _background_layers(style, text_box.width or 0, text_height)
+        if isinstance(gradient, dict):
+            obj["fill"] = gradient
+
+    spacing = inherited.get("letter-spacing")
+    if spacing and spacing != "normal":
+        px = parse_length(spacing, 0, font_size)
+        if px:
+            obj["charSpacing"] = max(_round(px / font_size * 1000), -100)
+
+    decoration = style.get("text-decoration", "") + " " + style.get("text-decoration-line", "")
+    if "underline" in decoration or node.tag == "u":
+        obj["underline"] = True
+    if "line-through" in decoration or node.tag in ("s", "strike"):
+        obj["linethrough"] = True
+
+    shadow = parse_shadow(inherited.get("text-shadow", ""))
+    if shadow:
+        obj["shadow"] = shadow
+    return obj
+
+
+def _opacity(style: dict) -> float | None:
+    try:
+        value = float(style.get("opacity", 1))
+    except ValueError:
+        return None
+    return _round(value) if value < 1 else None
+
+
+def _is_text_leaf(node: Node) -> bool:
+    return all(child.tag in INLINE_TAGS for child in node.elements)
+
+
+def _convert_element(node: Node, style: dict, inherited: dict, parent: Box, design: ParsedDesign) -> list:
+    if node.tag in UNSUPPORTED_TAGS:
+        raise UnsupportedNode(node.tag)
+    box = _resolve_box(node, style, parent)
+    objects = []
+    opacity = _opacity(style)
+
+    if node.tag == "img":
+        src = node.attrs.get("src")
+        if not src or box.width is None or box.height is None:
+            raise UnsupportedNode("img without src or size")
+        obj = {
+            "type": "image", **box.placement(),
+            "width": _round(box.width), "height": _round(box.height),
+            "src": src, "crossOrigin": "anonymous",
+        }
+        filter_shadow = re.search(r"drop-shadow\(([^)]*(?:\([^)]*\))?[^)]*)\)", style.get("filter", ""))
+        shadow = parse_shadow(style.get("box-shadow", "")) or (parse_shadow(filter_shadow.group(1)) if filter_shadow else None)
+        if shadow:
+            obj["shadow"] = shadow
+        if opacity is not None:
+            obj["opacity"] = opacity
+        return [obj]
+
+    text_leaf = _is_text_leaf(node)
+    if not text_leaf:
+        flow = [c for c in node.elements if c.tag not in INLINE_TAGS and c.tag not in SKIP_TAGS
+                and c.style.get("position") not in ("absolute", "fixed")]
+        if flow and (len(flow) > 1 or style.get("display") in ("flex", "grid", "inline-flex", "inline-grid")):
+            raise UnsupportedNode("flow layout")
+        if box.angle:
+            raise UnsupportedNode("rotated container")
+
+    # Visual box: background, border, shadow
+    if box.width is not None and box.height is not None:
+        fill, image = _background_layers(style, box.width, box.height)
+        stroke_width, stroke = _border(style)
+        shadow = parse_shadow(style.get("box-shadow", ""))
+        clips_text = (style.get("-webkit-background-clip") or style.get("background-clip")) == "text"
+        if (fill or stroke or shadow) and not clips_text:
+            rect = {"type": "rect", **box.placement(), "fill": fill or "transparent"}
+            content_box = style.get("box-sizing") != "border-box"
+            # Fabric strokes are centered on the edge and add to the bounding box
+            rect["width"] = _round(box.width + (stroke_width if content_box else -stroke_width))
+            rect["height"] = _round(box.height + (stroke_width if content_box else -stroke_width))
+            if stroke:
+                rect["stroke"] = stroke
+                rect["strokeWidth"] = _round(stroke_width)
+            radius = parse_length((style.get("border-radius") or "").split("/")[0].split()[0] if style.get("border-radius") else None, box.width)
+            if radius:
+                rect["rx"] = rect["ry"] = _round(min(radius, box.width / 2, box.height / 2))
+            if shadow:
+                rect["shadow"] = shadow
+            if opacity is not None:
+                rect["opacity"] = opacity
+            objects.append(rect)
+        if image:
+            obj = {
+                "type": "image", **box.placement(),
+                "width": _round(box.width), "height": _round(box.height),
+                "src": image, "crossOrigin": "anonymous",
+            }
+            if opacity is not None:
+                obj["opacity"] = opacity
+            objects.append(obj)
+
+    if text_leaf:
+        text = _text_of(node, inherited)
+        if text:
+            obj = _text_object(node, style, inherited, box, text)
+            if opacity is not None:
+                obj["opacity"] = opacity
+            objects.append(obj)
+        return objects
+
+    # Children are positioned against this element's padding box
+    child_parent = Box(box.left, box.top, box.width if box.width is not None else parent.width,
+                       box.height if box.height is not None else parent.height)
+    design.slots.append(objects)
+    objects = []
+    _walk_children(node, child_parent, inherited, design)
+    return objects
+
+
+def _walk_children(node: Node, parent: Box, inherited: dict, design: ParsedDesign):
+    for child in node.children:
+        if isinstance(child, str):
+            if child.strip():
+                text = " ".join(child.split())
+                design.slots.append([{
+                    "type": "i-text", **parent.placement(), "text": text,
+                    "fontSize": _round(parse_length(inherited.get("font-size"), 16.0) or 16.0),
+                    "fontFamily": (inherited.get("font-family") or "Arial").replace('"', "'"),
+                    "fill": inherited.get("color", "#000000"),
+                }])
+            continue
+        if child.tag in SKIP_TAGS:
+            continue
+        original = design.reuse(child) if design.reuse is not None else None
+        if original is not None:
+            design.slots.append([original])
+            design.reused += 1
+            continue
+        style = child.style
+        if style.get("display") == "none" or style.get("visibility") == "hidden":
+            continue
+        child_inherited = _inherit(inherited, child, style)
+        slot = len(design.slots)
+        design.slots.append([])
+        try:
+            design.slots[slot] = _convert_element(child, style, child_inherited, parent, design)
+        except (UnsupportedNode, ValueError, IndexError, ZeroDivisionError) as e:
+            # Drop anything a partial conversion appended after this slot
+            del design.slots[slot + 1:]
+            for stale in [i for i in design.unsupported if i > slot]:
+                del design.unsupported[stale]
+            design.slots[slot] = None
+            design.unsupported[slot] = (child, parent, str(e))
+
+
+def parse_design(html_content: str, canvas_width: int, canvas_height: int, reuse=None) -> ParsedDesign:
+    """
+    Convert our HTML into Fabric objects, leaving unsupported nodes as None
+    slots. `reuse(node)` may return the original object for a node instead.
+    """
+    design = ParsedDesign(width=canvas_width, height=canvas_height, reuse=reuse)
+    container = find_container(parse_html(html_content))
+    if container is None:
+        return design
+
+    style = container.style
+    stage = Box(0.0, 0.0, float(canvas_width), float(canvas_height))
+    fill, image = _background_layers(style, canvas_width, canvas_height)
+
+    # Top-level background must be a plain color; gradients/images become locked objects
+    if isinstance(fill, str):
+        design.background = fill
+    elif isinstance(fill, dict):
+        design.slots.append([{
+            "type": "rect", "left": 0, "top": 0, "width": canvas_width, "height": canvas_height,
+            "fill": fill, "selectable": False, "evented": False,
+        }])
+    if image:
+        design.slots.append([{
+            "type": "image", "left": 0, "top": 0, "width": canvas_width, "height": canvas_height,
+            "src": image, "crossOrigin": "anonymous", "selectable": False, "evented": False,
+        }])
+
+    _walk_children(container, stage, _inherit({}, container, style), design)
+    return design
+
+
+def fallback_html(design: ParsedDesign) -> str:
+    """Stage containing only the unsupported nodes, each wrapped with its slot index."""
+    parts = []
+    for index, (node, parent, _) in design.unsupported.items():
+        size = ""
+        if parent.width is not None and parent.height is not None:
+            size = f"width:{_round(parent.width)}px;height:{_round(parent.height)}px;"
+        parts.append(
+            f'<div data-node-index="{index}" style="position:absolute;left:{_round(parent.left)}px;'
+            f'top:{_round(parent.top)}px;{size}">{node.to_html()}</div>'
+        )
+    return (
+        f'<div style="position:relative;width:{design.width}px;height:{design.height}px;">'
+        + "".join(parts) + "</div>"
+    )
@@ -0,0 +1,152 @@
+"""
+Element-level patches for assistant edits.
+
+Every element of the design gets a data-eid in document order before it is
+shown to the model. The model answers with EditOperations against those
+ids; they are applied here to the parsed tree and the ids are stripped
+again, so callers still receive plain full HTML.
+"""
+from app.schemas import EditOperation
+from app.services.html_tree import VOID_TAGS, Document, Node, find_container, parse_html
+
+EID_ATTR = "data-eid"
+
+# Attributes the model may not touch through an "update" op
+PROTECTED_ATTRS = {"style", EID_ATTR}
+
+
+class PatchError(ValueError):
+    """The operations don't apply to this document; regenerate instead."""
+
+
+def annotate(html_content: str) -> tuple[Document, str]:
+    """Parse and number every element of the stage. Returns (tree, annotated html)."""
+    root = parse_html(html_content)
+    container = find_container(root)
+    if container is None:
+        raise PatchError("no container element")
+    elements = (node for node in container.iter() if node.tag != "br")
+    for number, node in enumerate(elements):
+        node.attrs[EID_ATTR] = f"e{number}"
+    return root, root.to_html()
+
+
+def _index(root: Document) -> dict[str, Node]:
+    return {node.attrs[EID_ATTR]: node for node in root.iter() if EID_ATTR in node.attrs}
+
+
+def _target(nodes: dict[str, Node], eid: str) -> Node:
+    node = nodes.get(eid)
+    if node is None:
+        raise PatchError(f"unknown element {eid!r}")
+    return node
+
+
+def _position(parent: Node, index: int | None) -> int:
+    """Child-list position for the index-th element child of parent (None appends)."""
+    elements = parent.elements
+    if index is None or index >= len(elements):
+        return len(parent.children)
+    if index < 0:
+        raise PatchError(f"negative index {index}")
+    return parent.children.index(elements[index])
+
+
+def _refuse_void(node: Node, action: str):
+    # <img>, <br>, <input>... can't have children: the serializer would drop them silently
+    if node.tag in VOID_TAGS:
+        raise PatchError(f"can't {action} <{node.tag}> {node.attrs.get(EID_ATTR, '')}".rstrip())
+
+
+def _set_text(node: Node, text: str):
+    _refuse_void(node, "set the text of")
+    if any(child.tag != "br" for child in node.elements):
+        raise PatchError(f"{node.attrs[EID_ATTR]} is not a text element")
+    children = []
+    for number, line in enumerate(text.split("\n")):
+        if number:
+            children.append(Node("br", parent=node))
+        if line:
+            children.append(line)
+    node.children = children
+
+
+def _update(node: Node, operation: EditOperation):
+    if operation.style is None and operation.text is None and operation.attrs is None:
+        raise PatchError("update without style, text or attrs")
+    if operation.style:
+        style = node.style
+        for prop, value in operation.style.items():
+            prop = prop.strip().lower()
+            if value in (None, ""):
+                style.pop(prop, None)
+            else:
+                style[prop] = value.strip().rstrip(";")
+        node.set_style(style)
+    if operation.text is not None:
+        _set_text(node, operation.text)
+    for name, value in (operation.attrs or {}).items():
+        name = name.strip().lower()
+        if name in PROTECTED_ATTRS or name.startswith("on"):
+            raise PatchError(f"attribute {name!r} can't be patched")
+        if value is None:
+            node.attrs.pop(name, None)
+        else:
+            node.attrs[name] = value
+
+
+def _insert(parent: Node, operation: EditOperation):
+    if not operation.html:
+        raise PatchError("insert without html")
+    fragment = parse_html(operation.html)
+    if fragment.unclosed or not fragment.elements:
+        raise PatchError("insert html is not a complete element")
+    _refuse_void(parent, "insert into")
+    at = _position(parent, operation.index)
+    for node in fragment.children:
+        if isinstance(node, Node):
+            node.parent = parent
+            for descendant in node.iter():
+                descendant.attrs.pop(EID_ATTR, None)
+    parent.children[at:at] = fragment.children
+
+
+def _delete(node: Node, container: Node):
+    if node is container:
+        raise PatchError("can't delete the container")
+    node.parent.children.remove(node)
+
+
+def _reorder(node: Node, container: Node, index: int | None):
+    if node is container:
+        raise PatchError("can't reorder the container")
+    if index is None:
+        raise PatchError("reorder without index")
+    parent = node.parent
+    parent.children.remove(node)
+    parent.children.insert(_position(parent, index), node)
+
+
+def apply_patch(root: Document, operations: list[EditOperation]) -> str:
+    """
+    Apply operations in order to an annotated tree and return the HTML
+    without ids. Raises PatchError on the first operation that doesn't fit.
+    """
+    container = find_container(root)
+    nodes = _index(root)
+    for operation in operations:
+        node = _target(nodes, operation.id)
+        if operation.op == "update":
+            _update(node, operation)
+        elif operation.op == "insert":
+            _insert(node, operation)
+        elif operation.op == "delete":
+            _delete(node, container)
+            for descendant in node.iter():
+                nodes.pop(descendant.attrs.get(EID_ATTR), None)
+        elif operation.op == "reorder":
+            _reorder(node, container, operation.index)
+
+    for node in root.iter():
+        node.attrs.pop(EID_ATTR, None)
+    return root.to_html()
@@ -0,0 +1,208 @@
+"""
+Minimal HTML tree + inline CSS helpers for the absolutely-positioned markup
+our endpoints produce. Tolerant of unclosed tags; not a general DOM.
+"""
+import html
+import re
+from html.parser import HTMLParser
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+# Elements whose text is CSS/JS, not HTML: the parser leaves it raw, and so must we
+RAW_TEXT_TAGS = {"style", "script"}
+
+
+class Node:
+    """An element (or the synthetic #root) with ordered attrs and mixed children."""
+
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag: str, attrs: dict | None = None, parent: "Node | None" = None):
+        self.tag = tag
+        self.attrs = attrs if attrs is not None else {}
+        self.children = []  # Node | str
+        self.parent = parent
+
+    # ---- styles ----
+    @property
+    def style(self) -> dict:
+        return parse_style(self.attrs.get("style", ""))
+
+    def set_style(self, style: dict):
+        if style:
+            self.attrs["style"] = format_style(style)
+        else:
+            self.attrs.pop("style", None)
+
+    # ---- navigation ----
+    @property
+    def elements(self) -> list:
+        return [c for c in self.children if isinstance(c, Node)]
+
+    def iter(self):
+        """Depth-first over this node and all descendant elements."""
+        yield self
+        for child in self.elements:
+            yield from child.iter()
+
+    def find(self, tag: str):
+        return next((n for n in self.iter() if n.tag == tag), None)
+
+    def text_content(self) -> str:
+        parts = []
+        for child in self.children:
+            if isinstance(child, str):
+                parts.append(child)
+            elif child.tag == "br":
+                parts.append("\n")
+            else:
+                parts.append(child.text_content())
+        return "".join(parts)
+
+    # ---- serialization ----
+    def to_html(self) -> str:
+        if self.tag == "#root":
+            return "".join(_serialize(c) for c in self.children)
+        return _serialize(self)
+
+    def __repr__(self):
+        return f"<Node {self.tag} {self.attrs}>"
+
+
+class Document(Node):
+    """The synthetic #root; `unclosed` counts elements left open (truncated markup)."""
+
+    __slots__ = ("unclosed",)
+
+    def __init__(self):
+        super().__init__("#root")
+        self.unclosed = 0
+
+
+def _serialize(node) -> str:
+    if isinstance(node, str):
+        return html.escape(node, quote=False)
+    attrs = "".join(
+        f' {name}' if value is None else f' {name}="{html.escape(value, quote=True)}"'
+        for name, value in node.attrs.items()
+    )
+    if node.tag in VOID_TAGS:
+        return f"<{node.tag}{attrs} />"
+    if node.tag in RAW_TEXT_TAGS:
+        inner = "".join(c if isinstance(c, str) else _serialize(c) for c in node.children)
+    else:
+        inner = "".join(_serialize(c) for c in node.children)
+    return f"<{node.tag}{attrs}>{inner}</{node.tag}>"
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Document()
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, dict(attrs), self.current)
+        self.current.children.append(node)
+        if tag not in VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(Node(tag, dict(attrs), self.current))
+
+    def handle_endtag(self, tag):
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is self.root:
+            return  # stray close tag
+        self.current = node.parent
+
+    def handle_data(self, data):
+        if data:
+            self.current.children.append(data)
+
+
+def parse_html(source: str) -> Document:
+    builder = _TreeBuilder()
+    builder.feed(source or "")
+    builder.close()
+    node = builder.current
+    while node is not builder.root:
+        builder.root.unclosed += 1
+        node = node.parent
+    return builder.root
+
+
+def find_container(root: Node) -> Node | None:
+    """The outermost element, i.e. the design's stage div."""
+    elements = [n for n in root.elements if n.tag not in ("style", "script", "link", "meta")]
+    if elements and elements[0].tag in ("html", "body"):
+        body = elements[0].find("body") or elements[0]
+        elements = [n for n in body.elements if n.tag not in ("style", "script", "link", "meta")]
+    return elements[0] if elements else None
+
+
+# ============ INLINE CSS ============
+
+def split_top_level(value: str, sep: str = ",") -> list[str]:
+    """Split on `sep` outside of parentheses and quotes."""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, ch in enumerate(value):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(depth - 1, 0)
+        elif depth == 0 and (ch == sep or (sep == " " and ch.isspace())):
+            parts.append(value[start:i])
+            start = i + 1
+    parts.append(value[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def parse_style(style: str) -> dict:
+    """'a:b; c:d' -> {'a': 'b', 'c': 'd'} (keeps data: URLs intact)."""
+    result = {}
+    for declaration in split_top_level(style or "", ";"):
+        name, _, value = declaration.partition(":")
+        if value:
+            result[name.strip().lower()] = value.strip()
+    return result
+
+
+def format_style(style: dict) -> str:
+    return ";".join(f"{k}:{v}" for k, v in style.items()) + ";"
+
+
+_LENGTH_RE = re.compile(r"^(-?\d*\.?\d+)(px|%|em|rem|pt)?$")
+
+
+def parse_length(value, reference: float = 0.0, font_size: float = 16.0) -> float | None:
+    """CSS length -> px. Percentages resolve against `reference`."""
+    if value is None:
+        return None
+    value = str(value).strip().lower().replace("!important", "").strip()
+    if value in ("0", "auto", "none", ""):
+        return 0.0 if value == "0" else None
+    match = _LENGTH_RE.match(value)
+    if not match:
+        return None
+    number, unit = float(match.group(1)), match.group(2) or "px"
+    if unit == "%":
+        return number * reference / 100
+    if unit == "em":
+        return number * font_size
+    if unit == "rem":
+        return number * 16
+    if unit == "pt":
+        return number * 4 / 3
+    return number
+
+
+def parse_url(value: str) -> str | None:
+    match = re.search(r"url\(\s*(['\"]?)(.*?)\1\s*\)", value or "", re.S)
+    return match.group(2) if match else None
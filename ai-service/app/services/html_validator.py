@@ -0,0 +1,203 @@
+"""
+Structural checks for the design HTML models return.
+
+Every stage we hand back should be one container of the target size whose
+children are absolutely positioned, with images pointing at URLs we know.
+validate_design() repairs what can be fixed locally (container size and
+positioning, children placed with offsets but no position:absolute) and
+reports what can't: empty or truncated markup, no container, unplaced
+children, placeholder or invented image URLs. The service gives those one
+retry with the problems spelled out.
+"""
+import re
+from dataclasses import dataclass, field
+
+from app.services.html_tree import Node, find_container, parse_html, parse_length, parse_url, split_top_level
+from app.services.resize_engine import ResizeError, proportional_resize
+
+# Container size may be off by this much (px) before it counts as wrong
+SIZE_TOLERANCE = 1
+
+PLACEHOLDER_HOSTS = (
+    "example.com", "example.org", "placeholder.com", "placehold.co", "placehold.it", "placekitten.com",
+    "picsum.photos", "dummyimage.com", "fakeimg.pl", "source.unsplash.com", "loremflickr.com",
+)
+TEXT_URL_RE = re.compile(r"""https?://[^\s"'<>()\[\]]+""")
+PLACEHOLDER_RE = re.compile(r"placeholder|your[-_ ]?(image|logo|photo)|image[-_]?url|path/to/|^\.\.\.$|^#$", re.I)
+
+OFFSET_PROPS = ("left", "top", "right", "bottom")
+FLOW_DISPLAYS = ("flex", "inline-flex", "grid", "inline-grid")
+
+
+class InvalidHTML(ValueError):
+    """Model HTML still failed validation after its retry."""
+
+
+@dataclass
+class Validation:
+    html: str
+    problems: list[tuple[str, str]] = field(default_factory=list)  # (issue, message), need the model
+    repairs: list[str] = field(default_factory=list)  # issues fixed locally
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+    @property
+    def outcome(self) -> str:
+        return "invalid" if self.problems else "repaired" if self.repairs else "valid"
+
+    def describe(self) -> str:
+        return "\n".join(f"- {message}" for _, message in self.problems)
+
+
+def image_urls(node: Node) -> list[str]:
+    """img src and CSS url() references under `node`, in document order."""
+    urls = []
+    for element in node.iter():
+        if element.tag == "img":
+            urls.append(element.attrs.get("src") or "")
+        style = element.style
+        for prop in ("background", "background-image"):
+            for part in split_top_level(style.get(prop, "")):
+                url = parse_url(part)
+                if url is not None:
+                    urls.append(url)
+    return urls
+
+
+def text_urls(*texts: str) -> list[str]:
+    """http(s) URLs written in prose, e.g. pasted into a prompt or chat message."""
+    return [url.rstrip(".,;:!?") for text in texts if text for url in TEXT_URL_RE.findall(text)]
+
+
+def known_urls(*sources) -> set[str]:
+    """URLs the output may use: the ones in given HTML strings, plus any given directly."""
+    urls = set()
+    for source in sources:
+        if not source:
+            continue
+        if isinstance(source, str) and "<" in source:
+            urls.update(image_urls(parse_html(source)))
+        elif isinstance(source, str):
+            urls.add(source)
+        else:
+            urls.update(url for url in source if url)
+    return urls
+
+
+def stage_size(html: str) -> tuple[float, float] | None:
+    """The container's px width and height, if it declares both."""
+    container = find_container(parse_html(html or ""))
+    if container is None:
+        return None
+    style = container.style
+    width, height = parse_length(style.get("width")), parse_length(style.get("height"))
+    return (width, height) if width and height else None
+
+
+def _placeholder(url: str) -> bool:
+    host = re.sub(r"^[a-z]+://", "", url.lower()).split("/", 1)[0]
+    return not url.strip() or PLACEHOLDER_RE.search(url) is not None or any(
+        host == known or host.endswith("." + known) for known in PLACEHOLDER_HOSTS
+    )
+
+
+def _check_images(container: Node, known: set[str] | None, problems: list):
+    placeholders, unknown = [], []
+    for url in image_urls(container):
+        # Known URLs came from our input: whatever they look like, they are real
+        if url.startswith("data:") or (known is not None and url in known):
+            continue
+        if _placeholder(url):
+            placeholders.append(url or "(empty src)")
+        elif known is not None and url not in known:
+            unknown.append(url)
+    if not (placeholders or unknown):
+        return
+    hint = (f" Use only these image URLs, exactly as written: {', '.join(sorted(known))}." if known
+            else " Leave images out rather than inventing URLs.")
+    if placeholders:
+        problems.append(("placeholder_image", f"Placeholder image URLs: {', '.join(sorted(set(placeholders)))}." + hint))
+    if unknown:
+        problems.append(("unknown_image", f"Image URLs that were not provided: {', '.join(sorted(set(unknown)))}."
+                         + ("" if placeholders else hint)))
+
+
+def _fit_container(root: Node, container: Node, width: float, height: float, repairs: list) -> tuple[Node, Node]:
+    style = container.style
+    current_w = parse_length(style.get("width"))
+    current_h = parse_length(style.get("height"))
+    if current_w is not None and current_h is not None and (
+        abs(current_w - width) > SIZE_TOLERANCE or abs(current_h - height) > SIZE_TOLERANCE
+    ):
+        # Laid out for another size: scale the layout, not just the box
+        try:
+            root = parse_html(proportional_resize(root.to_html(), round(width), round(height)))
+            repairs.append("container_size")
+            return root, find_container(root)
+        except ResizeError:
+            pass
+    if current_w is None or current_h is None or abs(current_w - width) > SIZE_TOLERANCE \
+            or abs(current_h - height) > SIZE_TOLERANCE:
+        style.update({"width": f"{round(width)}px", "height": f"{round(height)}px"})
+        container.set_style(style)
+        repairs.append("container_size")
+    return root, container
+
+
+def validate_design(
+    html: str, width: float | None, height: float | None, known: set[str] | None = None, absolute_only: bool = True
+) -> Validation:
+    """
+    Check stage HTML for a width x height canvas (any size if None) and
+    repair what we can. `known` limits images to those URLs (data URLs always pass); with
+    absolute_only, children without a position are a problem unless the
+    container lays them out with flex or grid.
+    """
+    result = Validation(html=html)
+    problems, repairs = result.problems, result.repairs
+    if not (html or "").strip():
+        problems.append(("empty", "The HTML is empty."))
+        return result
+
+    root = parse_html(html)
+    if root.unclosed:
+        problems.append(("truncated", f"The HTML is truncated ({root.unclosed} elements left open). "
+                                      "Return the complete document."))
+    container = find_container(root)
+    if container is None:
+        problems.append(("no_container", "There is no container element."))
+        return result
+
+    if width and height:
+        root, container = _fit_container(root, container, width, height, repairs)
+    style = container.style
+    if style.get("position") not in ("relative", "absolute"):
+        style["position"] = "relative"
+        container.set_style(style)
+        repairs.append("container_position")
+
+    unplaced, placed = [], 0
+    flow = style.get("display") in FLOW_DISPLAYS
+    for child in container.elements:
+        child_style = child.style
+        if child.tag in ("style", "script") or child_style.get("position") in ("absolute", "fixed"):
+            continue
+        if any(prop in child_style for prop in OFFSET_PROPS):
+            child_style["position"] = "absolute"
+            child.set_style(child_style)
+            placed += 1
+        elif absolute_only and not flow:
+            unplaced.append(child.tag)
+    if placed:
+        repairs.append("position")
+    if unplaced:
+        problems.append(("unplaced", f"{len(unplaced)} elements inside the container have no position:absolute "
+                                     "with left/top. Position every element absolutely."))
+
+    _check_images(container, known, problems)
+    if repairs:
+        # Untouched markup goes back exactly as the model wrote it
+        result.html = root.to_html()
+    return result
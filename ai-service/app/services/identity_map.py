@@ -0,0 +1,119 @@
+"""
+Round-trip identity between Fabric objects and the preview HTML made from them.
+
+Every element the preview emits for an object carries a data-fabric-id (a
+hash of the object). After a preview is generated we remember, per element,
+its id -> the original object and a hash of the element's markup. When HTML
+comes back for conversion, an element whose id and markup are both unchanged
+is the original object: it is reused as is instead of being parsed again (or
+sent to the LLM), keeping every Fabric property. Edited elements no longer
+match their signature and are converted normally.
+"""
+import copy
+import hashlib
+
+from app.services.html_tree import Node, find_container, parse_html
+from app.services.response_cache import MemoryTier, canonical_json, payload_hash
+
+IDENTITY_ATTR = "data-fabric-id"
+
+
+def object_id(obj: dict) -> str:
+    return payload_hash(obj)[:16]
+
+
+def element_signature(node: Node) -> str:
+    """Hash of the element as our HTML tree serializes it, so quoting/void-tag style don't matter."""
+    return hashlib.sha256(node.to_html().encode("utf-8")).hexdigest()
+
+
+def _single_element(fragment: str) -> Node | None:
+    root = parse_html(fragment)
+    if root.unclosed or len(root.elements) != 1 or any(isinstance(c, str) and c.strip() for c in root.children):
+        return None
+    return root.elements[0]
+
+
+class IdentityMap:
+    """element id -> (element signature, original Fabric object), in a bounded LRU."""
+
+    def __init__(self, max_entries: int = 10_000, max_bytes: int = 64 * 1024 * 1024, ttl: float = 86400):
+        self.memory = MemoryTier(max_entries, max_bytes)
+        self.ttl = ttl
+        self.reused = 0
+        self.missed = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "IdentityMap":
+        return cls(
+            max_entries=settings.IDENTITY_MAP_MAX_ENTRIES,
+            max_bytes=settings.IDENTITY_MAP_MAX_BYTES,
+            ttl=settings.IDENTITY_MAP_TTL_SECONDS,
+        )
+
+    def _store(self, element_id: str, node: Node, obj: dict):
+        self.memory.set(element_id, (element_signature(node), obj), len(canonical_json(obj)), self.ttl)
+
+    def tag(self, fragment: str, obj: dict, element_id: str | None = None) -> str:
+        """
+        `fragment` with obj's id on it, remembered. Unchanged unless it is
+        exactly one complete element.
+        """
+        node = _single_element(fragment)
+        if node is None or not isinstance(obj, dict):
+            return fragment
+        element_id = element_id or object_id(obj)
+        node.attrs[IDENTITY_ATTR] = element_id
+        self._store(element_id, node, obj)
+        return node.to_html()
+
+    def _digest(self, html_content: str) -> str:
+        return "html:" + hashlib.sha256(html_content.encode("utf-8")).hexdigest()
+
+    def known(self, element_id: str) -> bool:
+        return self.memory.get(element_id) is not None
+
+    def mark(self, html_content: str):
+        """Record that every element of this HTML has been mapped (tag() did it while rendering)."""
+        self.memory.set(self._digest(html_content), True, 0, self.ttl)
+
+    def remember(self, html_content: str, objects: list, ids: list[str] | None = None) -> int:
+        """
+        Map the tagged elements of generated HTML to their source objects
+        (`ids` are their object_ids, if known). Parses only HTML it hasn't
+        seen, e.g. a preview served from the response cache.
+        """
+        digest = self._digest(html_content)
+        if self.memory.get(digest) is not None:
+            return 0
+        ids = ids or [object_id(obj) if isinstance(obj, dict) else None for obj in objects]
+        by_id = {element_id: obj for element_id, obj in zip(ids, objects) if element_id and isinstance(obj, dict)}
+        container = find_container(parse_html(html_content))
+        remembered = 0
+        for node in container.iter() if container is not None else ():
+            element_id = node.attrs.get(IDENTITY_ATTR)
+            if element_id in by_id:
+                self._store(element_id, node, by_id[element_id])
+                remembered += 1
+        self.memory.set(digest, True, 0, self.ttl)
+        return remembered
+
+    def lookup(self, node: Node) -> dict | None:
+        """A copy of the original object if `node` is an untouched generated element."""
+        element_id = node.attrs.get(IDENTITY_ATTR)
+        if not element_id:
+            return None
+        entry = self.memory.get(element_id)
+        if entry is None or entry[0] != element_signature(node):
+            self.missed += 1
+            return None
+        self.reused += 1
+        return copy.deepcopy(entry[1])
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.memory),
+            "bytes": self.memory.bytes,
+            "reused": self.reused,
+            "missed": self.missed,
+        }
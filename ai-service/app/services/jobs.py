@@ -0,0 +1,346 @@
+"""
+Background jobs for long-running generations.
+
+Submitting returns a job id straight away; a fixed pool of workers runs the
+work and stores the outcome, which clients fetch by polling (optionally
+long-polling) or by subscribing to status events. Finished jobs are kept for
+a TTL. State goes through a JobStore: MemoryJobStore keeps it in this
+process, SqliteJobStore in a file every worker process on the host shares
+(needed with more than one server worker, or a job is only visible to the
+worker that took it). Waiting for changes uses a local event when the job
+runs here and falls back to re-reading the store, so it works with either;
+a job cancelled from another worker is noticed by the one running it within
+POLL_SECONDS, and a job whose worker died is reported failed.
+"""
+import abc
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+
+from app.services.scheduler import Overloaded
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = {SUCCEEDED, FAILED, CANCELLED}
+
+# How often a waiter re-reads the store when no local event fires
+POLL_SECONDS = 1.0
+# Minimum gap between sweeps for expired jobs
+SWEEP_SECONDS = 60
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    expires_at: float | None = None
+    result: dict | None = None
+    error: str | None = None
+    worker: int | None = None  # pid of the process that owns the work
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class JobStore(abc.ABC):
+    """Where job state lives. Implementations must tolerate concurrent callers."""
+
+    @abc.abstractmethod
+    async def put(self, job: Job):
+        ...
+
+    @abc.abstractmethod
+    async def get(self, job_id: str) -> Job | None:
+        ...
+
+    @abc.abstractmethod
+    async def delete(self, job_id: str):
+        ...
+
+    @abc.abstractmethod
+    async def expired(self, now: float) -> list[str]:
+        """Ids of jobs whose expires_at is before `now`."""
+
+
+class MemoryJobStore(JobStore):
+    def __init__(self):
+        self._jobs: dict[str, Job] = {}
+
+    async def put(self, job: Job):
+        self._jobs[job.id] = job
+
+    async def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    async def delete(self, job_id: str):
+        self._jobs.pop(job_id, None)
+
+    async def expired(self, now: float) -> list[str]:
+        return [job.id for job in self._jobs.values() if job.expires_at is not None and job.expires_at <= now]
+
+
+class SqliteJobStore(JobStore):
+    """Jobs as JSON rows in a SQLite file, shared by the worker processes on one host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._inherited = None
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """This process's connection: SQLite handles must not be used across fork()."""
+        if self._pid != os.getpid():
+            self._inherited = self._conn
+            self._pid = os.getpid()
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL)")
+            self._conn.commit()
+        return self._conn
+
+    def _run(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(sql, params).fetchall()
+            conn.commit()
+        return rows
+
+    async def put(self, job: Job):
+        await asyncio.to_thread(
+            self._run, "INSERT OR REPLACE INTO jobs (id, data, expires_at) VALUES (?, ?, ?)",
+            (job.id, json.dumps(job.to_dict()), job.expires_at),
+        )
+
+    async def get(self, job_id: str) -> Job | None:
+        rows = await asyncio.to_thread(self._run, "SELECT data FROM jobs WHERE id = ?", (job_id,))
+        return Job(**json.loads(rows[0][0])) if rows else None
+
+    async def delete(self, job_id: str):
+        await asyncio.to_thread(self._run, "DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    async def expired(self, now: float) -> list[str]:
+        rows = await asyncio.to_thread(self._run, "SELECT id FROM jobs WHERE expires_at <= ?", (now,))
+        return [row[0] for row in rows]
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobManager:
+    def __init__(self, store: JobStore | None = None, workers: int = 4, max_pending: int = 100, ttl: float = 3600):
+        self.store = store or MemoryJobStore()
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._work = {}  # job id -> coroutine factory, until a worker picks it up
+        self._running: dict[str, asyncio.Task] = {}
+        self._changed: dict[str, asyncio.Event] = {}
+        self._last_sweep = 0.0
+        self.draining = False
+        self.counts = {status: 0 for status in FINISHED}
+
+    @classmethod
+    def from_settings(cls, settings) -> "JobManager":
+        store = SqliteJobStore(settings.JOB_STORE_PATH) if settings.JOB_STORE_PATH else None
+        return cls(store, workers=settings.JOB_WORKERS, max_pending=settings.JOB_MAX_PENDING, ttl=settings.JOB_TTL_SECONDS)
+
+    def _start(self):
+        # Workers belong to the serving loop, so they start on first use
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, kind: str, factory) -> Job:
+        """Queue `factory()` (a coroutine factory returning a JSON-able dict) as a job."""
+        self._start()
+        await self._sweep()
+        if self.draining:
+            raise Overloaded("jobs", "shutting down", max(1, round(POLL_SECONDS)))
+        if len(self._work) >= self.max_pending:
+            raise Overloaded("jobs", "job queue full", max(1, round(POLL_SECONDS * len(self._work) / self.workers)))
+        job = Job(id=uuid.uuid4().hex, kind=kind, worker=os.getpid())
+        await self.store.put(job)
+        self._work[job.id] = factory
+        self._changed[job.id] = asyncio.Event()
+        self._queue.put_nowait(job.id)
+        return job
+
+    async def get(self, job_id: str) -> Job | None:
+        job = await self.store.get(job_id)
+        if job is not None and job.expires_at is not None and job.expires_at <= time.time():
+            return None
+        if job is not None and not job.finished and job.worker not in (None, os.getpid()) and not _alive(job.worker):
+            return await self._finish(job, FAILED, error="The worker running this job exited")
+        return job
+
+    async def cancel(self, job_id: str) -> Job | None:
+        job = await self.get(job_id)
+        if job is None or job.finished:
+            return job
+        task = self._running.get(job_id)
+        if task is not None:
+            # The worker records the cancellation once the task has unwound
+            task.cancel()
+            await self.wait(job_id, timeout=POLL_SECONDS)
+            return await self.get(job_id)
+        # Queued here, or owned by another worker, which sees the status and stops
+        self._work.pop(job_id, None)
+        return await self._finish(job, CANCELLED)
+
+    async def wait(self, job_id: str, timeout: float) -> Job | None:
+        """The job once it has finished, or as it is after `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job.finished or remaining <= 0:
+                return job
+            await self._next_change(job_id, min(remaining, POLL_SECONDS))
+
+    async def watch(self, job_id: str):
+        """Yield the job on every status change until it finishes."""
+        last = None
+        while True:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            if job.status != last:
+                last = job.status
+                yield job
+            if job.finished:
+                return
+            await self._next_change(job_id, POLL_SECONDS)
+
+    async def _next_change(self, job_id: str, timeout: float):
+        event = self._changed.get(job_id)
+        if event is None:
+            await asyncio.sleep(timeout)
+            return
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _notify(self, job_id: str, final: bool = False):
+        event = self._changed.pop(job_id, None)
+        if event is not None:
+            event.set()
+        if not final:
+            self._changed[job_id] = asyncio.Event()
+
+    async def _finish(self, job: Job, status: str, result: dict | None = None, error: str | None = None) -> Job:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job.expires_at = job.finished_at + self.ttl
+        await self.store.put(job)
+        self.counts[status] += 1
+        self._notify(job.id, final=True)
+        return job
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            factory = self._work.pop(job_id, None)
+            job = await self.store.get(job_id)
+            if factory is None or job is None or job.finished:
+                continue  # cancelled while queued
+
+            job.status = RUNNING
+            job.started_at = time.time()
+            await self.store.put(job)
+            self._notify(job_id)
+
+            task = asyncio.ensure_future(factory())
+            self._running[job_id] = task
+            try:
+                while not task.done():
+                    await asyncio.wait({task}, timeout=POLL_SECONDS)
+                    if not task.done() and await self._cancelled_elsewhere(job_id):
+                        task.cancel()
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            finally:
+                self._running.pop(job_id, None)
+
+            if await self._cancelled_elsewhere(job_id):
+                self._notify(job_id, final=True)
+            elif task.cancelled():
+                await self._finish(job, CANCELLED)
+            elif task.exception() is not None:
+                print(f"[ERROR] Job {job_id} ({job.kind}) failed: {task.exception()}")
+                await self._finish(job, FAILED, error=str(task.exception()))
+            else:
+                await self._finish(job, SUCCEEDED, result=task.result())
+
+    async def _cancelled_elsewhere(self, job_id: str) -> bool:
+        """Whether another worker has marked this job cancelled in the store."""
+        stored = await self.store.get(job_id)
+        return stored is not None and stored.status == CANCELLED
+
+    async def _sweep(self):
+        now = time.time()
+        if now - self._last_sweep < SWEEP_SECONDS:
+            return
+        self._last_sweep = now
+        for job_id in await self.store.expired(now):
+            await self.store.delete(job_id)
+
+    async def drain(self, timeout: float):
+        """Refuse new jobs and give queued and running ones up to `timeout` seconds to finish."""
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        while (self._work or self._running) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._work or self._running:
+            print(f"[WARN] Cancelling {len(self._work) + len(self._running)} unfinished jobs")
+
+    async def close(self):
+        """Stop the workers, cancelling whatever they are running."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers, self._queue = [], None
+
+    def metric_samples(self):
+        """Scrape-time samples for /metrics."""
+        yield "autocre8_jobs_queued", "gauge", "Jobs waiting for a worker", {}, len(self._work)
+        yield "autocre8_jobs_running", "gauge", "Jobs being worked on", {}, len(self._running)
+        for status, count in self.counts.items():
+            yield "autocre8_jobs_finished_total", "counter", "Finished jobs by outcome", {"status": status}, count
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": len(self._work),
+            "running": len(self._running),
+            **self.counts,
+        }
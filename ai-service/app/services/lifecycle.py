@@ -0,0 +1,50 @@
+"""
+Worker lifecycle for readiness and graceful shutdown.
+
+A worker is ready once its startup has finished and stops being ready as
+soon as it starts draining (first SIGTERM), while it keeps serving for the
+drain delay so load balancers can take it out of rotation. Everything that
+waits during shutdown shares one budget measured from the start of the drain.
+"""
+import os
+import time
+
+
+class Lifecycle:
+    def __init__(self):
+        self.started_at: float | None = None
+        self.drain_started_at: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.started_at is not None and self.drain_started_at is None
+
+    @property
+    def draining(self) -> bool:
+        return self.drain_started_at is not None
+
+    def start(self):
+        self.started_at = time.monotonic()
+
+    def begin_drain(self):
+        if self.drain_started_at is None:
+            self.drain_started_at = time.monotonic()
+            print(f"[INFO] Worker {os.getpid()} draining")
+
+    def draining_for(self) -> float:
+        return 0.0 if self.drain_started_at is None else time.monotonic() - self.drain_started_at
+
+    def remaining(self, budget: float) -> float:
+        """What is left of a shutdown budget of `budget` seconds (all of it if not draining)."""
+        return max(0.0, budget - self.draining_for())
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "state": "draining" if self.draining else "ready" if self.ready else "starting",
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1) if self.started_at else 0,
+        }
+
+
+lifecycle = Lifecycle()
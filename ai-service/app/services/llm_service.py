@@ -411,36 +411,607 @@
 #             raise e
 
 
+import asyncio
 import json
 import re
-from langchain_openai import ChatOpenAI
-from langchain_google_vertexai import ChatVertexAI  # ← CHANGED
+import threading
+import time
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
 from app.config import settings
-from app.schemas import HTMLOutput, ResizeOutput, Asset, ChatMessage, FabricOutput, BrandContext
+from app.schemas import HTMLOutput, PatchOutput, ResizeOutput, CreativeResizeOutput, Asset, ChatMessage, FabricOutput, BrandContext
+from app.services import tracing
+from app.services.asset_pipeline import AssetPipeline
+from app.services.chat_history import CompactHistory, compact_history
+from app.services.fabric_compact import compact_objects_json
+from app.services.fabric_html import canvas_objects, compile_canvas, split_fragments
+from app.services.hedging import Hedger
+from app.services.html_fabric import FABRIC_VERSION, fallback_html, parse_design
+from app.services.html_patch import PatchError, annotate, apply_patch
+from app.services.identity_map import IdentityMap, object_id
+from app.services.html_validator import InvalidHTML, Validation, known_urls, stage_size, text_urls, validate_design
+from app.services.metrics import CACHE_REQUESTS, HTML_ISSUES, HTML_VALIDATION, PROVIDER_LATENCY, TokenUsageCallback
+from app.services.model_router import FAST, STRONG, ModelRouter, Route
+from app.services.provider_pools import ProviderPools
+from app.services.resize_engine import ResizeError, aspect_groups, proportional_resize
+from app.services.response_cache import MemoryTier, ResponseCache
+from app.services.scheduler import Scheduler
+from app.services.singleflight import SingleFlight
+from app.services.streaming import PartialFieldTracker
+from app.services.tracing import ProviderTimer, span, traced
+
+NODE_INDEX_RULE = """
+
+    PARTIAL CONVERSION:
+    - The HTML only contains fragments wrapped in divs with a data-node-index attribute.
+    - The wrapper divs are positioning context only; do NOT emit objects for them.
+    - Every object MUST include a "nodeIndex" property equal to its wrapper's data-node-index.
+    - Do NOT add a background rectangle."""
+
+VARIATION_FIELDS = {"variation_1_html": 1, "variation_2_html": 2}
+
+# chain name -> (provider, endpoint); the endpoint sets its queue priority
+CHAIN_ROUTES = {
+    "canvas": ("openai", "preview"),
+    "canvas_objects": ("openai", "preview"),
+    "resize": ("gemini", "resize"),
+    "resize_creative": ("gemini", "resize"),
+    "resize_stream": ("gemini", "resize"),
+    "resize_creative_stream": ("gemini", "resize"),
+    "canvas_retry": ("openai", "preview"),
+    "resize_retry": ("gemini", "resize"),
+    "resize_creative_retry": ("gemini", "resize"),
+    "assistant": ("gemini", "assistant"),
+    "assistant_patch": ("gemini", "assistant"),
+    "assistant_stream": ("gemini", "assistant"),
+    "conversion": ("openai", "conversion"),
+}
+
+# Chains that may be hedged on the other provider (HEDGING_ENABLED)
+HEDGED_CHAINS = {"canvas", "canvas_objects", "assistant", "assistant_patch"}
+OTHER_PROVIDER = {"openai": "gemini", "gemini": "openai"}
+
+# Chains ModelRouter may send to the fast model
+ROUTED_CHAINS = {"assistant", "assistant_patch", "conversion"}
+
+# Template chains re-asked with the validation problems appended (message
+# chains like the assistant just get one more message)
+RETRY_CHAINS = {"canvas": "canvas_retry", "resize": "resize_retry", "resize_creative": "resize_creative_retry"}
+
+RETRY_HUMAN = """Your previous answer was rejected:
+{problems}
+Answer again with the complete, corrected HTML."""
+
+PATCH_RULES = """
+    PATCH MODE (CRITICAL):
+    - Every element in CURRENT HTML carries a data-eid. Do NOT rewrite the document; return "operations" against those ids.
+    - update: change element "id" via "style" (CSS properties; "" removes one), "text" (plain text, \\n for line breaks) and/or "attrs" (e.g. src, alt).
+    - insert: add "html" inside parent element "id" at child position "index" (omit index to append). Use inline CSS.
+    - delete: remove element "id" (never the container).
+    - reorder: move element "id" to child position "index" among its siblings (later elements render on top).
+    - Never invent ids and never write data-eid in inserted HTML.
+    - If the request needs a completely new layout, return an empty "operations" list.
+    """
+
+# Compacted canvas JSON leaves out properties at their Fabric.js default
+FABRIC_DEFAULTS_RULE = """Missing properties have their Fabric.js defaults: originX left, originY top, angle 0, opacity 1,
+scaleX/scaleY 1, fill black, no stroke, fontSize 40, fontFamily Times New Roman, fontWeight normal,
+textAlign left, lineHeight 1.16."""
+
+# ==========================================
+# PROMPTS (built once at import)
+# ==========================================
+
+CANVAS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are an expert at converting Fabric.js canvas JSON to HTML/CSS.
+
+RULES:
+1. Create container div with position:relative and exact width/height
+2. Each object becomes HTML element with position:absolute
+3. Preserve EXACT positions (left, top), sizes (width*scaleX, height*scaleY), colors, opacity
+4. Handle types: rect, circle, text/textbox/i-text, image
+5. For text: use exact text, fontSize*scaleY, fontFamily, fill as color
+6. For images: use <img> with src
+7. Apply rotation using transform:rotate(angle deg) if angle exists
+8. Return clean HTML only
+9. Use everything at exact same position as canvas
+""" + FABRIC_DEFAULTS_RULE),
+
+    ("human", """Convert this Fabric.js canvas to HTML:
+
+Canvas size: {width}x{height}
+Background: {background}
+
+Objects:
+{objects_json}""")
+])
+
+CANVAS_OBJECTS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are an expert at converting Fabric.js objects to HTML/CSS.
+
+RULES:
+1. Each object becomes ONE HTML element with position:absolute, positioned inside a {width}x{height} container
+2. Every element MUST carry the attribute data-fabric-index with the object's "index" value
+3. Preserve EXACT positions (left, top), sizes (width*scaleX, height*scaleY), colors, opacity
+4. Apply rotation using transform:rotate(angle deg) if angle exists
+5. Use inline SVG for paths, polygons and groups
+6. Return ONLY the elements, without a container div
+""" + FABRIC_DEFAULTS_RULE),
+
+    ("human", """Convert these Fabric.js objects to HTML elements:
+
+Objects:
+{objects_json}""")
+])
+
+RESIZE_SYSTEM = """You are an intelligent visual layout engine.
+            TASK: Adapt the HTML to a new canvas size.
+            RULES:
+            - Container must be exactly {target_width}px × {target_height}px
+            - position:absolute ONLY
+            - Background images must cover full canvas
+            - dont disturb aspect ratio of images and elements
+            - Reposition elements intelligently to fit the new aspect ratio
+            """
+
+RESIZE_HUMAN = """
+            CURRENT HTML: {current_html}
+            TARGET SIZE: {target_width}x{target_height}
+            """
+
+RESIZE_PROMPT = ChatPromptTemplate.from_messages([("system", RESIZE_SYSTEM), ("human", RESIZE_HUMAN)])
+
+# Variation 1 comes from the local proportional resize engine
+CREATIVE_RESIZE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", RESIZE_SYSTEM + "Return ONLY the optimized arrangement; proportional scaling is handled separately."),
+    ("human", RESIZE_HUMAN)
+])
+
+RETRY_PROMPT = ChatPromptTemplate.from_messages([("human", RETRY_HUMAN)])
+
+CONVERSION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a Fabric.js 6.0 expert. Convert HTML/CSS to valid Fabric.js canvas JSON.
+
+    POSITIONING CALCULATION RULES:
+
+    CRITICAL BACKGROUND RULE:
+    - The top-level "background" property MUST only be a hex color string (e.g., "#ffffff").
+    - If the HTML background is a GRADIENT or IMAGE, you MUST create a "rect" object as the FIRST element in the "objects" array.
+    - This background rectangle must have: "left": 0, "top": 0, "width": {canvas_width}, "height": {canvas_height}, "selectable": false, "evented": false.
+
+    GRADIENT FORMAT (MANDATORY):
+    Gradients MUST follow this exact structure inside the "fill" property:
+    {{
+        "type": "linear",
+        "coords": {{"x1": 0, "y1": 0, "x2": 0, "y2": height_of_object}},
+        "colorStops": [
+            {{"offset": 0, "color": "#start"}},
+            {{"offset": 1, "color": "#end"}}
+        ]
+    }}
+
+    For radial gradients:
+    {{
+        "type": "radial", 
+        "coords": {{"x1": cx, "y1": cy, "r1": 0, "x2": cx, "y2": cy, "r2": radius}},
+        "colorStops": [
+            {{"offset": 0, "color": "#start"}},
+            {{"offset": 1, "color": "#end"}}
+        ]
+    }}
+
+    SHADOW FORMAT (Fabric.js 6.0):
+    Do NOT use filters for shadows. Use the shadow property with this structure:
+    {{
+        "shadow": {{
+            "color": "rgba(0,0,0,0.3)",
+            "blur": 10,
+            "offsetX": 5,
+            "offsetY": 5
+        }}
+    }}
+
+    FILTERS:
+    Only use filters for: Brightness, Contrast, Saturate, and HueRotation using standard Fabric.js 6.0 format.
+
+    IMPORTANT CONSTRAINTS:
+    - Never set charSpacing lower than -100
+    - When using clipPath for images, always set absolutePositioned: true and match the clipPath 'left' and 'top' to the parent object's 'left' and 'top'
+
+    POSITIONING RULES:
+    1. When HTML has "left: 50%" or "transform: translate(-50%, -50%)":
+    - Calculate center position: canvas_width ÷ 2 for left, canvas_height ÷ 2 for top
+    - Set "originX": "center" and "originY": "center"
+
+    2. For {canvas_width}x{canvas_height} canvas:
+    - Horizontal center: "left": {canvas_width}/2
+    - Vertical center: "top": {canvas_height}/2
+
+    3. Examples:
+    - 1080px wide canvas → centered object: "left": 540
+    - 1920px tall canvas → centered object: "top": 960
+
+    TEXT HANDLING:
+    - Use "i-text" for short text (single line or minimal wrapping)
+    - Use "textbox" with "width" property for paragraphs and multi-line text
+    - Analyze HTML container width to determine optimal text width
+    - Insert "\\n" for line breaks at natural language boundaries
+    - Common text object properties:
+    {{
+        "type": "i-text" or "textbox",
+        "left": x,
+        "top": y,
+        "text": "content",
+        "fontSize": 24,
+        "fontFamily": "Arial",
+        "fill": "#000000",
+        "fontWeight": "normal",
+        "fontStyle": "normal",
+        "textAlign": "left",
+        "lineHeight": 1.16
+    }}
+
+    IMAGE HANDLING:
+    - Image objects MUST include "crossOrigin": "anonymous"
+    - Example structure:
+    {{
+        "type": "image",
+        "left": x,
+        "top": y,
+        "width": w,
+        "height": h,
+        "src": "url",
+        "crossOrigin": "anonymous"
+    }}
+
+    RETURN FORMAT (Fabric.js 6.0):
+    {{
+        "version": "6.0.2",
+        "width": {canvas_width},
+        "height": {canvas_height},
+        "background": "#ffffff",
+        "objects": [...]
+    }}
+
+    CRITICAL: The "background" property should be a simple color string. For gradient backgrounds, create a rectangle object as the first item in objects array.{extra_rules}"""),
+
+    ("human", """Convert this HTML to Fabric.js 6.0 JSON.
+
+    Canvas dimensions: {canvas_width}px × {canvas_height}px
+    Horizontal center position: {center_x}px
+    Vertical center position: {center_y}px
+
+    HTML:
+    {html_content}""")
+])
+
 
 class LLMService:
+    OPENAI_TEMPERATURE = 0
+    GEMINI_TEMPERATURE = 1
+
     def __init__(self):
-        # 1. OpenAI for Precision (Canvas -> HTML)
-        self.openai = ChatOpenAI(
-            model=settings.OPENAI_MODEL,
+        # Provider clients and chains are built on first use: importing the
+        # SDKs is slow and the clients need credentials
+        self._openai = None
+        self._gemini = None
+        self._chains = {}
+        self._lock = threading.RLock()
+        # Clients built here on the shared pools (not ones assigned from outside),
+        # and the fast-tier client per provider
+        self._built = set()
+        self._fast = {}
+
+        # Fast or strong model per request
+        self.router = ModelRouter.from_settings(settings, fast_kinds={
+            CHAIN_ROUTES[name][1] for name in ROUTED_CHAINS if self.fast_model(CHAIN_ROUTES[name][0])
+        })
+
+        # Per-worker provider connection pools and Google credentials
+        self.pools = ProviderPools.from_settings(settings)
+
+        # Response cache + in-flight coalescing shared by all endpoints
+        self.cache = ResponseCache.from_settings(settings)
+        self.inflight = SingleFlight()
+
+        # Downscaled vision inputs, fetched once per URL
+        self.assets = AssetPipeline.from_settings(settings)
+
+        # Per-provider concurrency limits and priority queues
+        self.scheduler = Scheduler.from_settings(settings)
+
+        # Tail-latency hedging across providers
+        self.hedger = Hedger.from_settings(settings)
+
+        # Preview element -> source Fabric object, for lossless round trips
+        self.identities = IdentityMap.from_settings(settings)
+
+        # Object hash -> its preview fragment, so previews only redo changed objects
+        self.fragments = MemoryTier(settings.PREVIEW_FRAGMENT_CACHE_MAX_ENTRIES, settings.PREVIEW_FRAGMENT_CACHE_MAX_BYTES)
+        self.fragment_counts = {"cached": 0, "compiled": 0, "translated": 0}
+
+    # ==========================================
+    # CLIENTS & CHAINS (lazy, built once)
+    # ==========================================
+    def _new_openai(self, model: str):
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            model=model,
             api_key=settings.OPENAI_API_KEY,
-            temperature=0,  
+            base_url=settings.OPENAI_BASE_URL or None,
+            temperature=self.OPENAI_TEMPERATURE,
             max_retries=1,
-            request_timeout=30
+            request_timeout=self.pools.timeout(30),
+            http_async_client=self.pools.openai_client()
         )
-        
-        # 2. Gemini for Vision & Chat (Assets/Screenshots)
-        # ← UPDATED FOR VERTEX AI
-        self.gemini = ChatVertexAI(
-            model_name=settings.GOOGLE_MODEL,
+
+    def _new_gemini(self, model: str):
+        from langchain_google_vertexai import ChatVertexAI
+        return ChatVertexAI(
+            model_name=model,
             location=settings.GOOGLE_LOCATION,
             project=settings.GOOGLE_CLOUD_PROJECT,
-            temperature=1,
+            temperature=self.GEMINI_TEMPERATURE,
+            timeout=settings.GEMINI_REQUEST_TIMEOUT,
+            credentials=self.pools.google_credentials(),
+            async_client=self.pools.vertex_client(),
             convert_system_message_to_human=True
         )
 
+    @property
+    def openai(self):
+        """OpenAI for Precision (Canvas -> HTML)"""
+        if self._openai is None:
+            with self._lock:
+                if self._openai is None:
+                    self._openai = self._new_openai(settings.OPENAI_MODEL)
+                    self._built.add("openai")
+        return self._openai
+
+    @openai.setter
+    def openai(self, client):
+        with self._lock:
+            self._openai = client
+            self._built.discard("openai")
+            self._fast.pop("openai", None)
+            self._chains.clear()
+
+    @property
+    def gemini(self):
+        """Gemini (Vertex AI) for Vision & Chat (Assets/Screenshots)"""
+        if self._gemini is None:
+            with self._lock:
+                if self._gemini is None:
+                    self._gemini = self._new_gemini(settings.GOOGLE_MODEL)
+                    self._built.add("gemini")
+        return self._gemini
+
+    @gemini.setter
+    def gemini(self, client):
+        with self._lock:
+            self._gemini = client
+            self._built.discard("gemini")
+            self._fast.pop("gemini", None)
+            self._chains.clear()
+
+    def client(self, provider: str, tier: str = STRONG):
+        """
+        The model for `provider` at `tier`. A client assigned from outside
+        (a fake, a recorder) answers both tiers, as does the strong model when
+        the provider has no fast model configured.
+        """
+        strong = self.openai if provider == "openai" else self.gemini
+        model = self.fast_model(provider)
+        if tier == STRONG or provider not in self._built or not model:
+            return strong
+        fast = self._fast.get(provider)
+        if fast is None:
+            with self._lock:
+                fast = self._fast.get(provider)
+                if fast is None:
+                    fast = self._fast[provider] = \
+                        self._new_openai(model) if provider == "openai" else self._new_gemini(model)
+        return fast
+
+    @staticmethod
+    def fast_model(provider: str) -> str:
+        """The configured fast model for `provider` ("" if none)."""
+        return settings.OPENAI_FAST_MODEL if provider == "openai" else settings.GOOGLE_FAST_MODEL
+
+    def cache_model(self, chain: str) -> str:
+        """
+        Model part of the cache keys for results of `chain`. A routed
+        endpoint's answers may come from either tier, so its keys name the fast
+        model too: results never outlive a change of routing or fast model.
+        """
+        provider, endpoint = CHAIN_ROUTES[chain]
+        model = settings.OPENAI_MODEL if provider == "openai" else settings.GOOGLE_MODEL
+        if self.router.routes(endpoint):
+            model = f"{model}|fast:{self.fast_model(provider)}"
+        return model
+
+    def _build_chain(self, name: str, provider: str, tier: str = STRONG):
+        llm = self.client(provider, tier)
+        if name == "canvas":
+            return CANVAS_PROMPT | llm.with_structured_output(HTMLOutput)
+        if name == "canvas_objects":
+            return CANVAS_OBJECTS_PROMPT | llm.with_structured_output(HTMLOutput)
+        if name == "resize":
+            return RESIZE_PROMPT | llm.with_structured_output(ResizeOutput)
+        if name == "resize_creative":
+            return CREATIVE_RESIZE_PROMPT | llm.with_structured_output(CreativeResizeOutput)
+        # JSON mode streams tokens, so the partial object grows field by field
+        if name == "resize_stream":
+            return RESIZE_PROMPT | llm.with_structured_output(ResizeOutput.model_json_schema(), method="json_mode")
+        if name == "resize_creative_stream":
+            return CREATIVE_RESIZE_PROMPT | llm.with_structured_output(CreativeResizeOutput.model_json_schema(), method="json_mode")
+        if name == "canvas_retry":
+            return CANVAS_PROMPT + RETRY_PROMPT | llm.with_structured_output(HTMLOutput)
+        if name == "resize_retry":
+            return RESIZE_PROMPT + RETRY_PROMPT | llm.with_structured_output(ResizeOutput)
+        if name == "resize_creative_retry":
+            return CREATIVE_RESIZE_PROMPT + RETRY_PROMPT | llm.with_structured_output(CreativeResizeOutput)
+        if name == "assistant":
+            return llm.with_structured_output(HTMLOutput)
+        if name == "assistant_patch":
+            return llm.with_structured_output(PatchOutput)
+        if name == "assistant_stream":
+            return llm.with_structured_output(HTMLOutput.model_json_schema(), method="json_mode")
+        if name == "conversion":
+            return CONVERSION_PROMPT | llm.bind(response_format={"type": "json_object"})
+        raise KeyError(name)
+
+    def chain(self, name: str, provider: str | None = None, tier: str = STRONG):
+        """The prebuilt runnable for `name` (on its usual provider unless given) at `tier`, constructed once."""
+        key = (name, provider or CHAIN_ROUTES[name][0], tier)
+        chain = self._chains.get(key)
+        if chain is None:
+            with self._lock:
+                chain = self._chains.get(key)
+                if chain is None:
+                    chain = self._chains[key] = self._build_chain(*key)
+        return chain
+
+    def preload(self):
+        """
+        Import the provider SDKs (the slow part of the first call) without
+        creating clients, e.g. in a prefork master: clients and their
+        connection pools must be created in the process that uses them.
+        """
+        import langchain_google_vertexai  # noqa: F401
+        import langchain_openai  # noqa: F401
+
+    async def start(self):
+        """
+        Worker startup: keep the Google token fresh and, with PROVIDER_WARMUP,
+        open provider connections and build the chains before the first request.
+        """
+        vertex = bool(settings.GOOGLE_CLOUD_PROJECT)
+        if vertex:
+            self.pools.start_refresh()
+        if settings.PROVIDER_WARMUP:
+            await self.pools.warmup(settings.OPENAI_API_KEY, vertex, settings.PROVIDER_WARMUP_CONNECTIONS)
+            for name in CHAIN_ROUTES:
+                self.chain(name)
+            if self.router.enabled:
+                for name in ROUTED_CHAINS:
+                    self.chain(name, tier=FAST)
+
+    async def close(self):
+        """Close the pools and the asset fetcher; clients built on them go too (the next event loop builds new ones)."""
+        with self._lock:
+            for provider in self._built:
+                setattr(self, f"_{provider}", None)
+            self._built.clear()
+            self._fast.clear()
+            self._chains.clear()
+        await self.pools.close()
+        await self.assets.close()
+
+    def stats(self) -> dict:
+        return {
+            "scheduler": self.scheduler.stats(),
+            "cache": self.cache.stats(),
+            "inflight": self.inflight.stats(),
+            "assets": self.assets.stats(),
+            "hedging": self.hedger.stats(),
+            "identities": self.identities.stats(),
+            "pools": self.pools.stats(),
+            "routing": self.router.stats(),
+        }
+
+    async def _invoke(self, name: str, inputs, provider: str | None = None, tier: str = STRONG):
+        """Run chain `name` at model `tier` once a provider slot is free (raises Overloaded)."""
+        default_provider, endpoint = CHAIN_ROUTES[name]
+        provider = provider or default_provider
+        if provider == default_provider and name in HEDGED_CHAINS and settings.HEDGING_ENABLED:
+            secondary = OTHER_PROVIDER[provider]
+            return await self.hedger.run(
+                provider, lambda: self._call(name, inputs, provider, endpoint, tier),
+                secondary, lambda: self._call(name, inputs, secondary, endpoint, tier)
+            )
+        return await self._call(name, inputs, provider, endpoint, tier)
+
+    async def _call(self, name: str, inputs, provider: str, endpoint: str, tier: str = STRONG):
+        started, outcome = time.monotonic(), "error"
+        callbacks = [TokenUsageCallback(endpoint, provider)]
+        timer = ProviderTimer() if tracing.active() else None
+        if timer:
+            callbacks.append(timer)
+        try:
+            async with self.scheduler.slot(provider, endpoint):
+                tracing.add("queue", time.monotonic() - started)
+                invoked = time.monotonic()
+                result = await asyncio.wait_for(
+                    self.chain(name, provider, tier).ainvoke(inputs, config={"callbacks": callbacks}),
+                    self.pools.timeout_for(endpoint)
+                )
+                if timer:
+                    # Chain time outside the model call is prompt formatting and output
+                    # parsing (a stand-in runnable with no model callbacks is all provider)
+                    elapsed = time.monotonic() - invoked
+                    tracing.add("provider", timer.seconds or elapsed)
+                    tracing.add("parse", elapsed - (timer.seconds or elapsed))
+            outcome = "ok"
+            return result
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise asyncio.TimeoutError(f"{name} on {provider} timed out after {self.pools.timeout_for(endpoint)}s") from None
+        finally:
+            PROVIDER_LATENCY.observe(time.monotonic() - started, provider=provider, chain=name, tier=tier, outcome=outcome)
+
+    async def _stream(self, name: str, inputs):
+        """Stream chain `name`, holding its provider slot until the stream ends."""
+        provider, endpoint = CHAIN_ROUTES[name]
+        started, outcome = time.monotonic(), "error"
+        try:
+            async with self.scheduler.slot(provider, endpoint):
+                tracing.add("queue", time.monotonic() - started)
+                config = {"callbacks": [TokenUsageCallback(endpoint, provider)]}
+                with span("stream"):
+                    async for chunk in self.chain(name).astream(inputs, config=config):
+                        yield chunk
+            outcome = "ok"
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        finally:
+            PROVIDER_LATENCY.observe(time.monotonic() - started, provider=provider, chain=name, tier=STRONG, outcome=outcome)
+
+    def metric_samples(self):
+        """Scrape-time samples for /metrics from components that keep their own counters."""
+        for provider, limiter in self.scheduler.limiters.items():
+            labels = {"provider": provider}
+            yield "autocre8_scheduler_active", "gauge", "Provider calls holding a slot", labels, limiter.active
+            yield "autocre8_scheduler_queued", "gauge", "Provider calls waiting for a slot", labels, limiter.queued
+            yield "autocre8_scheduler_rejected_total", "counter", "Calls shed with 429", labels, limiter.rejected + limiter.timed_out
+        yield "autocre8_inflight_coalesced_total", "counter", "Requests that joined an identical in-flight call", {}, self.inflight.coalesced
+        yield "autocre8_cache_memory_entries", "gauge", "Response cache memory tier entries", {}, len(self.cache.memory)
+        yield "autocre8_cache_memory_bytes", "gauge", "Response cache memory tier size", {}, self.cache.memory.bytes
+        assets = self.assets.stats()
+        for result in ("hits", "revalidated", "fetched", "failures"):
+            yield "autocre8_assets_total", "counter", "Asset pipeline lookups by result", {"result": result}, assets[result]
+        yield "autocre8_hedged_total", "counter", "Calls re-issued on the other provider", {}, self.hedger.hedged
+        for role, wins in self.hedger.wins.items():
+            yield "autocre8_hedge_wins_total", "counter", "Hedged calls won per leg", {"leg": role}, wins
+        yield "autocre8_identity_map_entries", "gauge", "Preview elements mapped to their source object", {}, len(self.identities.memory)
+        for source, count in self.fragment_counts.items():
+            yield "autocre8_preview_fragments_total", "counter", "Preview object fragments by source", {"source": source}, count
+        for result, count in (("reused", self.identities.reused), ("missed", self.identities.missed)):
+            yield "autocre8_identity_lookups_total", "counter", "Tagged elements seen by conversion", {"result": result}, count
+        for result, count in (("ok", self.pools.refreshes), ("failed", self.pools.refresh_failures)):
+            yield "autocre8_credential_refreshes_total", "counter", "Google token refreshes ahead of expiry", {"result": result}, count
+        for (kind, tier, reason), count in self.router.decisions.items():
+            yield "autocre8_model_routes_total", "counter", "Requests routed per model tier", {"kind": kind, "tier": tier, "reason": reason}, count
+        for (kind, cause), count in self.router.escalations.items():
+            yield "autocre8_model_escalations_total", "counter", "Fast-tier results redone on the strong model", {"kind": kind, "cause": cause}, count
+        for provider, seconds in self.pools.warmup_seconds.items():
+            yield "autocre8_provider_warmup_seconds", "gauge", "Time to open provider connections at startup", {"provider": provider}, seconds
+
+    @traced("clean_html")
     def _clean_html(self, raw_html: str) -> str:
         """Removes markdown backticks if Gemini adds them"""
         if not raw_html:
@@ -449,109 +1020,435 @@ class LLMService:
         clean = re.sub(r"```", "", clean)
         return clean.strip()
 
-    # 1. INITIAL GENERATION (fabric to HTML) (OpenAI)
+    # ==========================================
+    # OUTPUT VALIDATION
+    # ==========================================
+    def _validate(self, chain: str, html: str, width, height, known: set[str] | None = None, absolute_only: bool = True) -> Validation:
+        """Clean model HTML and, with HTML_VALIDATION, check and repair it."""
+        html = self._clean_html(html)
+        if not settings.HTML_VALIDATION:
+            return Validation(html=html)
+        with span("validate"):
+            validation = validate_design(html, width, height, known, absolute_only)
+        for issue in validation.repairs + [issue for issue, _ in validation.problems]:
+            HTML_ISSUES.inc(chain=chain, issue=issue)
+        return validation
+
+    def _html_check(self, chain: str, fields: tuple, width, height, known: set[str] | None = None, absolute_only: bool = True):
+        """A check for _invoke_validated: validates each HTML field of a result, writing back the repaired HTML."""
+        def check(result) -> list[Validation]:
+            validations = []
+            for field in fields:
+                validation = self._validate(chain, getattr(result, field), width, height, known, absolute_only)
+                setattr(result, field, validation.html)
+                validations.append(validation)
+            return validations
+        return check
+
+    async def _invoke_routed(self, name: str, inputs, route: Route | None):
+        """_invoke at the route's tier; output the fast model got unparseable is redone on the strong one."""
+        if route is None or not route.fast:
+            return await self._invoke(name, inputs)
+        try:
+            return await self._invoke(name, inputs, tier=route.tier)
+        except ValueError:
+            # OutputParserException, pydantic and JSON errors are all ValueErrors
+            self.router.escalate(route, "parse")
+            return await self._invoke(name, inputs, tier=route.tier)
+
+    async def _invoke_validated(self, name: str, inputs, check, route: Route | None = None):
+        """
+        _invoke, then `check` the result. Problems that couldn't be repaired
+        locally get one retry with the problems spelled out (on the strong
+        model if `route` sent the first call to the fast one); if they are
+        still there, InvalidHTML.
+        """
+        result = await self._invoke_routed(name, inputs, route)
+        validations = check(result)
+        outcome = "repaired" if any(v.repairs for v in validations) else "valid"
+        problems = "\n".join(v.describe() for v in validations if not v.ok)
+        if problems:
+            print(f"[INFO] {name} HTML rejected, retrying once:\n{problems}")
+            self.router.escalate(route, "validation")
+            if isinstance(inputs, list):
+                retry_inputs = inputs + [HumanMessage(content=RETRY_HUMAN.format(problems=problems))]
+            else:
+                retry_inputs = {**inputs, "problems": problems}
+            result = await self._invoke(RETRY_CHAINS.get(name, name), retry_inputs)
+            problems = "\n".join(v.describe() for v in check(result) if not v.ok)
+            outcome = "failed" if problems else "retried"
+        if settings.HTML_VALIDATION:
+            HTML_VALIDATION.inc(chain=name, outcome=outcome)
+        if problems:
+            raise InvalidHTML(f"{name} returned invalid HTML twice:\n{problems}")
+        return result
+
+    def _count_unretried(self, chain: str, validations: list[Validation]):
+        """Outcome for output that is checked but can't be retried (streams, patches)."""
+        if settings.HTML_VALIDATION:
+            outcome = "unrepaired" if any(not v.ok for v in validations) else \
+                "repaired" if any(v.repairs for v in validations) else "valid"
+            HTML_VALIDATION.inc(chain=chain, outcome=outcome)
+
+    # ==========================================
+    # CACHED ENTRY POINTS
+    # ==========================================
+    async def _cached(self, endpoint: str, payload: dict, model: str, temperature: float, compute, schema=None):
+        """
+        Serve `compute()` from the response cache, keyed on payload + model + temperature.
+        Misses with the same key that are already in flight share one call.
+        """
+        use_cache = self.cache.enabled_for(endpoint, temperature)
+        key = self.cache.make_key(endpoint, payload, model, temperature)
+
+        if use_cache:
+            with span("cache"):
+                hit = await self.cache.get(key)
+            CACHE_REQUESTS.inc(endpoint=endpoint, result="miss" if hit is None else "hit")
+            if hit is not None:
+                print(f"[CACHE] {endpoint} hit")
+                return schema.model_validate(hit) if schema else hit
+
+        async def compute_and_store():
+            result = await compute()
+            if use_cache:
+                await self.cache.set(key, result.model_dump() if schema else result, self.cache.ttl_for(temperature))
+            return result
+
+        result = await self.inflight.do(key, compute_and_store)
+        # Waiters share one object; hand each its own copy
+        return result.model_copy(deep=True) if schema else result
+
     async def generate_from_canvas(self, canvas_data: dict) -> str:
+        objects = canvas_objects(canvas_data)
+        ids = []
+        if settings.IDENTITY_MAP_ENABLED or settings.PREVIEW_FRAGMENT_CACHE:
+            with span("identity"):
+                ids = [object_id(obj) if isinstance(obj, dict) else "" for obj in objects]
+        html = await self._cached(
+            "preview", canvas_data, self.cache_model("canvas"), self.OPENAI_TEMPERATURE,
+            lambda: self._generate_from_canvas(canvas_data, objects, ids)
+        )
+        if settings.IDENTITY_MAP_ENABLED:
+            # For cache hits: the map is per process and may not have seen this preview
+            with span("identity"):
+                self.identities.remember(html, objects, ids)
+        return html
+
+    async def generate_resize_variations(self, current_html: str, target_width: int, target_height: int) -> ResizeOutput:
+        payload = {"current_html": current_html, "target_width": target_width, "target_height": target_height}
+        return await self._cached(
+            "resize", payload, self.cache_model("resize"), self.GEMINI_TEMPERATURE,
+            lambda: self._generate_resize_variations(current_html, target_width, target_height),
+            schema=ResizeOutput
+        )
+
+    @traced("history")
+    def compact_chat_history(self, chat_history: list[ChatMessage]) -> CompactHistory:
+        """Fit the assistant's chat history into CHAT_HISTORY_TOKEN_BUDGET."""
+        history = compact_history(
+            chat_history,
+            budget=settings.CHAT_HISTORY_TOKEN_BUDGET,
+            keep_turns=settings.CHAT_HISTORY_KEEP_TURNS,
+            summary_tokens=settings.CHAT_HISTORY_SUMMARY_TOKENS,
+        )
+        if history.tokens_saved:
+            print(f"[INFO] Chat history compacted: ~{history.tokens_before} -> ~{history.tokens_after} tokens "
+                  f"(saved ~{history.tokens_saved})")
+        return history
+
+    async def edit_design_multimodal(
+        self,
+        current_html: str,
+        user_prompt: str,
+        chat_history: list[ChatMessage] | CompactHistory,
+        assets: list[Asset],
+        screenshot: str | None,
+        brand_context: BrandContext | None = None
+    ) -> HTMLOutput:
+        if not isinstance(chat_history, CompactHistory):
+            chat_history = self.compact_chat_history(chat_history)
+        payload = {
+            "current_html": current_html,
+            "user_prompt": user_prompt,
+            "chat_history": chat_history.payload(),
+            "assets": assets,
+            "screenshot": screenshot,
+            "brand_context": brand_context,
+        }
+        return await self._cached(
+            "assistant", payload, self.cache_model("assistant"), self.GEMINI_TEMPERATURE,
+            lambda: self._edit_design_multimodal(current_html, user_prompt, chat_history, assets, screenshot, brand_context),
+            schema=HTMLOutput
+        )
+
+    async def convert_html_to_fabric(self, html_content: str, canvas_width: int, canvas_height: int) -> FabricOutput:
+        payload = {"html_content": html_content, "canvas_width": canvas_width, "canvas_height": canvas_height}
+        return await self._cached(
+            "conversion", payload, self.cache_model("conversion"), self.OPENAI_TEMPERATURE,
+            lambda: self._convert_html_to_fabric(html_content, canvas_width, canvas_height),
+            schema=FabricOutput
+        )
+
+    # 1. INITIAL GENERATION (fabric to HTML) (Local compiler, OpenAI fallback)
+    async def _generate_from_canvas(self, canvas_data: dict, objects: list, ids: list[str]) -> str:
         width = canvas_data.get("width", 800)
         height = canvas_data.get("height", 600)
         background = canvas_data.get("background", "#ffffff")
-        
-        # Send COMPLETE objects 
-        objects = canvas_data.get("objects", [])
 
+        # `objects` holds the backgroundImage too, in step with `ids` and the compiled fragments
         if not objects:
             return f'<div style="position:relative;width:{width}px;height:{height}px;background:{background};"></div>'
 
-        structured_llm = self.openai.with_structured_output(HTMLOutput)
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an expert at converting Fabric.js canvas JSON to HTML/CSS.
-
-RULES:
-1. Create container div with position:relative and exact width/height
-2. Each object becomes HTML element with position:absolute
-3. Preserve EXACT positions (left, top), sizes (width*scaleX, height*scaleY), colors, opacity
-4. Handle types: rect, circle, text/textbox/i-text, image
-5. For text: use exact text, fontSize*scaleY, fontFamily, fill as color
-6. For images: use <img> with src
-7. Apply rotation using transform:rotate(angle deg) if angle exists
-8. Return clean HTML only
-9. Use everything at exact same position as canvas"""),
-            
-            ("human", """Convert this Fabric.js canvas to HTML:
-
-Canvas size: {width}x{height}
-Background: {background}
-
-Objects:
-{objects_json}""")
-        ])
+        if not settings.NATIVE_PREVIEW_COMPILER:
+            return await self._translate_canvas_with_llm(canvas_data)
+
+        # Unchanged objects reuse the fragment an earlier preview made for them
+        keys, cached = [], {}
+        if settings.PREVIEW_FRAGMENT_CACHE:
+            with span("fragments"):
+                keys = [f"{element_id}:{width}x{height}" for element_id in ids]
+                for index, key in enumerate(keys):
+                    fragment = self.fragments.get(key)
+                    if fragment is not None:
+                        cached[index] = fragment
+            self.fragment_counts["cached"] += len(cached)
+
+        with span("compile"):
+            compiled = compile_canvas(canvas_data, cached)
+        translated = {}
+        if compiled.unsupported:
+            print(f"[INFO] {len(compiled.unsupported)}/{len(compiled.fragments)} objects need LLM translation")
+            translated = await self._translate_objects_with_llm(compiled.unsupported, width, height)
+        self.fragment_counts["translated"] += len(compiled.unsupported)
+        self.fragment_counts["compiled"] += len(objects) - len(cached) - len(compiled.unsupported)
+        return self._render_canvas(compiled, objects, ids, translated, cached, keys)
+
+    def _render_canvas(self, compiled, objects: list, ids: list[str], translated: dict, cached: dict, keys: list) -> str:
+        """
+        Fill in new fragments, tagging each with its object's identity
+        (IDENTITY_MAP_ENABLED) and caching it under `keys`; cached fragments
+        are used as they are.
+        """
+        for index, fragment in enumerate(compiled.fragments):
+            if index in cached:
+                continue
+            cacheable = bool(keys)
+            if fragment is None:
+                fragment = translated.get(index)
+                if fragment is None:
+                    continue  # the model skipped it
+                # Without index attributes the model's output may cover several objects
+                cacheable = cacheable and (len(compiled.unsupported) == 1 or "data-fabric-index" in fragment)
+            if fragment and settings.IDENTITY_MAP_ENABLED:
+                with span("identity"):
+                    fragment = self.identities.tag(fragment, objects[index], ids[index])
+            compiled.fragments[index] = fragment
+            if cacheable:
+                self.fragments.set(keys[index], fragment, len(fragment), settings.CACHE_TTL_SECONDS)
+        html = compiled.render()
+        # Cached fragments were mapped when first rendered, unless evicted since
+        if settings.IDENTITY_MAP_ENABLED and all(self.identities.known(ids[i]) for i, f in cached.items() if f):
+            self.identities.mark(html)
+        return html
+
+    @staticmethod
+    @traced("prompt")
+    def _objects_json(objects: list[dict]) -> str:
+        if not settings.CANVAS_JSON_COMPACT:
+            return json.dumps(objects, indent=2)
+        compact = compact_objects_json(objects)
+        print(f"[INFO] Canvas JSON compacted: ~{compact.tokens_before} -> ~{compact.tokens_after} tokens")
+        return compact.json
+
+    async def _translate_canvas_with_llm(self, canvas_data: dict) -> str:
+        width = canvas_data.get("width", 800)
+        height = canvas_data.get("height", 600)
+        background = canvas_data.get("background", "#ffffff")
+        objects = canvas_data.get("objects", [])
 
-        chain = prompt | structured_llm
+        known = known_urls([obj.get("src") for obj in objects if isinstance(obj, dict)])
 
         try:
-            result = await chain.ainvoke({
+            result = await self._invoke_validated("canvas", {
                 "width": width,
                 "height": height,
                 "background": background if isinstance(background, str) else "#ffffff",
-                "objects_json": json.dumps(objects, indent=2)
-            })
+                "objects_json": self._objects_json(objects)
+            }, self._html_check("canvas", ("html",), width, height, known))
             return result.html
         except Exception as e:
             print(f"[OPENAI ERROR]: {str(e)}")
             raise e
 
+    async def _translate_objects_with_llm(self, objects: dict[int, dict], width: float, height: float) -> dict[int, str]:
+        """Translate only the objects the local compiler couldn't handle, keyed by z-index."""
 
-    # 2. RESIZING (HTML TO HTML) (Gemini)
+        payload = [dict(obj, index=index) for index, obj in objects.items()]
+        try:
+            result = await self._invoke("canvas_objects", {
+                "width": width,
+                "height": height,
+                "objects_json": self._objects_json(payload)
+            })
+        except Exception as e:
+            print(f"[OPENAI ERROR]: {str(e)}")
+            raise e
 
-    async def generate_resize_variations(self, current_html: str, target_width: int, target_height: int) -> ResizeOutput:
-        structured_llm = self.gemini.with_structured_output(ResizeOutput)
+        html = self._clean_html(result.html)
+        fragments = split_fragments(html)
+        if not fragments:
+            # Model ignored the index attribute: keep its output at the first slot
+            return {min(objects): html}
+        return fragments
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an intelligent visual layout engine.
-            TASK: Adapt the HTML to a new canvas size.
-            RULES:
-            - Container must be exactly {target_width}px × {target_height}px
-            - position:absolute ONLY
-            - Background images must cover full canvas
-            - dont disturb aspect ratio of images and elements
-            - Reposition elements intelligently to fit the new aspect ratio"""),
-            
-            ("human", """
-            CURRENT HTML: {current_html}
-            TARGET SIZE: {target_width}x{target_height}
-            """)
-        ])
 
-        chain = prompt | structured_llm
+    # 2. RESIZING (HTML TO HTML) (Gemini)
 
-        result = await chain.ainvoke({
+    def _proportional_variation(self, current_html: str, target_width: int, target_height: int) -> str | None:
+        """Variation 1 without the model, or None if the HTML isn't a stage we can scale."""
+        if not settings.LOCAL_PROPORTIONAL_RESIZE:
+            return None
+        try:
+            with span("scale"):
+                return proportional_resize(self._clean_html(current_html), target_width, target_height)
+        except ResizeError as e:
+            print(f"[INFO] Proportional resize unavailable ({e}), asking the model for both variations")
+            return None
+
+    async def _generate_resize_variations(self, current_html: str, target_width: int, target_height: int) -> ResizeOutput:
+        inputs = {
             "current_html": current_html,
             "target_width": target_width,
             "target_height": target_height
-        })
-        
-        # Clean outputs (Gemini sometimes adds markdown)
-        result.variation_1_html = self._clean_html(result.variation_1_html)
-        result.variation_2_html = self._clean_html(result.variation_2_html)
-        return result
+        }
+
+        known = known_urls(current_html)
+
+        variation_1 = self._proportional_variation(current_html, target_width, target_height)
+        if variation_1 is not None:
+            creative = await self._invoke_validated("resize_creative", inputs, self._html_check(
+                "resize_creative", ("variation_2_html",), target_width, target_height, known
+            ))
+            return ResizeOutput(variation_1_html=variation_1, variation_2_html=creative.variation_2_html)
+
+        # Cleans (Gemini sometimes adds markdown) and checks both variations
+        return await self._invoke_validated("resize", inputs, self._html_check(
+            "resize", tuple(VARIATION_FIELDS), target_width, target_height, known
+        ))
+
+    async def stream_resize_variations(self, current_html: str, target_width: int, target_height: int):
+        """Yields (event, data): each variation as soon as it is complete, then "done"."""
+        payload = {"current_html": current_html, "target_width": target_width, "target_height": target_height}
+        use_cache = self.cache.enabled_for("resize", self.GEMINI_TEMPERATURE)
+        key = self.cache.make_key("resize", payload, self.cache_model("resize"), self.GEMINI_TEMPERATURE)
+
+        hit = await self.cache.get(key) if use_cache else None
+        if use_cache:
+            CACHE_REQUESTS.inc(endpoint="resize", result="miss" if hit is None else "hit")
+        if hit is not None:
+            result = ResizeOutput.model_validate(hit)
+            yield "variation", {"index": 1, "html": result.variation_1_html}
+            yield "variation", {"index": 2, "html": result.variation_2_html}
+            yield "done", {"success": True, **result.model_dump()}
+            return
+
+        # Proportional layout is ready before the model even starts
+        variation_1 = self._proportional_variation(current_html, target_width, target_height)
+        if variation_1 is not None:
+            yield "variation", {"index": 1, "html": variation_1}
+            chain_name = "resize_creative_stream"
+        else:
+            chain_name = "resize_stream"
+
+        # Variations are sent as they complete, so they are repaired but not retried
+        known = known_urls(current_html)
+        tracker = PartialFieldTracker()
+        partial, checked = {}, {}
+        async for partial in self._stream(chain_name, payload):
+            for field in tracker.completed(partial):
+                if field in VARIATION_FIELDS:
+                    checked[field] = self._validate(chain_name, partial[field], target_width, target_height, known)
+                    yield "variation", {"index": VARIATION_FIELDS[field], "html": checked[field].html}
+
+        for field in VARIATION_FIELDS:
+            if field not in checked and (field != "variation_1_html" or variation_1 is None):
+                checked[field] = self._validate(chain_name, partial.get(field, ""), target_width, target_height, known)
+        self._count_unretried(chain_name, list(checked.values()))
+        result = ResizeOutput(
+            variation_1_html=variation_1 if variation_1 is not None else checked["variation_1_html"].html,
+            variation_2_html=checked["variation_2_html"].html
+        )
+        for field, index in VARIATION_FIELDS.items():
+            if field not in tracker.done and field in partial:
+                yield "variation", {"index": index, "html": getattr(result, field)}
+        if use_cache and all(v.ok for v in checked.values()):
+            await self.cache.set(key, result.model_dump(), self.cache.ttl_for(self.GEMINI_TEMPERATURE))
+
+        yield "done", {"success": True, **result.model_dump()}
+
+    async def batch_resize_variations(self, current_html: str, sizes: list[tuple[int, int]]):
+        """
+        Yields ((width, height), ResizeOutput | Exception) as each size finishes.
+        Sizes sharing an aspect ratio are generated once, at the largest size,
+        and scaled locally to the others. At most GEMINI_BATCH_CONCURRENCY
+        model calls run at a time.
+        """
+        semaphore = asyncio.Semaphore(settings.GEMINI_BATCH_CONCURRENCY)
+
+        async def generate(size):
+            async with semaphore:
+                return await self.generate_resize_variations(current_html, *size)
+
+        async def run_group(group):
+            base, *rest = group
+            try:
+                result = await generate(base)
+            except Exception as e:
+                return [(size, e) for size in group]
+
+            results = [(base, result)]
+            for size in rest:
+                try:
+                    scaled = ResizeOutput(
+                        variation_1_html=proportional_resize(result.variation_1_html, *size),
+                        variation_2_html=proportional_resize(result.variation_2_html, *size)
+                    )
+                except ResizeError:
+                    try:
+                        scaled = await generate(size)
+                    except Exception as e:
+                        scaled = e
+                results.append((size, scaled))
+            return results
+
+        groups = aspect_groups(sizes)
+        print(f"[INFO] Batch resize: {len(sizes)} sizes, {len(groups)} aspect ratios")
+        tasks = [asyncio.ensure_future(run_group(group)) for group in groups]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for size, result in await finished:
+                    yield size, result
+        finally:
+            for task in tasks:
+                task.cancel()
 
     
     # ==========================================
     # 3. CHAT Assistance (Gemini Multimodal)
     # ==========================================
-    async def edit_design_multimodal(
+    @traced("prompt")
+    def _build_edit_messages(
         self, 
         current_html: str, 
         user_prompt: str, 
-        chat_history: list[ChatMessage], 
+        chat_history: CompactHistory, 
         assets: list[Asset], 
         screenshot: str | None,
-        brand_context: BrandContext | None = None
-    ) -> HTMLOutput:
-        
-        structured_llm = self.gemini.with_structured_output(HTMLOutput)
-        
-        
+        brand_context: BrandContext | None = None,
+        patch_mode: bool = False,
+        images: dict[str, str] | None = None
+    ) -> list:
         # Base Persona & Principles
         system_instruction = """
     You are a Senior Creative Technologist and UI/UX Designer. 
@@ -612,12 +1509,17 @@ Objects:
     - If the user provides a screenshot, analyze it to fix alignment, spacing, or color mismatches.
     - If images (ASSETS) are provided, use their EXACT URL string. Do not use placeholders if real assets exist.
     """
+        if patch_mode:
+            system_instruction += PATCH_RULES
 
         # Create the Message List
         messages = [SystemMessage(content=system_instruction)]
+        images = images or {}
 
-        # 2. ADD CHAT HISTORY
-        for msg in chat_history:
+        # 2. ADD CHAT HISTORY (older turns arrive as a summary)
+        if chat_history.summary:
+            messages.append(HumanMessage(content=f"[EARLIER CONVERSATION SUMMARY]:\n{chat_history.summary}"))
+        for msg in chat_history.turns:
             messages.append(HumanMessage(content=f"[{msg.role.upper()}]: {msg.content}"))
 
         # 3. CONSTRUCT MULTIMODAL MESSAGE (Text + Images)
@@ -635,7 +1537,7 @@ Objects:
                 "type": "text", "text": "CONTEXT: Screenshot of current render (Analyze for layout/color bugs):"
             })
             content_parts.append({
-                "type": "image_url", "image_url": {"url": screenshot}
+                "type": "image_url", "image_url": {"url": images.get(screenshot, screenshot)}
             })
 
         # C. Assets
@@ -646,7 +1548,7 @@ Objects:
             for asset in assets:
                 # Send Image Data (for Vision)
                 content_parts.append({
-                    "type": "image_url", "image_url": {"url": asset.url}
+                    "type": "image_url", "image_url": {"url": images.get(asset.url, asset.url)}
                 })
                 # Send Text URL (for Code)
                 content_parts.append({
@@ -654,156 +1556,256 @@ Objects:
                 })
 
         messages.append(HumanMessage(content=content_parts))
+        return messages
 
-        result = await structured_llm.ainvoke(messages)
-        
-        # Clean Gemini output (safety net for markdown)
-        result.html = self._clean_html(result.html)
-        return result
+    @traced("assets")
+    async def _vision_images(self, assets: list[Asset], screenshot: str | None) -> dict[str, str]:
+        """Original URL -> compact data URL for every image the model will look at."""
+        if not settings.ASSET_PIPELINE_ENABLED:
+            return {}
+        return await self.assets.prepare_all([asset.url for asset in assets] + [screenshot])
 
+    async def _edit_design_multimodal(
+        self, 
+        current_html: str, 
+        user_prompt: str, 
+        chat_history: CompactHistory, 
+        assets: list[Asset], 
+        screenshot: str | None,
+        brand_context: BrandContext | None = None
+    ) -> HTMLOutput:
+        images = await self._vision_images(assets, screenshot)
+        route = self.router.route_edit(current_html, user_prompt, len(assets), bool(screenshot))
+        if settings.ASSISTANT_PATCH_EDITS:
+            result = await self._edit_with_patch(
+                current_html, user_prompt, chat_history, assets, screenshot, brand_context, images, route
+            )
+            if result is not None:
+                return result
 
+        messages = self._build_edit_messages(
+            current_html, user_prompt, chat_history, assets, screenshot, brand_context, images=images
+        )
 
-    async def convert_html_to_fabric(self, html_content: str, canvas_width: int, canvas_height: int) -> FabricOutput:
+        # Cleans Gemini output (safety net for markdown) and checks it against the current stage
+        return await self._invoke_validated("assistant", messages, self._html_check(
+            "assistant", ("html",), *self._edit_target(current_html, assets, brand_context, user_prompt, chat_history)
+        ), route)
+
+    def _edit_target(
+        self, current_html: str, assets: list[Asset], brand_context: BrandContext | None,
+        user_prompt: str = "", chat_history: CompactHistory | None = None
+    ) -> tuple:
+        """(width, height, known image URLs, absolute_only) for checking an edit of current_html."""
+        width, height = stage_size(self._clean_html(current_html)) or (None, None)
+        brand_urls = [brand_context.logoUrl, brand_context.backgroundUrl] if brand_context else []
+        # URLs the user pasted into the conversation count as provided
+        texts = [user_prompt] + ([chat_history.summary] + [turn.content for turn in chat_history.turns]
+                                 if chat_history else [])
+        known = known_urls(current_html, [asset.url for asset in assets], brand_urls, text_urls(*texts))
+        # The assistant may lay out UI designs with flex or grid
+        return width, height, known, False
+
+    async def _edit_with_patch(
+        self,
+        current_html: str,
+        user_prompt: str,
+        chat_history: CompactHistory,
+        assets: list[Asset],
+        screenshot: str | None,
+        brand_context: BrandContext | None = None,
+        images: dict[str, str] | None = None,
+        route: Route | None = None
+    ) -> HTMLOutput | None:
+        """
+        Ask Gemini for element operations (on the route's model) and apply them
+        locally. Returns None when the caller should regenerate the full HTML
+        instead, having moved a fast route to the strong model.
+        """
+        try:
+            with span("patch"):
+                root, annotated = annotate(self._clean_html(current_html))
+        except PatchError as e:
+            print(f"[INFO] Patch edit unavailable ({e}), regenerating full HTML")
+            return None
+
+        messages = self._build_edit_messages(
+            annotated, user_prompt, chat_history, assets, screenshot, brand_context, patch_mode=True, images=images
+        )
+        patch = await self._invoke_routed("assistant_patch", messages, route)
+        if not patch.operations:
+            print("[INFO] Model asked for a full redesign, regenerating full HTML")
+            self.router.escalate(route, "redesign")
+            return None
+        try:
+            with span("patch"):
+                html = apply_patch(root, patch.operations)
+        except PatchError as e:
+            print(f"[INFO] Patch did not apply ({e}), regenerating full HTML")
+            self.router.escalate(route, "patch")
+            return None
+
+        validation = self._validate(
+            "assistant_patch", html, *self._edit_target(current_html, assets, brand_context, user_prompt, chat_history)
+        )
+        self._count_unretried("assistant_patch", [validation])
+        if not validation.ok:
+            print(f"[INFO] Patched HTML rejected, regenerating full HTML:\n{validation.describe()}")
+            self.router.escalate(route, "validation")
+            return None
+
+        print(f"[INFO] Applied {len(patch.operations)} edit operations")
+        return HTMLOutput(html=validation.html, explanation=patch.explanation)
+
+    async def stream_edit_design(
+        self,
+        current_html: str,
+        user_prompt: str,
+        chat_history: list[ChatMessage] | CompactHistory,
+        assets: list[Asset],
+        screenshot: str | None,
+        brand_context: BrandContext | None = None
+    ):
+        """Yields (event, data): "html" deltas while Gemini writes, "explanation", then "done"."""
+        if not isinstance(chat_history, CompactHistory):
+            chat_history = self.compact_chat_history(chat_history)
+        payload = {
+            "current_html": current_html,
+            "user_prompt": user_prompt,
+            "chat_history": chat_history.payload(),
+            "assets": assets,
+            "screenshot": screenshot,
+            "brand_context": brand_context,
+        }
+        use_cache = self.cache.enabled_for("assistant", self.GEMINI_TEMPERATURE)
+        key = self.cache.make_key("assistant", payload, self.cache_model("assistant"), self.GEMINI_TEMPERATURE)
+
+        explanation_sent = False
+        hit = await self.cache.get(key) if use_cache else None
+        if use_cache:
+            CACHE_REQUESTS.inc(endpoint="assistant", result="miss" if hit is None else "hit")
+        if hit is not None:
+            result = HTMLOutput.model_validate(hit)
+            yield "html", {"delta": result.html}
+        else:
+            result = None
+            images = await self._vision_images(assets, screenshot)
+            if settings.ASSISTANT_PATCH_EDITS:
+                # A patch is short enough that streaming its operations buys nothing. Only
+                # the patch is routed: streamed full HTML can't be redone on the strong model
+                route = self.router.route_edit(current_html, user_prompt, len(assets), bool(screenshot))
+                result = await self._edit_with_patch(
+                    current_html, user_prompt, chat_history, assets, screenshot, brand_context, images, route
+                )
+                if result is not None:
+                    yield "html", {"delta": result.html}
+
+            if result is None:
+                messages = self._build_edit_messages(
+                    current_html, user_prompt, chat_history, assets, screenshot, brand_context, images=images
+                )
+                tracker = PartialFieldTracker()
+                partial = {}
+                async for partial in self._stream("assistant_stream", messages):
+                    delta = tracker.delta(partial, "html")
+                    if delta:
+                        yield "html", {"delta": delta}
+                    if "explanation" in tracker.completed(partial):
+                        explanation_sent = True
+                        yield "explanation", {"explanation": partial["explanation"]}
+
+                # Already streamed, so repaired but not retried
+                validation = self._validate(
+                    "assistant_stream", partial.get("html", ""),
+                    *self._edit_target(current_html, assets, brand_context, user_prompt, chat_history)
+                )
+                self._count_unretried("assistant_stream", [validation])
+                result = HTMLOutput(html=validation.html, explanation=partial.get("explanation"))
+                use_cache = use_cache and validation.ok
+            if use_cache:
+                await self.cache.set(key, result.model_dump(), self.cache.ttl_for(self.GEMINI_TEMPERATURE))
+
+        explanation = result.explanation or "Design updated successfully."
+        if not explanation_sent:
+            yield "explanation", {"explanation": explanation}
+        yield "done", {
+            "success": True,
+            "html": result.html,
+            "explanation": explanation,
+            "history_tokens_saved": chat_history.tokens_saved
+        }
+
+
+
+    async def _convert_html_to_fabric(self, html_content: str, canvas_width: int, canvas_height: int) -> FabricOutput:
         """
         Translates HTML/CSS back into a Fabric.js JSON object
         so the frontend can load it as editable objects.
+        Parsed natively; only nodes outside our HTML subset go to OpenAI.
         """
-        
-        llm_with_json = self.openai.bind(response_format={"type": "json_object"})
-        
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a Fabric.js 6.0 expert. Convert HTML/CSS to valid Fabric.js canvas JSON.
-
-    POSITIONING CALCULATION RULES:
-
-    CRITICAL BACKGROUND RULE:
-    - The top-level "background" property MUST only be a hex color string (e.g., "#ffffff").
-    - If the HTML background is a GRADIENT or IMAGE, you MUST create a "rect" object as the FIRST element in the "objects" array.
-    - This background rectangle must have: "left": 0, "top": 0, "width": {canvas_width}, "height": {canvas_height}, "selectable": false, "evented": false.
-
-    GRADIENT FORMAT (MANDATORY):
-    Gradients MUST follow this exact structure inside the "fill" property:
-    {{
-        "type": "linear",
-        "coords": {{"x1": 0, "y1": 0, "x2": 0, "y2": height_of_object}},
-        "colorStops": [
-            {{"offset": 0, "color": "#start"}},
-            {{"offset": 1, "color": "#end"}}
-        ]
-    }}
-
-    For radial gradients:
-    {{
-        "type": "radial", 
-        "coords": {{"x1": cx, "y1": cy, "r1": 0, "x2": cx, "y2": cy, "r2": radius}},
-        "colorStops": [
-            {{"offset": 0, "color": "#start"}},
-            {{"offset": 1, "color": "#end"}}
-        ]
-    }}
-
-    SHADOW FORMAT (Fabric.js 6.0):
-    Do NOT use filters for shadows. Use the shadow property with this structure:
-    {{
-        "shadow": {{
-            "color": "rgba(0,0,0,0.3)",
-            "blur": 10,
-            "offsetX": 5,
-            "offsetY": 5
-        }}
-    }}
-
-    FILTERS:
-    Only use filters for: Brightness, Contrast, Saturate, and HueRotation using standard Fabric.js 6.0 format.
-
-    IMPORTANT CONSTRAINTS:
-    - Never set charSpacing lower than -100
-    - When using clipPath for images, always set absolutePositioned: true and match the clipPath 'left' and 'top' to the parent object's 'left' and 'top'
-
-    POSITIONING RULES:
-    1. When HTML has "left: 50%" or "transform: translate(-50%, -50%)":
-    - Calculate center position: canvas_width ÷ 2 for left, canvas_height ÷ 2 for top
-    - Set "originX": "center" and "originY": "center"
-
-    2. For {canvas_width}x{canvas_height} canvas:
-    - Horizontal center: "left": {canvas_width}/2
-    - Vertical center: "top": {canvas_height}/2
-
-    3. Examples:
-    - 1080px wide canvas → centered object: "left": 540
-    - 1920px tall canvas → centered object: "top": 960
-
-    TEXT HANDLING:
-    - Use "i-text" for short text (single line or minimal wrapping)
-    - Use "textbox" with "width" property for paragraphs and multi-line text
-    - Analyze HTML container width to determine optimal text width
-    - Insert "\\n" for line breaks at natural language boundaries
-    - Common text object properties:
-    {{
-        "type": "i-text" or "textbox",
-        "left": x,
-        "top": y,
-        "text": "content",
-        "fontSize": 24,
-        "fontFamily": "Arial",
-        "fill": "#000000",
-        "fontWeight": "normal",
-        "fontStyle": "normal",
-        "textAlign": "left",
-        "lineHeight": 1.16
-    }}
-
-    IMAGE HANDLING:
-    - Image objects MUST include "crossOrigin": "anonymous"
-    - Example structure:
-    {{
-        "type": "image",
-        "left": x,
-        "top": y,
-        "width": w,
-        "height": h,
-        "src": "url",
-        "crossOrigin": "anonymous"
-    }}
-
-    RETURN FORMAT (Fabric.js 6.0):
-    {{
-        "version": "6.0.2",
-        "width": {canvas_width},
-        "height": {canvas_height},
-        "background": "#ffffff",
-        "objects": [...]
-    }}
-
-    CRITICAL: The "background" property should be a simple color string. For gradient backgrounds, create a rectangle object as the first item in objects array."""),
-            
-            ("human", """Convert this HTML to Fabric.js 6.0 JSON.
-
-    Canvas dimensions: {canvas_width}px × {canvas_height}px
-    Horizontal center position: {center_x}px
-    Vertical center position: {center_y}px
+        if not settings.NATIVE_HTML_PARSER:
+            return await self._convert_html_with_llm(html_content, canvas_width, canvas_height)
+
+        reuse = self.identities.lookup if settings.IDENTITY_MAP_ENABLED else None
+        with span("convert"):
+            design = parse_design(self._clean_html(html_content), canvas_width, canvas_height, reuse=reuse)
+        if design.reused:
+            print(f"[INFO] Reused {design.reused} untouched preview objects")
+        if not design.slots and not design.unsupported:
+            # Not our stage markup at all
+            return await self._convert_html_with_llm(html_content, canvas_width, canvas_height)
+
+        translated = {}
+        if design.unsupported:
+            reasons = ", ".join(reason for _, _, reason in design.unsupported.values())
+            print(f"[INFO] {len(design.unsupported)} nodes need LLM conversion ({reasons})")
+            fallback = await self._convert_html_with_llm(
+                fallback_html(design), canvas_width, canvas_height,
+                extra_rules=NODE_INDEX_RULE
+            )
+            first_slot = min(design.unsupported)
+            for obj in fallback.objects:
+                index = obj.pop("nodeIndex", first_slot)
+                index = int(index) if str(index).isdigit() else first_slot
+                if index not in design.unsupported:
+                    index = first_slot
+                translated.setdefault(index, []).append(obj)
+
+        return FabricOutput(
+            version=FABRIC_VERSION,
+            width=canvas_width,
+            height=canvas_height,
+            background=design.background,
+            objects=design.objects(translated)
+        )
 
-    HTML:
-    {html_content}""")
-        ])
-        
-        chain = prompt | llm_with_json
-        
+    async def _convert_html_with_llm(self, html_content: str, canvas_width: int, canvas_height: int, extra_rules: str = "") -> FabricOutput:
         try:
             # Calculate center positions explicitly
             center_x = canvas_width // 2
             center_y = canvas_height // 2
             
-            result = await chain.ainvoke({
+            inputs = {
                 "html_content": html_content,
                 "canvas_width": canvas_width,
                 "canvas_height": canvas_height,
                 "center_x": center_x,
-                "center_y": center_y
-            })
-            
-            import json
-            data = json.loads(result.content)
+                "center_y": center_y,
+                "extra_rules": extra_rules
+            }
+            route = self.router.route_conversion(html_content)
+            while True:
+                result = await self._invoke("conversion", inputs, tier=route.tier)
+                try:
+                    with span("parse"):
+                        data = json.loads(result.content)
+                    if not isinstance(data, dict) or not isinstance(data.get("objects", []), list):
+                        raise ValueError("expected a Fabric canvas object with an objects list")
+                    break
+                except ValueError:
+                    if not route.fast:
+                        raise
+                    self.router.escalate(route, "parse")
             
             # Ensure version is 6.0.2
             version = data.get("version", "6.0.2")
@@ -0,0 +1,195 @@
+"""
+Minimal Prometheus metrics (text exposition format 0.0.4).
+
+Counters and histograms are kept in-process per worker. Collectors let
+components that already keep their own counters (scheduler, cache, asset
+pipeline) be exported at scrape time without double bookkeeping.
+
+Under the preforking server a scrape reaches one worker, so every sample
+carries a worker="<pid>" label: scrape each worker (or sum over scrapes)
+and aggregate with e.g. sum without (worker) (...).
+"""
+import os
+import threading
+from bisect import bisect_left
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+SIZE_BUCKETS = (1_000, 5_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000)
+INF_LABEL = 'le="+Inf"'
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    # Which worker process the sample comes from (see the module docstring)
+    pairs.append(f'worker="{os.getpid()}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_one(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_one(self, key, value):
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_one(self, key, state):
+        counts, total, count = state
+        lines, cumulative = [], 0
+        for bound, bucket in zip(self.buckets, counts):
+            cumulative += bucket
+            le = _labels(self.label_names, key, f'le="{_number(bound)}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        lines.append(f"{self.name}_bucket{_labels(self.label_names, key, INF_LABEL)} {count}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """Register fn() -> iterable of (name, kind, help, {labels}, value), sampled at scrape time."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        # Samples of one family must be contiguous, whatever order collectors yield them in
+        families = {}
+        for fn in self._collectors:
+            for name, kind, help_text, labels, value in fn():
+                family = families.setdefault(name, [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+                names = tuple(labels)
+                family.append(f"{name}{_labels(names, tuple(labels[n] for n in names))} {_number(value)}")
+        for family in families.values():
+            lines.extend(family)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_LATENCY = REGISTRY.histogram(
+    "autocre8_http_request_duration_seconds",
+    "Time to response headers per endpoint (first byte for streams)",
+    ("endpoint", "method"),
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    "autocre8_http_requests_total", "HTTP requests per endpoint and status", ("endpoint", "method", "status")
+)
+PROVIDER_LATENCY = REGISTRY.histogram(
+    "autocre8_provider_request_duration_seconds",
+    "Model call duration per provider, chain and model tier, including queueing for a slot",
+    ("provider", "chain", "tier", "outcome"),
+)
+TOKENS = REGISTRY.counter(
+    "autocre8_llm_tokens_total", "Tokens reported by the provider", ("endpoint", "provider", "kind")
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "autocre8_cache_requests_total", "Response cache lookups per endpoint", ("endpoint", "result")
+)
+FALLBACK_RESPONSES = REGISTRY.counter(
+    "autocre8_fallback_responses_total", "Responses served from an error fallback (success=False)", ("endpoint",)
+)
+PAYLOAD_BYTES = REGISTRY.histogram(
+    "autocre8_payload_bytes", "Size of large request fields", ("field",), buckets=SIZE_BUCKETS
+)
+HTML_VALIDATION = REGISTRY.counter(
+    "autocre8_html_validation_total",
+    "Model HTML checks per chain: valid, repaired locally, retried, failed or shipped unrepaired (streams)",
+    ("chain", "outcome"),
+)
+HTML_ISSUES = REGISTRY.counter(
+    "autocre8_html_issues_total", "Structural issues found in model HTML, repaired or not", ("chain", "issue")
+)
+
+
+class TokenUsageCallback(AsyncCallbackHandler):
+    """Counts prompt/completion tokens from the usage metadata on model results."""
+
+    def __init__(self, endpoint: str, provider: str):
+        self.endpoint = endpoint
+        self.provider = provider
+
+    async def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if not usage:
+                    continue
+                TOKENS.inc(usage.get("input_tokens", 0), endpoint=self.endpoint, provider=self.provider, kind="prompt")
+                TOKENS.inc(usage.get("output_tokens", 0), endpoint=self.endpoint, provider=self.provider, kind="completion")
@@ -0,0 +1,131 @@
+"""
+Complexity-aware routing between a fast and a strong model per provider.
+
+Most assistant turns are small edits ("make the title red") and most LLM
+conversions are a handful of nodes our parser didn't cover; neither needs
+the strongest model. The router looks at what a request asks for and what
+it carries (element count, HTML size, the prompt's intent, screenshots and
+assets) and sends it to the fast tier only when nothing points to a hard
+request. The service redoes a fast result that fails validation on the
+strong tier (an escalation). Decisions and escalations are counted here;
+latency per tier is on the provider latency histogram.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+FAST = "fast"
+STRONG = "strong"
+
+TAG_RE = re.compile(r"<[a-zA-Z]")
+
+# Edits that change properties of what is already there
+SIMPLE_INTENT_RE = re.compile(
+    r"\b(colou?rs?|font|bold|italic|underline|bigger|smaller|larger|size|text|title|headline|heading|"
+    r"subtitle|caption|label|button|word(ing)?|typo|spelling|rename|replace|change|swap|move|shift|nudge|align|"
+    r"center|centre|left|right|top|bottom|opacity|transparent|padding|margin|spacing|border|radius|rounded|"
+    r"shadow|rotate|hide|remove|delete|background)\b",
+    re.I,
+)
+# Requests that rework the composition
+COMPLEX_INTENT_RE = re.compile(
+    r"\b(re-?design|redo|poster|flyer|banner|thumbnail|layout|from scratch|new design|overhaul|rebuild|"
+    r"restyle|revamp|transform|modern|minimal|theme|brand(ing)?|inspired|like (this|the)|reference|"
+    r"variations?|whole|entire|complete|professional|improve|hierarchy|composition|create|generate|"
+    r"make (it|this) (look|feel))\b",
+    re.I,
+)
+
+
+@dataclass
+class Route:
+    """Tier for one request, and why. escalate() moves it to the strong tier."""
+    kind: str
+    tier: str
+    reasons: list[str] = field(default_factory=list)
+    escalated: bool = False
+
+    @property
+    def fast(self) -> bool:
+        return self.tier == FAST
+
+    @property
+    def reason(self) -> str:
+        return self.reasons[0] if self.reasons else "simple"
+
+
+class ModelRouter:
+    def __init__(self, enabled: bool = True, max_elements: int = 40, max_html_bytes: int = 16_000,
+                 max_prompt_chars: int = 300, max_assets: int = 1, fast_kinds=None):
+        self.enabled = enabled
+        # Kinds with a fast model to go to (None: all); the rest stay strong
+        self.fast_kinds = None if fast_kinds is None else set(fast_kinds)
+        self.max_elements = max_elements
+        self.max_html_bytes = max_html_bytes
+        self.max_prompt_chars = max_prompt_chars
+        self.max_assets = max_assets
+        self.decisions: Counter = Counter()  # (kind, tier, reason) -> requests
+        self.escalations: Counter = Counter()  # (kind, cause) -> requests
+
+    @classmethod
+    def from_settings(cls, settings, fast_kinds) -> "ModelRouter":
+        """Routing is on only with MODEL_ROUTING set and a fast model for at least one kind."""
+        return cls(
+            enabled=settings.MODEL_ROUTING and bool(fast_kinds),
+            max_elements=settings.ROUTING_MAX_ELEMENTS,
+            max_html_bytes=settings.ROUTING_MAX_HTML_BYTES,
+            max_prompt_chars=settings.ROUTING_MAX_PROMPT_CHARS,
+            max_assets=settings.ROUTING_MAX_ASSETS,
+            fast_kinds=fast_kinds,
+        )
+
+    def routes(self, kind: str) -> bool:
+        """Whether requests of `kind` may go to the fast model."""
+        return self.enabled and (self.fast_kinds is None or kind in self.fast_kinds)
+
+    def _size_reasons(self, html: str) -> list[str]:
+        reasons = []
+        if len(TAG_RE.findall(html or "")) > self.max_elements:
+            reasons.append("elements")
+        if len((html or "").encode("utf-8")) > self.max_html_bytes:
+            reasons.append("html_size")
+        return reasons
+
+    def _decide(self, kind: str, reasons: list[str]) -> Route:
+        if not self.routes(kind):
+            reasons = ["routing_off"]
+        route = Route(kind, STRONG if reasons else FAST, reasons)
+        self.decisions[(kind, route.tier, route.reason)] += 1
+        return route
+
+    def route_edit(self, current_html: str, user_prompt: str, asset_count: int, screenshot: bool) -> Route:
+        """Tier for an assistant turn."""
+        reasons = []
+        if screenshot:
+            reasons.append("screenshot")
+        if asset_count > self.max_assets:
+            reasons.append("assets")
+        prompt = user_prompt or ""
+        if COMPLEX_INTENT_RE.search(prompt):
+            reasons.append("complex_intent")
+        elif not SIMPLE_INTENT_RE.search(prompt):
+            reasons.append("unclear_intent")
+        if len(prompt) > self.max_prompt_chars:
+            reasons.append("long_prompt")
+        return self._decide("assistant", reasons + self._size_reasons(current_html))
+
+    def route_conversion(self, html_content: str) -> Route:
+        """Tier for an HTML -> Fabric conversion by the LLM."""
+        return self._decide("conversion", self._size_reasons(html_content))
+
+    def escalate(self, route: Route | None, cause: str):
+        """Move a fast route to the strong tier after its result failed `cause` (no-op otherwise)."""
+        if route is not None and route.fast:
+            route.tier = STRONG
+            route.escalated = True
+            self.escalations[(route.kind, cause)] += 1
+            print(f"[INFO] {route.kind}: fast model result failed ({cause}), escalating to the strong model")
+
+    def stats(self) -> dict:
+        routed = {tier: sum(n for (_, t, _), n in self.decisions.items() if t == tier) for tier in (FAST, STRONG)}
+        return {"enabled": self.enabled, **routed, "escalated": sum(self.escalations.values())}
@@ -0,0 +1,284 @@
+"""
+Per-worker connection pools and credentials for the provider clients.
+
+Left to their defaults both SDKs pay for connections on the request path:
+openai's httpx pool drops connections idle for 5 s, the Vertex gRPC channel
+sends no keepalives, and a Google access token that expired while the worker
+was idle is refreshed inline by the first call. ProviderPools owns one tuned
+httpx.AsyncClient (OpenAI) and one keepalive gRPC channel (Vertex) per worker,
+shared by every client built on them, refreshes the Google token before it
+expires, and can open the connections at startup (warmup).
+
+Everything is created lazily in the process that uses it; a pool or channel
+inherited across a fork is dropped, never reused.
+"""
+import asyncio
+import datetime
+import os
+import time
+
+import httpx
+
+VERTEX_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+OPENAI_DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+# Retry a failed credential refresh after this long; never refresh more often
+CREDENTIAL_RETRY_SECONDS = 30
+MIN_REFRESH_INTERVAL = 30
+
+
+class ProviderPools:
+    def __init__(
+        self,
+        max_connections: int = 32,
+        max_keepalive: int = 16,
+        keepalive: float = 90.0,
+        connect_timeout: float = 5.0,
+        grpc_keepalive: float = 300.0,
+        refresh_margin: float = 600.0,
+        endpoint_timeouts: dict[str, float] | None = None,
+        openai_base_url: str = "",
+        vertex_location: str = "global",
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.grpc_keepalive = grpc_keepalive
+        self.refresh_margin = refresh_margin
+        self.endpoint_timeouts = endpoint_timeouts or {}
+        self.openai_base_url = (openai_base_url or OPENAI_DEFAULT_BASE_URL).rstrip("/")
+        self.vertex_host = "aiplatform.googleapis.com" if vertex_location == "global" \
+            else f"{vertex_location}-aiplatform.googleapis.com"
+
+        self._pid = None
+        self._openai_client = None
+        self._vertex = None  # (event loop, PredictionServiceAsyncClient)
+        self._credentials = None
+        self._credentials_loaded = False
+        self._refresher = None
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.warmup_seconds: dict[str, float] = {}
+
+    @classmethod
+    def from_settings(cls, settings) -> "ProviderPools":
+        return cls(
+            max_connections=settings.PROVIDER_POOL_MAX_CONNECTIONS,
+            max_keepalive=settings.PROVIDER_POOL_MAX_KEEPALIVE,
+            keepalive=settings.PROVIDER_KEEPALIVE_SECONDS,
+            connect_timeout=settings.PROVIDER_CONNECT_TIMEOUT,
+            grpc_keepalive=settings.VERTEX_GRPC_KEEPALIVE_SECONDS,
+            refresh_margin=settings.GOOGLE_CREDENTIALS_REFRESH_MARGIN_SECONDS,
+            endpoint_timeouts=settings.PROVIDER_TIMEOUTS,
+            openai_base_url=settings.OPENAI_BASE_URL,
+            vertex_location=settings.GOOGLE_LOCATION,
+        )
+
+    def _check_pid(self):
+        """Forget pools, channels and tokens inherited from a parent process."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._openai_client = None
+            self._vertex = None
+            self._credentials = None
+            self._credentials_loaded = False
+            self._refresher = None
+
+    # ==========================================
+    # TIMEOUTS
+    # ==========================================
+    def timeout(self, seconds: float) -> httpx.Timeout:
+        """A per-request httpx timeout: `seconds` to read, connect_timeout to connect."""
+        return httpx.Timeout(seconds, connect=self.connect_timeout)
+
+    def timeout_for(self, endpoint: str) -> float | None:
+        """Ceiling on one provider call for `endpoint`, retries included (None: the client's own)."""
+        return self.endpoint_timeouts.get(endpoint)
+
+    # ==========================================
+    # OPENAI
+    # ==========================================
+    def openai_client(self) -> httpx.AsyncClient:
+        """The worker's shared httpx pool for OpenAI."""
+        self._check_pid()
+        if self._openai_client is None:
+            self._openai_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=self.keepalive,
+                ),
+                timeout=self.timeout(60),
+                follow_redirects=True,
+            )
+        return self._openai_client
+
+    async def _warm_openai(self, api_key: str, connections: int):
+        # Any answer (even 401) means TCP + TLS are done and the connection is pooled
+        client = self.openai_client()
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        await asyncio.gather(*(
+            client.get(f"{self.openai_base_url}/models", headers=headers) for _ in range(max(1, connections))
+        ))
+
+    # ==========================================
+    # VERTEX AI
+    # ==========================================
+    def google_credentials(self):
+        """Application default credentials with the Vertex scope, loaded once per worker (None if there are none)."""
+        self._check_pid()
+        if not self._credentials_loaded:
+            self._credentials_loaded = True
+            try:
+                import google.auth
+                from google.auth.exceptions import DefaultCredentialsError
+            except ImportError:
+                return None
+            try:
+                self._credentials, _ = google.auth.default(scopes=VERTEX_SCOPES)
+            except DefaultCredentialsError as e:
+                print(f"[WARN] No Google credentials for Vertex AI: {e}")
+                return None
+            if hasattr(self._credentials, "with_non_blocking_refresh"):
+                # A token close to expiry is refreshed in the background, not inline
+                self._credentials.with_non_blocking_refresh()
+        return self._credentials
+
+    def vertex_client(self):
+        """
+        The worker's Vertex prediction client on a keepalive gRPC channel, for
+        the running event loop (gRPC aio channels belong to one loop). None
+        outside a loop or without credentials: the SDK then builds its own.
+        """
+        self._check_pid()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        if self._vertex is None or self._vertex[0] is not loop:
+            credentials = self.google_credentials()
+            if credentials is None:
+                return None
+            self._vertex = (loop, self._build_vertex_client(credentials))
+        return self._vertex[1]
+
+    def _build_vertex_client(self, credentials):
+        from google.cloud.aiplatform_v1beta1.services.prediction_service import PredictionServiceAsyncClient
+        from google.cloud.aiplatform_v1beta1.services.prediction_service.transports import (
+            PredictionServiceGrpcAsyncIOTransport as Transport,
+        )
+        keepalive = [
+            ("grpc.keepalive_time_ms", int(self.grpc_keepalive * 1000)),
+            ("grpc.keepalive_timeout_ms", 20_000),
+            ("grpc.keepalive_permit_without_calls", 1),
+            ("grpc.http2.max_pings_without_data", 0),
+        ]
+
+        def channel(host, options=(), **kwargs):
+            return Transport.create_channel(host, options=[*options, *keepalive], **kwargs)
+
+        transport = Transport(host=self.vertex_host, credentials=credentials, channel=channel)
+        return PredictionServiceAsyncClient(transport=transport)
+
+    async def _warm_vertex(self, timeout: float):
+        await self.refresh_credentials()
+        client = self.vertex_client()
+        if client is not None:
+            await asyncio.wait_for(client.transport.grpc_channel.channel_ready(), timeout)
+
+    # ==========================================
+    # CREDENTIAL REFRESH
+    # ==========================================
+    def _refresh_delay(self) -> float | None:
+        """Seconds until the token should be refreshed (0: now, None: it never expires)."""
+        credentials = self._credentials
+        if credentials is None or not credentials.token:
+            return 0.0
+        if credentials.expiry is None:
+            return None
+        # google-auth keeps expiry as naive UTC
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return max(0.0, (credentials.expiry - now).total_seconds() - self.refresh_margin)
+
+    def _refresh(self):
+        from google.auth.transport.requests import Request
+        self._credentials.refresh(Request())
+
+    async def refresh_credentials(self) -> bool:
+        """Refresh the Google token if it is missing or within refresh_margin of expiry."""
+        if await asyncio.to_thread(self.google_credentials) is None:
+            return False
+        if self._refresh_delay() != 0:
+            return True
+        try:
+            await asyncio.to_thread(self._refresh)
+        except Exception as e:
+            self.refresh_failures += 1
+            print(f"[WARN] Google credential refresh failed: {e}")
+            return False
+        self.refreshes += 1
+        return True
+
+    async def _keep_fresh(self):
+        while True:
+            if not await self.refresh_credentials():
+                if self._credentials is None:
+                    return
+                await asyncio.sleep(CREDENTIAL_RETRY_SECONDS)
+                continue
+            delay = self._refresh_delay()
+            if delay is None:
+                return
+            await asyncio.sleep(max(delay, MIN_REFRESH_INTERVAL))
+
+    def start_refresh(self):
+        """Keep the Google token fresh in the background (call from the worker's event loop)."""
+        self._check_pid()
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._keep_fresh())
+
+    # ==========================================
+    # LIFECYCLE
+    # ==========================================
+    async def warmup(self, openai_api_key: str | None, vertex: bool, connections: int = 2, timeout: float = 10.0):
+        """Open provider connections (and fetch a Google token) before the first request."""
+        async def warm(provider: str, coro):
+            started = time.monotonic()
+            try:
+                await coro
+            except Exception as e:
+                print(f"[WARN] {provider} warmup failed: {type(e).__name__}: {e}")
+                return
+            self.warmup_seconds[provider] = round(time.monotonic() - started, 3)
+
+        jobs = []
+        if openai_api_key:
+            jobs.append(warm("openai", asyncio.wait_for(self._warm_openai(openai_api_key, connections), timeout)))
+        if vertex:
+            jobs.append(warm("gemini", self._warm_vertex(timeout)))
+        await asyncio.gather(*jobs)
+        if self.warmup_seconds:
+            print(f"[INFO] Provider warmup: {self.warmup_seconds}")
+
+    async def close(self):
+        if self._pid != os.getpid():
+            return
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        if self._openai_client is not None:
+            await self._openai_client.aclose()
+            self._openai_client = None
+        if self._vertex is not None:
+            await self._vertex[1].transport.close()
+            self._vertex = None
+
+    def stats(self) -> dict:
+        return {
+            "keepalive_seconds": self.keepalive,
+            "max_connections": self.max_connections,
+            "credential_refreshes": self.refreshes,
+            "credential_refresh_failures": self.refresh_failures,
+            "warmup_seconds": self.warmup_seconds,
+        }
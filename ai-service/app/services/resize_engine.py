@@ -0,0 +1,199 @@
+"""
+Geometric proportional resize for absolutely positioned designs.
+
+Scales the whole design uniformly to fit the target canvas and letterboxes
+it, except that elements hugging a canvas edge stay anchored to that edge
+and full-canvas backgrounds are stretched to cover the new canvas. Uniform
+scaling keeps every image and element aspect ratio intact.
+"""
+import re
+
+from app.services.html_tree import Node, find_container, parse_html, parse_length
+
+# Element within this fraction of a canvas edge is anchored to it
+EDGE_FRACTION = 0.1
+# Element covering at least this fraction of the canvas is a background
+BACKGROUND_FRACTION = 0.95
+
+SCALED_PROPS = {
+    "width", "height", "min-width", "min-height", "max-width", "max-height",
+    "left", "top", "right", "bottom",
+    "font-size", "line-height", "letter-spacing", "word-spacing", "text-indent",
+    "border", "border-top", "border-right", "border-bottom", "border-left",
+    "border-width", "border-radius", "outline", "outline-offset",
+    "padding", "padding-top", "padding-right", "padding-bottom", "padding-left",
+    "margin", "margin-top", "margin-right", "margin-bottom", "margin-left",
+    "gap", "row-gap", "column-gap",
+    "box-shadow", "text-shadow", "filter", "backdrop-filter", "transform",
+    "-webkit-text-stroke", "background-size", "background-position",
+}
+
+# Sizes whose aspect ratios differ by less than this share one layout
+ASPECT_TOLERANCE = 0.005
+
+_PX_RE = re.compile(r"(-?\d*\.?\d+)px")
+
+
+class ResizeError(ValueError):
+    """The HTML isn't a stage we can resize geometrically."""
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.2f}".rstrip("0").rstrip(".") or "0"
+
+
+def scale_px(value: str, factor: float) -> str:
+    return _PX_RE.sub(lambda m: f"{_fmt(float(m.group(1)) * factor)}px", value)
+
+
+def _scale_node(node: Node, factor: float, skip: tuple = ()):
+    style = node.style
+    for prop, value in style.items():
+        if prop in SCALED_PROPS and prop not in skip:
+            style[prop] = scale_px(value, factor)
+    node.set_style(style)
+    for attr in ("width", "height"):
+        if node.tag == "img" and node.attrs.get(attr, "").isdigit() and attr not in skip:
+            node.attrs[attr] = _fmt(int(node.attrs[attr]) * factor)
+    for child in node.elements:
+        _scale_node(child, factor)
+
+
+def _axis(start: float | None, end: float | None, size: float | None, source: float,
+          factor: float, offset: float) -> tuple[str, float]:
+    """
+    Decide how one axis is placed. Returns ("start"|"end", px) in target
+    coordinates for the property that should carry the position.
+    """
+    if start is None:
+        # Only the far edge is known
+        return "end", end * factor
+
+    near_start = start <= source * EDGE_FRACTION
+    near_end = size is not None and start + size >= source * (1 - EDGE_FRACTION)
+    if near_start and not near_end:
+        return "start", start * factor
+    if near_end and not near_start:
+        return "end", (source - start - size) * factor
+    # Mid-canvas (or spanning) elements follow the letterboxed design
+    return "start", offset + start * factor
+
+
+def _place(node: Node, source_w: float, source_h: float, factor: float, offset_x: float, offset_y: float):
+    style = node.style
+    width = parse_length(style.get("width"), source_w)
+    height = parse_length(style.get("height"), source_h)
+    if node.tag == "img":
+        width = width if width is not None else parse_length(node.attrs.get("width"))
+        height = height if height is not None else parse_length(node.attrs.get("height"))
+
+    for start_prop, end_prop, size, source, offset in (
+        ("left", "right", width, source_w, offset_x),
+        ("top", "bottom", height, source_h, offset_y),
+    ):
+        start_raw, end_raw = style.get(start_prop), style.get(end_prop)
+        # Percentages already follow the container
+        if (start_raw or "").strip().endswith("%") or (start_raw is None and (end_raw or "").strip().endswith("%")):
+            continue
+        start = parse_length(start_raw, source)
+        end = parse_length(end_raw, source)
+        if start is None and end is None:
+            continue
+        if start is None and size is not None:
+            start = source - end - size
+
+        side, position = _axis(start, end, size, source, factor, offset)
+        if side == "start":
+            style[start_prop] = f"{_fmt(position)}px"
+            style.pop(end_prop, None)
+        else:
+            style[end_prop] = f"{_fmt(position)}px"
+            style.pop(start_prop, None)
+    node.set_style(style)
+
+
+def _is_background(node: Node, source_w: float, source_h: float) -> bool:
+    style = node.style
+    width = parse_length(style.get("width"), source_w)
+    height = parse_length(style.get("height"), source_h)
+    if node.tag == "img":
+        width = width if width is not None else parse_length(node.attrs.get("width"))
+        height = height if height is not None else parse_length(node.attrs.get("height"))
+    left = parse_length(style.get("left"), source_w) or 0.0
+    top = parse_length(style.get("top"), source_h) or 0.0
+    if width is None or height is None or style.get("transform"):
+        return False
+    return (
+        abs(left) <= source_w * (1 - BACKGROUND_FRACTION)
+        and abs(top) <= source_h * (1 - BACKGROUND_FRACTION)
+        and width >= source_w * BACKGROUND_FRACTION
+        and height >= source_h * BACKGROUND_FRACTION
+    )
+
+
+def _cover(node: Node, target_w: float, target_h: float):
+    style = node.style
+    for prop in ("right", "bottom"):
+        style.pop(prop, None)
+    style.update({"left": "0px", "top": "0px", "width": f"{_fmt(target_w)}px", "height": f"{_fmt(target_h)}px"})
+    if node.tag == "img":
+        node.attrs.pop("width", None)
+        node.attrs.pop("height", None)
+        style["object-fit"] = "cover"
+    if "url(" in style.get("background", "") + style.get("background-image", ""):
+        style["background-size"] = "cover"
+        style["background-position"] = "center"
+    node.set_style(style)
+
+
+def proportional_resize(html_content: str, target_width: int, target_height: int) -> str:
+    """Rescale our absolutely positioned stage HTML to target_width x target_height."""
+    root = parse_html(html_content)
+    container = find_container(root)
+    if container is None:
+        raise ResizeError("no container element")
+
+    style = container.style
+    source_w = parse_length(style.get("width"))
+    source_h = parse_length(style.get("height"))
+    if not source_w or not source_h:
+        raise ResizeError("container has no px width/height")
+
+    factor = min(target_width / source_w, target_height / source_h)
+    offset_x = (target_width - source_w * factor) / 2
+    offset_y = (target_height - source_h * factor) / 2
+
+    for child in container.elements:
+        if _is_background(child, source_w, source_h):
+            _scale_node(child, factor, skip=("left", "top", "width", "height"))
+            _cover(child, target_width, target_height)
+            continue
+        _place(child, source_w, source_h, factor, offset_x, offset_y)
+        _scale_node(child, factor, skip=("left", "top", "right", "bottom"))
+
+    style.update({"width": f"{target_width}px", "height": f"{target_height}px"})
+    if "url(" in style.get("background", "") + style.get("background-image", ""):
+        style["background-size"] = "cover"
+        style["background-position"] = "center"
+    style.setdefault("overflow", "hidden")
+    container.set_style(style)
+    return root.to_html()
+
+
+def aspect_groups(sizes: list[tuple[int, int]]) -> list[list[tuple[int, int]]]:
+    """
+    Group (width, height) pairs by aspect ratio, dropping exact duplicates.
+    Each group lists its largest size first: that one is generated and the
+    rest are scaled from it.
+    """
+    groups = []
+    for size in dict.fromkeys(sizes):
+        ratio = size[0] / size[1]
+        for group in groups:
+            base = group[0][0] / group[0][1]
+            if abs(ratio - base) / base <= ASPECT_TOLERANCE:
+                group.append(size)
+                break
+        else:
+            groups.append([size])
+    return [sorted(group, key=lambda s: s[0] * s[1], reverse=True) for group in groups]
@@ -0,0 +1,218 @@
+"""
+Content-addressed cache for LLM endpoint results.
+
+Keys are a SHA-256 of the canonicalized request payload plus model name and
+temperature. Two tiers: a bounded in-memory LRU and an optional SQLite file
+that survives restarts. Both evict on TTL and on total size.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def canonical_json(payload) -> str:
+    """Stable JSON for hashing: sorted keys, no whitespace, pydantic models dumped."""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_encode)
+
+
+def _encode(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    raise TypeError(f"Cannot canonicalize {type(value).__name__}")
+
+
+def payload_hash(payload) -> str:
+    return hashlib.sha256(canonical_json(payload).encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    """LRU bounded by entry count and total serialized bytes."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data = OrderedDict()  # key -> (expires_at, size, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, value, size: int, ttl: float):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.time() + ttl, size, value)
+            self.bytes += size
+            while self._data and (len(self._data) > self.max_entries or self.bytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key: str):
+        _, size, _ = self._data.pop(key)
+        self.bytes -= size
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskTier:
+    """SQLite-backed tier; least recently used rows are dropped past max_bytes."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._inherited = None
+        self._pid = None
+        self._connection()
+
+    def _connection(self) -> sqlite3.Connection:
+        """This process's connection: SQLite handles must not be used across fork()."""
+        if self._pid != os.getpid():
+            # An inherited handle is kept open: closing it could disturb the parent's WAL state
+            self._inherited = self._conn
+            self._pid = os.getpid()
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str):
+        """Returns (value, remaining_ttl) or None."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+        return json.loads(row[0]), row[1] - now
+
+    def set(self, key: str, encoded: str, ttl: float):
+        now = time.time()
+        size = len(encoded)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, size, now + ttl, now),
+            )
+            conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                # Walk oldest-first until we're back under budget
+                excess = total - self.max_bytes
+                doomed = []
+                for row_key, row_size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                    doomed.append((row_key,))
+                    excess -= row_size
+                    if excess <= 0:
+                        break
+                conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+            conn.commit()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_entries: int = 512,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 86400,
+        nondeterministic_ttl: float = 0,
+        disk_path: str | None = None,
+        disk_max_bytes: int = 512 * 1024 * 1024,
+        disabled_endpoints: set[str] | None = None,
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.nondeterministic_ttl = nondeterministic_ttl
+        self.disabled_endpoints = disabled_endpoints or set()
+        self.memory = MemoryTier(max_entries, max_bytes)
+        self.disk = DiskTier(disk_path, disk_max_bytes) if disk_path else None
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "ResponseCache":
+        return cls(
+            enabled=settings.CACHE_ENABLED,
+            max_entries=settings.CACHE_MAX_ENTRIES,
+            max_bytes=settings.CACHE_MAX_BYTES,
+            ttl=settings.CACHE_TTL_SECONDS,
+            nondeterministic_ttl=settings.CACHE_NONDETERMINISTIC_TTL_SECONDS,
+            disk_path=settings.CACHE_DISK_PATH or None,
+            disk_max_bytes=settings.CACHE_DISK_MAX_BYTES,
+            disabled_endpoints=set(settings.CACHE_DISABLED_ENDPOINTS),
+        )
+
+    def enabled_for(self, endpoint: str, temperature: float) -> bool:
+        """Whether results of `endpoint` at `temperature` are cached at all (a TTL of 0 means no)."""
+        return self.enabled and endpoint not in self.disabled_endpoints and self.ttl_for(temperature) > 0
+
+    def make_key(self, endpoint: str, payload, model: str, temperature: float) -> str:
+        return payload_hash({"endpoint": endpoint, "model": model, "temperature": temperature, "payload": payload})
+
+    def ttl_for(self, temperature: float) -> float:
+        # Zero-temperature calls are (near) deterministic, so keep them longer
+        return self.ttl if temperature == 0 else self.nondeterministic_ttl
+
+    async def get(self, key: str):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            row = await asyncio.to_thread(self.disk.get, key)
+            if row is not None:
+                value, remaining = row
+                self.memory.set(key, value, len(canonical_json(value)), remaining)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value, ttl: float):
+        encoded = canonical_json(value)
+        self.memory.set(key, value, len(encoded), ttl)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, encoded, ttl)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.bytes,
+            "disk": self.disk.path if self.disk else None,
+        }
@@ -0,0 +1,144 @@
+"""
+Admission control for provider calls.
+
+Each provider gets a concurrency limit and a bounded priority queue in
+front of it. Waiters are served most urgent first (then FIFO); when the
+queue is full, or a waiter has queued longer than max_wait, the call is
+refused with Overloaded so the API can answer 429 + Retry-After instead of
+piling more load onto a rate-limited provider.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Lower runs first: interactive assistant turns ahead of background conversions
+PRIORITIES = {"assistant": 0, "preview": 1, "resize": 2, "conversion": 3}
+
+# Wait samples kept per provider for the stats percentiles
+WAIT_SAMPLES = 512
+
+
+class Overloaded(Exception):
+    def __init__(self, provider: str, reason: str, retry_after: int):
+        super().__init__(f"{provider} is overloaded ({reason}), retry after {retry_after}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class ProviderLimiter:
+    def __init__(self, name: str, concurrency: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self._queue = []  # (priority, seq, future)
+        self._seq = itertools.count()
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._service_time = 5.0  # EWMA of slot hold time, seeds Retry-After
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self._queue if not future.done())
+
+    def retry_after(self) -> int:
+        """Rough time until a queue position frees up."""
+        backlog = self.queued + self.active
+        return max(1, math.ceil(self._service_time * backlog / max(self.concurrency, 1)))
+
+    async def acquire(self, priority: int):
+        if self.active < self.concurrency and not self.queued:
+            self.active += 1
+            self.admitted += 1
+            self._waits.append(0.0)
+            return
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.name, "queue full", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self.timed_out += 1
+                raise Overloaded(self.name, "queue wait timed out", self.retry_after())
+        except asyncio.CancelledError:
+            # Granted in the same tick we were cancelled: hand the slot on
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+            raise
+        self.admitted += 1
+        self._waits.append(time.monotonic() - started)
+
+    def release(self, held_for: float | None = None):
+        if held_for is not None:
+            self._service_time = 0.8 * self._service_time + 0.2 * held_for
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                # Slot passes straight to the waiter; active stays the same
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+
+        def percentile(p):
+            return round(waits[min(int(len(waits) * p), len(waits) - 1)], 3) if waits else 0.0
+
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_p50_seconds": percentile(0.5),
+            "wait_p95_seconds": percentile(0.95),
+            "retry_after_seconds": self.retry_after(),
+        }
+
+
+class Scheduler:
+    def __init__(self, limiters: dict[str, ProviderLimiter]):
+        self.limiters = limiters
+
+    @classmethod
+    def from_settings(cls, settings) -> "Scheduler":
+        return cls({
+            "openai": ProviderLimiter(
+                "openai", settings.OPENAI_MAX_CONCURRENCY, settings.OPENAI_MAX_QUEUE, settings.SCHEDULER_MAX_WAIT_SECONDS
+            ),
+            "gemini": ProviderLimiter(
+                "gemini", settings.GEMINI_MAX_CONCURRENCY, settings.GEMINI_MAX_QUEUE, settings.SCHEDULER_MAX_WAIT_SECONDS
+            ),
+        })
+
+    @asynccontextmanager
+    async def slot(self, provider: str, endpoint: str):
+        """Hold one of `provider`'s call slots, queueing at `endpoint`'s priority."""
+        limiter = self.limiters[provider]
+        await limiter.acquire(PRIORITIES.get(endpoint, len(PRIORITIES)))
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            limiter.release(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
@@ -0,0 +1,37 @@
+"""
+Server-Sent Events helpers for the streaming endpoint variants.
+
+Gemini's JSON mode streams the structured output token by token; the
+JsonOutputParser turns that into growing partial dicts. PartialFieldTracker
+turns those into text deltas and "field finished" notifications.
+"""
+import json
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class PartialFieldTracker:
+    """
+    Follows a streamed JSON object. Keys arrive in generation order, so a
+    field is complete as soon as a later key has started.
+    """
+
+    def __init__(self):
+        self.done = set()
+        self.sent = {}
+
+    def completed(self, partial: dict) -> list[str]:
+        keys = list(partial)
+        finished = [key for key in keys[:-1] if key not in self.done]
+        self.done.update(finished)
+        return finished
+
+    def delta(self, partial: dict, field: str) -> str:
+        value = partial.get(field)
+        if not isinstance(value, str):
+            return ""
+        start = self.sent.get(field, 0)
+        self.sent[field] = len(value)
+        return value[start:]
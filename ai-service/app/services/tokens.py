@@ -0,0 +1,21 @@
+"""
+Cheap token estimates for prompt budgeting.
+
+Providers tokenize differently (and Gemini has no local tokenizer), so we
+budget on a characters-per-token heuristic rather than pull in a tokenizer.
+"""
+import math
+
+CHARS_PER_TOKEN = 4
+# Role markers and separators each chat message costs on top of its text
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str | None) -> int:
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def message_tokens(text: str | None) -> int:
+    return estimate_tokens(text) + MESSAGE_OVERHEAD
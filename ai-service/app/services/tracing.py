@@ -0,0 +1,136 @@
+"""
+Per-request stage timings.
+
+A sampled request gets a Trace in a context variable; span()/traced() add
+the time spent in each stage (prompt building, queueing for a provider slot,
+the provider call, structured-output parsing, HTML cleanup, ...). The HTTP
+middleware returns them in a Server-Timing header and, if enabled, as a
+JSON log line. Unsampled requests only pay a context variable lookup.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import random
+import time
+from contextlib import contextmanager
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+_current: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: list[tuple[str, float]] = []
+
+    def add(self, stage: str, seconds: float):
+        self.spans.append((stage, seconds))
+
+    def totals(self) -> dict[str, tuple[float, int]]:
+        """stage -> (seconds, count), in first-seen order."""
+        totals = {}
+        for stage, seconds in self.spans:
+            total, count = totals.get(stage, (0.0, 0))
+            totals[stage] = (total + seconds, count + 1)
+        return totals
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        parts = []
+        for stage, (seconds, count) in self.totals().items():
+            desc = f';desc="{count} calls"' if count > 1 else ""
+            parts.append(f"{stage};dur={seconds * 1000:.1f}{desc}")
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def record(self) -> dict:
+        return {
+            "trace": self.name,
+            "total_ms": round(self.elapsed() * 1000, 1),
+            "stages": {
+                stage: {"ms": round(seconds * 1000, 1), "count": count}
+                for stage, (seconds, count) in self.totals().items()
+            },
+        }
+
+
+def sampled(rate: float, forced: bool = False) -> bool:
+    return forced or (rate > 0 and random.random() < rate)
+
+
+def start(name: str) -> tuple[Trace, contextvars.Token]:
+    trace = Trace(name)
+    return trace, _current.set(trace)
+
+
+def finish(token: contextvars.Token):
+    _current.reset(token)
+
+
+def active() -> bool:
+    return _current.get() is not None
+
+
+def add(stage: str, seconds: float):
+    trace = _current.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(stage, time.perf_counter() - started)
+
+
+def traced(stage: str):
+    """Decorator form of span() for sync and async functions."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def log_line(trace: Trace) -> str:
+    return "[TRACE] " + json.dumps(trace.record())
+
+
+class ProviderTimer(AsyncCallbackHandler):
+    """Time inside the model call itself, so the rest of a chain run can be attributed to parsing."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._started = None
+
+    async def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._started = time.perf_counter()
+
+    async def on_llm_start(self, serialized, prompts, **kwargs):
+        self._started = time.perf_counter()
+
+    async def on_llm_end(self, response, **kwargs):
+        if self._started is not None:
+            self.seconds += time.perf_counter() - self._started
+            self._started = None
@@ -0,0 +1,68 @@
+"""
+Prompt size of canvas JSON, raw versus compacted.
+
+    python benchmarks/canvas_json.py [--iterations 200]
+
+Turns the load-test corpora into what Fabric 6 toObject() actually sends
+(every property, defaults included, unrounded floats, scale not applied) and
+compares json.dumps(indent=2) with app.services.fabric_compact: characters,
+estimated tokens and the time spent compacting.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.services.fabric_compact import (
+    OBJECT_DEFAULTS, TEXT_DEFAULTS, TEXT_TYPES, TYPE_DEFAULTS, compact_objects_json
+)
+from app.services.tokens import estimate_tokens
+from benchmarks.loadtest import CORPUS_SIZES, build_corpus
+
+
+def fabric_export(obj: dict, rng: random.Random) -> dict:
+    """obj as toObject() writes it: all defaults present, 15-digit floats, scale kept separate."""
+    kind = obj["type"]
+    scale = rng.uniform(0.4, 1.6)
+    exported = {"type": kind, "version": "6.0.2", **OBJECT_DEFAULTS,
+                **(TEXT_DEFAULTS if kind in TEXT_TYPES else TYPE_DEFAULTS.get(kind, {})), **obj}
+    for key in ("width", "height", "radius", "fontSize"):
+        if key in exported:
+            exported[key] = exported[key] / scale
+    exported["scaleX"] = exported["scaleY"] = scale
+    exported["left"] += rng.random()
+    exported["top"] += rng.random()
+    if kind in TEXT_TYPES:
+        exported["styles"] = []
+    return exported
+
+
+def main(iterations: int):
+    rng = random.Random(0)
+    print(f"{'corpus':<8} {'objects':>7} {'raw chars':>10} {'compact':>9} {'raw tok':>8} {'compact tok':>11} "
+          f"{'ratio':>6} {'compact µs':>10}")
+    for size in CORPUS_SIZES:
+        objects = [fabric_export(obj, rng) for obj in build_corpus(size)["canvas"]["objects"]]
+        raw = json.dumps(objects, indent=2)
+        compact = compact_objects_json(objects)
+
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            compact_objects_json(objects)
+            samples.append(time.perf_counter() - start)
+
+        print(f"{size:<8} {len(objects):>7} {len(raw):>10} {len(compact.json):>9} {estimate_tokens(raw):>8} "
+              f"{compact.tokens_after:>11} {len(raw) / len(compact.json):>5.1f}x {statistics.median(samples) * 1e6:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200, help="compactions timed per corpus")
+    main(parser.parse_args().iterations)
@@ -0,0 +1,124 @@
+"""
+Cold-request latency of OpenAI calls against a local stand-in server.
+
+    python benchmarks/cold_request.py [--handshake 0.15] [--latency 0.05] [--idle 8] [--rounds 3]
+
+The stand-in speaks just enough of the OpenAI API for ChatOpenAI and charges
+--handshake seconds on every new connection (what TCP + TLS cost against
+the real endpoint) plus --latency per request. Three client setups make the
+same calls:
+
+- sdk default: ChatOpenAI with its own pool (idle connections dropped after 5 s)
+- shared pool: the client LLMService builds on ProviderPools
+- pool + warmup: the same, after ProviderPools.warmup()
+
+For each: the first request, a request right after it (warm), and one after
+--idle seconds with nothing in flight. Connections opened are counted
+server-side. Everything runs offline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+COMPLETION = {
+    "id": "chatcmpl-standin", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "{}"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+MODELS = {"object": "list", "data": [{"id": "gpt-4o", "object": "model", "created": 0, "owned_by": "standin"}]}
+
+
+class StandIn:
+    """Keep-alive HTTP/1.1 server answering /v1/models and /v1/chat/completions."""
+
+    def __init__(self, handshake: float, latency: float):
+        self.handshake = handshake
+        self.latency = latency
+        self.connections = 0
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(self.handshake)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *lines = head.decode("latin-1").split("\r\n")
+                headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in lines if line)}
+                await reader.readexactly(int(headers.get("content-length", 0)))
+                await asyncio.sleep(self.latency)
+                body = json.dumps(MODELS if " /v1/models" in request_line else COMPLETION).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+                             b"content-length: %d\r\n\r\n%s" % (len(body), body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def measure(name: str, llm, standin: StandIn, idle: float, rounds: int, warmup=None):
+    opened = standin.connections
+    if warmup:
+        await warmup()
+    timings = {"first": [], "warm": [], f"after {idle:g}s idle": []}
+    for round_ in range(rounds):
+        for label in (("first", "warm") if round_ == 0 else ()) + (f"after {idle:g}s idle",):
+            if label.startswith("after"):
+                await asyncio.sleep(idle)
+            start = time.perf_counter()
+            await llm.ainvoke("ping")
+            timings[label].append(time.perf_counter() - start)
+    cells = "  ".join(f"{statistics.median(samples) * 1000:>9.1f} ms" for samples in timings.values())
+    print(f"{name:<14} {cells}  {standin.connections - opened:>6}")
+
+
+async def main(handshake: float, latency: float, idle: float, rounds: int):
+    standin = StandIn(handshake, latency)
+    port = await standin.start()
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-benchmark", "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        "GOOGLE_CLOUD_PROJECT": "", "CACHE_ENABLED": "false",
+    })
+    from langchain_openai import ChatOpenAI
+    from app.config import settings
+    from app.services.llm_service import LLMService
+
+    print(f"stand-in: {handshake * 1000:.0f} ms per new connection, {latency * 1000:.0f} ms per request")
+    print(f"{'client':<14} {'first':>12}  {'warm':>12}  {f'after {idle:g}s idle':>12}  {'conns':>6}")
+
+    default = ChatOpenAI(model=settings.OPENAI_MODEL, api_key=settings.OPENAI_API_KEY,
+                         base_url=settings.OPENAI_BASE_URL, max_retries=1, request_timeout=30)
+    await measure("sdk default", default, standin, idle, rounds)
+    await default.root_async_client.close()
+
+    service = LLMService()
+    await measure("shared pool", service.openai, standin, idle, rounds)
+    await service.close()
+
+    service = LLMService()
+    await measure("pool + warmup", service.openai, standin, idle, rounds, warmup=lambda: service.pools.warmup(
+        settings.OPENAI_API_KEY, vertex=False, connections=settings.PROVIDER_WARMUP_CONNECTIONS))
+    await service.close()
+    standin.server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handshake", type=float, default=0.15, help="seconds charged per new connection")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--idle", type=float, default=8.0, help="idle gap before the cold request")
+    parser.add_argument("--rounds", type=int, default=3, help="idle/request rounds per client")
+    args = parser.parse_args()
+    asyncio.run(main(args.handshake, args.latency, args.idle, args.rounds))
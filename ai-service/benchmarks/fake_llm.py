@@ -0,0 +1,314 @@
+"""
+Local stand-ins for ChatOpenAI / ChatVertexAI, for load tests.
+
+FakeLLM answers every chain LLMService builds (structured output, JSON-mode
+streaming and the raw JSON conversion call) after a sampled latency, with
+canned outputs derived from the prompt so the rest of the pipeline does real
+work on them. RecordingLLM wraps a real client and appends each response to a
+JSONL file; FakeLLM can replay those recordings (and their latencies) offline.
+
+    service.openai = FakeLLM("openai", LatencyModel.parse("lognormal:1.5,0.4"))
+    service.gemini = FakeLLM("gemini", LatencyModel.parse("replay"), Recordings.load("rec.jsonl"))
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable
+
+# Characters per streamed chunk, roughly what a provider sends per SSE event
+STREAM_CHUNK_CHARS = 64
+
+CONTAINER_RE = re.compile(r"<div[^>]*position:\s*relative.*</div>", re.S)
+TARGET_RE = re.compile(r"TARGET SIZE:\s*(\d+)\s*x\s*(\d+)")
+CONTAINER_SIZE_RE = re.compile(r"width:\s*[\d.]+px;\s*height:\s*[\d.]+px")
+INDEX_RE = re.compile(r'"index":\s*(\d+)')
+EID_RE = re.compile(r'data-eid="(e\d+)"')
+
+
+class LatencyModel:
+    """
+    Sampled response time. Specs:
+      fixed:SECONDS   uniform:LOW,HIGH   lognormal:MEDIAN,SIGMA   replay
+    "replay" uses the recorded latency (0 when there is no recording).
+    """
+
+    def __init__(self, kind: str = "fixed", params: tuple = (0.0,), seed: int | None = None):
+        self.kind = kind
+        self.params = params
+        self._random = random.Random(seed)
+
+    @classmethod
+    def parse(cls, spec: str, seed: int | None = None) -> "LatencyModel":
+        kind, _, args = spec.partition(":")
+        params = tuple(float(a) for a in args.split(",") if a)
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "replay": 0}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f"bad latency spec {spec!r}")
+        return cls(kind, params, seed)
+
+    def sample(self, recorded: float | None = None) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self._random.uniform(*self.params)
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return self._random.lognormvariate(math.log(median), sigma)
+        return recorded or 0.0
+
+
+def prompt_text(value) -> str:
+    """Flatten whatever a chain hands the model (prompt value, messages, dict) to text."""
+    if hasattr(value, "to_string"):
+        return value.to_string()
+    if isinstance(value, list):
+        parts = []
+        for message in value:
+            content = getattr(message, "content", message)
+            if isinstance(content, list):
+                content = " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+            parts.append(str(content))
+        return "\n".join(parts)
+    return str(value)
+
+
+def prompt_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def schema_name(schema) -> str:
+    if schema is None:
+        return "raw"
+    if isinstance(schema, dict):
+        return schema.get("title", "dict")
+    return schema.__name__
+
+
+# ============ CANNED OUTPUTS ============
+
+def _design(text: str) -> str:
+    """The (last) design container quoted in the prompt, or a blank stage."""
+    matches = CONTAINER_RE.findall(text)
+    return matches[-1] if matches else '<div style="position:relative;width:800px;height:600px;background:#ffffff;"></div>'
+
+
+def _resized(text: str) -> str:
+    html = _design(text)
+    target = TARGET_RE.search(text)
+    if target:
+        width, height = target.groups()
+        html = CONTAINER_SIZE_RE.sub(f"width:{width}px;height:{height}px", html, count=1)
+    return html
+
+
+def canned_output(name: str, text: str) -> dict:
+    """A plausible answer for output schema `name`, built from the prompt."""
+    if name == "HTMLOutput":
+        indices = INDEX_RE.findall(text) if "data-fabric-index" in text else []
+        if indices:
+            html = "".join(
+                f'<div data-fabric-index="{i}" style="position:absolute;left:0px;top:0px;width:40px;height:40px;'
+                f'background:#888888;"></div>'
+                for i in indices
+            )
+            return {"html": html, "explanation": None}
+        return {"html": _design(text), "explanation": "Updated the design."}
+    if name == "ResizeOutput":
+        html = _resized(text)
+        return {"variation_1_html": html, "variation_2_html": html}
+    if name == "CreativeResizeOutput":
+        return {"variation_2_html": _resized(text)}
+    if name == "PatchOutput":
+        ids = EID_RE.findall(text)
+        operations = [{"op": "update", "id": ids[-1], "style": {"opacity": "0.9"}}] if ids else []
+        return {"operations": operations, "explanation": "Adjusted the element."}
+    # Raw JSON answer (HTML -> Fabric conversion)
+    return {
+        "version": "6.0.2",
+        "background": "#ffffff",
+        "objects": [{
+            "type": "textbox", "left": 40, "top": 40, "width": 300, "text": "Fake conversion",
+            "fontSize": 24, "fontFamily": "Arial", "fill": "#111111",
+        }],
+    }
+
+
+# ============ RECORD / REPLAY ============
+
+class Recordings:
+    """Recorded responses, looked up by exact prompt and then round-robin per output schema."""
+
+    def __init__(self, entries: list[dict] | None = None):
+        self._by_key = {}
+        self._by_schema = defaultdict(list)
+        self._next = defaultdict(int)
+        for entry in entries or []:
+            self._by_key[(entry["provider"], entry["key"])] = entry
+            self._by_schema[(entry["provider"], entry["schema"])].append(entry)
+
+    @classmethod
+    def load(cls, path: str) -> "Recordings":
+        with open(path, encoding="utf-8") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def find(self, provider: str, schema: str, key: str) -> dict | None:
+        entry = self._by_key.get((provider, key))
+        if entry is not None:
+            return entry
+        candidates = self._by_schema.get((provider, schema))
+        if not candidates:
+            return None
+        position = self._next[(provider, schema)]
+        self._next[(provider, schema)] = position + 1
+        return candidates[position % len(candidates)]
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+
+class Recorder:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _jsonable(output):
+    if hasattr(output, "model_dump"):
+        return output.model_dump()
+    if isinstance(output, AIMessage):
+        return {"content": output.content}
+    return output
+
+
+def _restore(schema, output):
+    """Turn a recorded/canned dict back into what the real model runnable returns."""
+    if schema is None:
+        content = output.get("content") if isinstance(output, dict) and set(output) == {"content"} else None
+        return AIMessage(content=content if content is not None else json.dumps(output))
+    if isinstance(schema, dict):
+        return output
+    return schema.model_validate(output)
+
+
+# ============ RUNNABLES ============
+
+class _FakeRunnable(Runnable):
+    def __init__(self, llm: "FakeLLM", schema):
+        self.llm = llm
+        self.schema = schema
+        self.name = schema_name(schema)
+
+    def _answer(self, value) -> tuple[dict, float]:
+        text = prompt_text(value)
+        entry = self.llm.recordings.find(self.llm.provider, self.name, prompt_key(text)) if self.llm.recordings else None
+        if entry is not None:
+            return entry["output"], self.llm.latency.sample(entry.get("latency"))
+        return canned_output(self.name, text), self.llm.latency.sample()
+
+    def invoke(self, value, config=None, **kwargs):
+        output, delay = self._answer(value)
+        time.sleep(delay)
+        self.llm.calls += 1
+        return _restore(self.schema, output)
+
+    async def ainvoke(self, value, config=None, **kwargs):
+        output, delay = self._answer(value)
+        await asyncio.sleep(delay)
+        self.llm.calls += 1
+        return _restore(self.schema, output)
+
+    async def astream(self, value, config=None, **kwargs):
+        """JSON-mode streaming: growing partial dicts, the latency spread over the chunks."""
+        output, delay = self._answer(value)
+        fields = [(k, v) for k, v in output.items() if isinstance(v, str)]
+        steps = [(k, v[:end]) for k, v in fields for end in range(STREAM_CHUNK_CHARS, len(v) + STREAM_CHUNK_CHARS, STREAM_CHUNK_CHARS)]
+        # First chunk pays a third of the latency (time to first token)
+        await asyncio.sleep(delay / 3)
+        partial = {}
+        for key, text in steps:
+            await asyncio.sleep(delay * 2 / 3 / max(len(steps), 1))
+            partial[key] = text
+            yield dict(partial)
+        self.llm.calls += 1
+        yield _restore(self.schema, output)
+
+
+class FakeLLM:
+    """Duck-types the chat model methods LLMService uses to build its chains."""
+
+    def __init__(self, provider: str, latency: LatencyModel | None = None, recordings: Recordings | None = None):
+        self.provider = provider
+        self.latency = latency or LatencyModel()
+        self.recordings = recordings
+        self.calls = 0
+
+    def with_structured_output(self, schema, **kwargs) -> Runnable:
+        return _FakeRunnable(self, schema)
+
+    def bind(self, **kwargs) -> Runnable:
+        return _FakeRunnable(self, None)
+
+
+class _RecordingRunnable(Runnable):
+    def __init__(self, inner: Runnable, provider: str, schema, recorder: Recorder):
+        self.inner = inner
+        self.provider = provider
+        self.schema = schema_name(schema)
+        self.recorder = recorder
+
+    def _record(self, value, output, started: float):
+        self.recorder.write({
+            "provider": self.provider,
+            "schema": self.schema,
+            "key": prompt_key(prompt_text(value)),
+            "latency": round(time.monotonic() - started, 4),
+            "output": _jsonable(output),
+        })
+
+    def invoke(self, value, config=None, **kwargs):
+        started = time.monotonic()
+        output = self.inner.invoke(value, config, **kwargs)
+        self._record(value, output, started)
+        return output
+
+    async def ainvoke(self, value, config=None, **kwargs):
+        started = time.monotonic()
+        output = await self.inner.ainvoke(value, config, **kwargs)
+        self._record(value, output, started)
+        return output
+
+    async def astream(self, value, config=None, **kwargs):
+        started, last = time.monotonic(), None
+        async for chunk in self.inner.astream(value, config, **kwargs):
+            last = chunk
+            yield chunk
+        if last is not None:
+            self._record(value, last, started)
+
+
+class RecordingLLM:
+    """Wraps a real chat model, appending every response to a recordings file."""
+
+    def __init__(self, inner, provider: str, recorder: Recorder):
+        self.inner = inner
+        self.provider = provider
+        self.recorder = recorder
+
+    def with_structured_output(self, schema, **kwargs) -> Runnable:
+        return _RecordingRunnable(self.inner.with_structured_output(schema, **kwargs), self.provider, schema, self.recorder)
+
+    def bind(self, **kwargs) -> Runnable:
+        return _RecordingRunnable(self.inner.bind(**kwargs), self.provider, None, self.recorder)
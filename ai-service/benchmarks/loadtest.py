@@ -0,0 +1,281 @@
+"""
+Load test of the API's own overhead, with the LLM providers replaced by local fakes.
+
+    python benchmarks/loadtest.py [--endpoints preview,resize,assistant,conversion]
+        [--sizes small,medium,large] [--concurrency 1,8,32] [--requests 100]
+        [--openai-latency lognormal:1.5,0.4] [--gemini-latency lognormal:3,0.4]
+        [--replay recordings.jsonl] [--cache]
+
+Starts the app under uvicorn in a child process with FakeLLM clients (see
+benchmarks/fake_llm.py), drives each endpoint with synthetic canvases and
+HTML of increasing size, and reports throughput, client-side latency
+percentiles, and the server's CPU time and RSS per request (from /proc, so
+Linux only). Everything runs offline.
+
+    --record recordings.jsonl   use the real providers (needs credentials and
+                                network) and append every response to the file
+    --replay recordings.jsonl   answer from the recordings; "--*-latency replay"
+                                also reuses the recorded response times
+
+Latency specs: fixed:S, uniform:LOW,HIGH, lognormal:MEDIAN,SIGMA, replay.
+The response cache is disabled unless --cache is given, and every request is
+made unique so in-flight coalescing doesn't hide the work.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+DUMMY_ENV = {"OPENAI_API_KEY": "sk-benchmark", "GOOGLE_CLOUD_PROJECT": "benchmark"}
+
+ENDPOINTS = {
+    "preview": "/api/preview/generate",
+    "resize": "/api/preview/resize",
+    "resize_stream": "/api/preview/resize/stream",
+    "assistant": "/api/ai/assistant",
+    "assistant_stream": "/api/ai/assistant/stream",
+    "conversion": "/api/conversion/html-to-fabric",
+}
+
+# Objects per canvas and chat turns sent with assistant requests
+CORPUS_SIZES = {"small": (6, 0), "medium": (40, 4), "large": (200, 12)}
+
+PALETTE = ["#1f2937", "#f97316", "#0ea5e9", "#22c55e", "#e11d48", "#facc15", "#ffffff"]
+FONTS = ["Arial", "Georgia", "Montserrat", "Roboto", "Playfair Display"]
+
+
+# ============ CORPUS ============
+
+def _fabric_object(index: int, rng: random.Random, width: int, height: int) -> dict:
+    left, top = rng.randint(0, width - 100), rng.randint(0, height - 100)
+    kind = ("rect", "textbox", "circle", "image", "textbox", "line", "rect", "path")[index % 8]
+    common = {"left": left, "top": top, "angle": rng.choice([0, 0, 0, 15]), "opacity": rng.choice([1, 1, 0.8])}
+    if kind == "rect":
+        return {"type": "rect", "width": rng.randint(40, 400), "height": rng.randint(40, 300),
+                "fill": rng.choice(PALETTE), "rx": rng.choice([0, 8, 16]), **common}
+    if kind == "circle":
+        return {"type": "circle", "radius": rng.randint(10, 120), "fill": rng.choice(PALETTE), **common}
+    if kind == "line":
+        return {"type": "line", "x1": 0, "y1": 0, "x2": rng.randint(50, 400), "y2": 0,
+                "stroke": rng.choice(PALETTE), "strokeWidth": 2, **common}
+    if kind == "image":
+        return {"type": "image", "src": f"https://assets.example.com/photo-{index}.jpg",
+                "width": 640, "height": 480, "scaleX": 0.5, "scaleY": 0.5, **common}
+    if kind == "path":
+        # Not covered by the native compiler: exercises the LLM fallback
+        return {"type": "path", "path": [["M", 0, 0], ["Q", 50, 80, 100, 0], ["Z"]],
+                "fill": rng.choice(PALETTE), **common}
+    words = " ".join(rng.choice(["Summer", "Sale", "New", "Launch", "Up to", "50%", "off", "today"]) for _ in range(6))
+    return {"type": "textbox", "text": words, "width": 360, "fontSize": rng.choice([18, 24, 36, 64]),
+            "fontFamily": rng.choice(FONTS), "fill": rng.choice(PALETTE), "fontWeight": rng.choice(["normal", "bold"]),
+            **common}
+
+
+def build_corpus(size: str, seed: int = 0) -> dict:
+    """A canvas, its compiled HTML and a chat history for corpus size `size`."""
+    from app.services.fabric_html import compile_canvas
+
+    objects, turns = CORPUS_SIZES[size]
+    rng = random.Random(f"{seed}-{size}")
+    width, height = 1080, 1080
+    canvas = {
+        "version": "6.0.2", "width": width, "height": height, "background": "#fef3c7",
+        "objects": [_fabric_object(i, rng, width, height) for i in range(objects)],
+    }
+    html = compile_canvas(canvas).render()
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"Change the colour scheme, attempt {turn}"})
+        history.append({"role": "assistant", "content": f"Updated the palette. {html}"})
+    return {"canvas": canvas, "html": html, "history": history, "width": width, "height": height}
+
+
+def request_body(endpoint: str, corpus: dict, n: int) -> dict:
+    """Request `n` for `endpoint`; `n` makes each body unique."""
+    html = f"<!-- request {n} -->{corpus['html']}"
+    if endpoint == "preview":
+        return {"canvas_data": {**corpus["canvas"], "benchmarkRequest": n}}
+    if endpoint.startswith("resize"):
+        return {"current_preview_html": html, "target_width": 1080, "target_height": 1920}
+    if endpoint.startswith("assistant"):
+        return {"current_html": corpus["html"], "user_prompt": f"Make the headline bolder (request {n})",
+                "chat_history": corpus["history"]}
+    return {"html_content": html, "canvas_width": corpus["width"], "canvas_height": corpus["height"]}
+
+
+# ============ SERVER ============
+
+def serve(args):
+    """Child process: the app with fake (or recording) provider clients."""
+    for key, value in DUMMY_ENV.items():
+        os.environ.setdefault(key, value)
+    if not args.cache:
+        os.environ["CACHE_ENABLED"] = "false"
+
+    import uvicorn
+    from app.main import app, llm_service
+    from benchmarks.fake_llm import FakeLLM, LatencyModel, Recorder, Recordings, RecordingLLM
+
+    if args.record:
+        recorder = Recorder(args.record)
+        llm_service.openai = RecordingLLM(llm_service.openai, "openai", recorder)
+        llm_service.gemini = RecordingLLM(llm_service.gemini, "gemini", recorder)
+    else:
+        recordings = Recordings.load(args.replay) if args.replay else None
+        llm_service.openai = FakeLLM("openai", LatencyModel.parse(args.openai_latency, args.seed), recordings)
+        llm_service.gemini = FakeLLM("gemini", LatencyModel.parse(args.gemini_latency, args.seed + 1), recordings)
+
+    uvicorn.run(app, host="127.0.0.1", port=args.serve, log_level="warning", access_log=False)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    command = [sys.executable, os.path.abspath(__file__), "--serve", str(port)] + sys.argv[1:]
+    log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    process = subprocess.Popen(command, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server exited with {process.returncode} (see --server-log)")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit("server did not start within 60s")
+
+
+class ProcessSample:
+    """CPU seconds and RSS of a process, read from /proc."""
+
+    TICKS = os.sysconf("SC_CLK_TCK")
+
+    def __init__(self, pid: int):
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # utime and stime are fields 14 and 15; fields[0] here is field 3
+        self.cpu = (int(fields[11]) + int(fields[12])) / self.TICKS
+        self.rss = self.peak = 0
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    self.rss = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    self.peak = int(line.split()[1]) * 1024
+
+
+# ============ LOAD ============
+
+async def run_load(client: httpx.AsyncClient, endpoint: str, corpus: dict, total: int, concurrency: int,
+                   offset: int) -> tuple[list[float], dict]:
+    latencies, statuses = [], {}
+    counter = iter(range(offset, offset + total))
+
+    async def worker():
+        for n in counter:
+            started = time.perf_counter()
+            try:
+                response = await client.post(ENDPOINTS[endpoint], json=request_body(endpoint, corpus, n))
+                status = str(response.status_code)
+                if status == "200" and endpoint in ("preview", "resize", "assistant"):
+                    status = "200" if response.json().get("success") else "fallback"
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses
+
+
+def percentile(samples: list[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+async def bench(args, pid: int, base_url: str):
+    corpora = {size: build_corpus(size, args.seed) for size in args.sizes}
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    print(f"{'endpoint':<17} {'size':<6} {'conc':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'cpu ms/req':>10} {'rss MB':>7} {'Δrss KB/req':>11}  statuses")
+    offset = 0
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        for endpoint in args.endpoints:
+            for size in args.sizes:
+                corpus = corpora[size]
+                for concurrency in args.concurrency:
+                    await run_load(client, endpoint, corpus, min(concurrency, args.requests), concurrency, offset)
+                    offset += args.requests
+                    before = ProcessSample(pid)
+                    started = time.perf_counter()
+                    latencies, statuses = await run_load(client, endpoint, corpus, args.requests, concurrency, offset)
+                    elapsed = time.perf_counter() - started
+                    after = ProcessSample(pid)
+                    offset += args.requests
+
+                    count = len(latencies)
+                    print(
+                        f"{endpoint:<17} {size:<6} {concurrency:>4} {count / elapsed:>8.1f} "
+                        f"{statistics.median(latencies) * 1000:>8.1f} {percentile(latencies, 0.95) * 1000:>8.1f} "
+                        f"{percentile(latencies, 0.99) * 1000:>8.1f} {(after.cpu - before.cpu) / count * 1000:>10.2f} "
+                        f"{after.rss / 2**20:>7.1f} {(after.rss - before.rss) / 1024 / count:>11.1f}  "
+                        + " ".join(f"{k}={v}" for k, v in sorted(statuses.items())),
+                        flush=True,
+                    )
+    final = ProcessSample(pid)
+    print(f"server peak RSS {final.peak / 2**20:.1f} MB")
+
+
+def _csv(cast):
+    return lambda value: [cast(v) for v in value.split(",") if v]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", type=_csv(str), default=["preview", "resize", "assistant", "conversion"],
+                        help=f"comma separated, from {', '.join(ENDPOINTS)}")
+    parser.add_argument("--sizes", type=_csv(str), default=list(CORPUS_SIZES), help="comma separated corpus sizes")
+    parser.add_argument("--concurrency", type=_csv(int), default=[1, 8, 32], help="comma separated client counts")
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint/size/concurrency")
+    parser.add_argument("--openai-latency", default="lognormal:1.5,0.4")
+    parser.add_argument("--gemini-latency", default="lognormal:3,0.4")
+    parser.add_argument("--replay", help="answer from a recordings file")
+    parser.add_argument("--record", help="use the real providers and append their responses here")
+    parser.add_argument("--cache", action="store_true", help="keep the response cache enabled")
+    parser.add_argument("--timeout", type=float, default=300, help="client timeout per request (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server-log", help="write the server's output here instead of discarding it")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    unknown = set(args.endpoints) - set(ENDPOINTS) or set(args.sizes) - set(CORPUS_SIZES)
+    if unknown:
+        parser.error(f"unknown endpoint or size: {', '.join(sorted(unknown))}")
+
+    if args.serve:
+        serve(args)
+    else:
+        server, url = start_server(args)
+        try:
+            asyncio.run(bench(args, server.pid, url))
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
@@ -0,0 +1,90 @@
+"""
+Response serialization cost for FabricOutput at 10/100/1000 objects.
+
+    python benchmarks/serialization.py [--iterations 50]
+
+Compares what FastAPI does with a returned model under response_model
+(dump to dict, validate again, then encode) with FastJSONResponse, which
+encodes the already-validated model's fields with orjson:
+
+- fastapi (stdlib): validate + jsonable_encoder + json.dumps (FastAPI < 0.119)
+- fastapi (pydantic): validate + pydantic dump_json (newer FastAPI)
+- fast_json: orjson over the model as built
+
+Every tenth object is an image with an embedded ~40 KB data URL.
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.schemas import FabricOutput
+from app.services.fast_json import dumps
+
+SIZES = (10, 100, 1000)
+
+
+def fabric_output(count: int, rng: random.Random) -> FabricOutput:
+    data_url = "data:image/jpeg;base64," + base64.b64encode(rng.randbytes(30_000)).decode("ascii")
+    objects = []
+    for index in range(count):
+        common = {"left": rng.uniform(0, 1000), "top": rng.uniform(0, 1000), "originX": "left", "originY": "top",
+                  "angle": 0, "opacity": 1}
+        if index % 10 == 9:
+            objects.append({"type": "image", "src": data_url, "width": 400, "height": 300, "scaleX": 0.5,
+                            "scaleY": 0.5, **common})
+        elif index % 2:
+            objects.append({"type": "textbox", "text": f"Headline {index}", "width": 360, "fontSize": 32,
+                            "fontFamily": "Montserrat", "fill": "#1f2937", "fontWeight": "bold",
+                            "textAlign": "left", "lineHeight": 1.16, **common})
+        else:
+            objects.append({"type": "rect", "width": rng.uniform(20, 400), "height": rng.uniform(20, 400),
+                            "fill": {"type": "linear", "coords": {"x1": 0, "y1": 0, "x2": 100, "y2": 0},
+                                     "colorStops": [{"offset": 0, "color": "#f97316"}, {"offset": 1, "color": "#facc15"}]},
+                            "rx": 8, "ry": 8, "strokeWidth": 0, **common})
+    return FabricOutput(version="6.0.2", width=1080, height=1080, background="#ffffff", objects=objects)
+
+
+def main(iterations: int):
+    adapter = TypeAdapter(FabricOutput)
+
+    def fastapi_stdlib(model):
+        value = adapter.validate_python(model.model_dump())
+        return json.dumps(jsonable_encoder(value), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def fastapi_pydantic(model):
+        return adapter.dump_json(adapter.validate_python(model.model_dump()))
+
+    paths = {"fastapi (stdlib)": fastapi_stdlib, "fastapi (pydantic)": fastapi_pydantic, "fast_json": dumps}
+    rng = random.Random(0)
+    print(f"{'objects':>7} {'bytes':>10}  " + "  ".join(f"{name:>18}" for name in paths))
+    for count in SIZES:
+        model = fabric_output(count, rng)
+        expected = json.loads(fastapi_stdlib(model))
+        row = []
+        for name, path in paths.items():
+            assert json.loads(path(model)) == expected, name
+            samples = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                path(model)
+                samples.append(time.perf_counter() - start)
+            row.append(statistics.median(samples))
+        size = len(dumps(model))
+        print(f"{count:>7} {size:>10}  " + "  ".join(f"{seconds * 1000:>15.2f} ms" for seconds in row))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50, help="timed serializations per path and size")
+    main(parser.parse_args().iterations)
@@ -0,0 +1,96 @@
+"""
+Startup and per-request chain construction benchmark.
+
+    python benchmarks/startup.py [--runs 5] [--iterations 200]
+
+1. Cold `import app.main` in a fresh interpreter (what a worker pays on boot).
+2. First use of a chain: provider SDK import + client + structured-output wrapper.
+3. Per-request cost of rebuilding prompt + structured-output chain (the old
+   behaviour) versus looking up the chain prebuilt on LLMService.
+
+No network calls are made; dummy credentials are used when none are set.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DUMMY_ENV = {"OPENAI_API_KEY": "sk-benchmark", "GOOGLE_CLOUD_PROJECT": "benchmark"}
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import app.main
+print(time.perf_counter() - start)
+"""
+
+FIRST_CHAIN_SNIPPET = """
+import time
+from app.main import llm_service
+start = time.perf_counter()
+llm_service.chain("conversion")
+llm_service.chain("resize")
+print(time.perf_counter() - start)
+"""
+
+
+def _subprocess_seconds(snippet: str, env: dict) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", snippet], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _median_ms(samples: list[float]) -> str:
+    return f"{statistics.median(samples) * 1000:9.1f} ms"
+
+
+def bench_cold(runs: int):
+    with_creds = {**os.environ, **{k: os.environ.get(k) or v for k, v in DUMMY_ENV.items()}}
+    without_creds = {k: v for k, v in os.environ.items() if k not in DUMMY_ENV}
+    # Keep .env out of the credential-free run
+    without_creds["OPENAI_API_KEY"] = ""
+
+    imports = [_subprocess_seconds(IMPORT_SNIPPET, without_creds) for _ in range(runs)]
+    print(f"import app.main (no credentials)   {_median_ms(imports)}")
+    first = [_subprocess_seconds(FIRST_CHAIN_SNIPPET, with_creds) for _ in range(runs)]
+    print(f"first chain build (SDKs + clients) {_median_ms(first)}")
+
+
+def bench_per_request(iterations: int):
+    for key, value in DUMMY_ENV.items():
+        os.environ.setdefault(key, value)
+    from app.schemas import ResizeOutput
+    from app.services.llm_service import LLMService, RESIZE_SYSTEM, RESIZE_HUMAN
+    from langchain_core.prompts import ChatPromptTemplate
+
+    service = LLMService()
+    service.chain("resize")
+
+    def rebuild():
+        prompt = ChatPromptTemplate.from_messages([("system", RESIZE_SYSTEM), ("human", RESIZE_HUMAN)])
+        return prompt | service.gemini.with_structured_output(ResizeOutput)
+
+    for label, build in (("rebuild per request", rebuild), ("prebuilt lookup", lambda: service.chain("resize"))):
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            build()
+            samples.append(time.perf_counter() - start)
+        print(f"{label:<34} {statistics.median(samples) * 1e6:9.1f} µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per cold measurement")
+    parser.add_argument("--iterations", type=int, default=200, help="chain constructions per request measurement")
+    args = parser.parse_args()
+
+    bench_cold(args.runs)
+    bench_per_request(args.iterations)
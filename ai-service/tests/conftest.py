@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Offline defaults: no provider credentials, no shared cache between tests
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "")
+os.environ.setdefault("CACHE_ENABLED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,36 @@
+import time
+
+from app.services.chat_history import HTML_PLACEHOLDER, STRIP_MAX_CHARS, strip_html
+
+
+def test_prose_between_blocks_is_kept():
+    text = "Here is v1: <div><p>a</p></div> and I changed the title. Then <div>b</div> done."
+
+    assert strip_html(text) == f"Here is v1: {HTML_PLACEHOLDER} and I changed the title. Then {HTML_PLACEHOLDER} done."
+
+
+def test_nested_document_becomes_one_placeholder():
+    text = ('<!DOCTYPE html><html><body><div><div>x</div><img src="a.png"><br><p>y</p></div>'
+            "</body></html> Made it blue.")
+
+    assert strip_html(text) == f"{HTML_PLACEHOLDER} Made it blue."
+
+
+def test_void_and_stray_tags_leave_nothing_behind():
+    text = 'Logo: <img src="https://assets.example.com/logo.png"> then </div> and 3 < 5 > 2.'
+
+    assert strip_html(text) == f"Logo: {HTML_PLACEHOLDER} then {HTML_PLACEHOLDER} and 3 < 5 > 2."
+
+
+def test_fenced_html_is_replaced():
+    text = "Before ```html\n<div>x</div>\n``` middle <span>q</span> end"
+
+    assert strip_html(text) == f"Before {HTML_PLACEHOLDER} middle {HTML_PLACEHOLDER} end"
+
+
+def test_unclosed_tags_scan_in_linear_time():
+    for text in ("<p>line " * 40_000, '<img src="x" ' * 40_000, "<p line " * 40_000):
+        start = time.perf_counter()
+        stripped = strip_html(text)
+        assert time.perf_counter() - start < 0.5
+        assert len(stripped) <= STRIP_MAX_CHARS + 1
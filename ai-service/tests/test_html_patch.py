@@ -0,0 +1,36 @@
+import pytest
+
+from app.schemas import EditOperation
+from app.services.html_patch import PatchError, annotate, apply_patch
+
+DESIGN = ('<div style="position:relative;width:400px;height:300px">'
+          "<style>@import url('https://fonts.googleapis.com/css2?family=Roboto&display=swap');"
+          ".stage > p { font-family: Roboto; }</style>"
+          '<img src="https://assets.example.com/logo.png" style="position:absolute;left:0;top:0" />'
+          '<p style="position:absolute;left:10px;top:80px">Hello</p></div>')
+
+
+def test_empty_patch_round_trips_stylesheet():
+    root, annotated = annotate(DESIGN)
+
+    assert "&display=swap" in annotated and ".stage > p" in annotated
+    assert apply_patch(root, []) == DESIGN
+
+
+def test_update_keeps_stylesheet():
+    root, _ = annotate(DESIGN)
+
+    html = apply_patch(root, [EditOperation(op="update", id="e3", text="Bye")])
+
+    assert html == DESIGN.replace("Hello", "Bye")
+
+
+@pytest.mark.parametrize("operation", [
+    EditOperation(op="insert", id="e2", html="<span>x</span>"),
+    EditOperation(op="update", id="e2", text="x"),
+])
+def test_void_element_content_is_refused(operation):
+    root, _ = annotate(DESIGN)
+
+    with pytest.raises(PatchError):
+        apply_patch(root, [operation])
@@ -0,0 +1,34 @@
+from app.services.html_tree import parse_html
+from app.services.html_validator import validate_design
+
+STYLE = ("<style>@import url('https://fonts.googleapis.com/css2?family=Roboto&display=swap');"
+         ".s > p { content: \"a < b\"; }</style>")
+
+
+def stage(body: str, style: str = "position:relative;width:400px;height:300px") -> str:
+    return f'<div style="{style}">{STYLE}{body}</div>'
+
+
+def test_style_text_is_serialized_raw():
+    html = stage('<p style="position:absolute;left:0;top:0">Tom &amp; Jerry</p>')
+
+    assert parse_html(html).to_html() == html
+
+
+def test_valid_design_is_returned_unchanged():
+    html = stage('<p style="position:absolute;left:0;top:0">Tom &amp; Jerry</p>')
+
+    result = validate_design(html, 400, 300)
+
+    assert result.outcome == "valid"
+    assert result.html is html
+
+
+def test_repaired_design_keeps_its_stylesheet():
+    html = stage('<p style="left:10px;top:10px">Hi</p>')
+
+    result = validate_design(html, 400, 300)
+
+    assert result.outcome == "repaired"
+    assert STYLE in result.html
+    assert "position:absolute" in result.html.replace(" ", "")
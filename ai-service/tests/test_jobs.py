@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+from app.services.jobs import Job, JobStore, MemoryJobStore, SqliteJobStore
+
+
+def test_incomplete_store_fails_at_construction():
+    class PutOnly(JobStore):
+        async def put(self, job):
+            pass
+
+    with pytest.raises(TypeError):
+        PutOnly()
+
+
+@pytest.mark.parametrize("store", ["memory", "sqlite"])
+def test_store_round_trip(store, tmp_path):
+    store = MemoryJobStore() if store == "memory" else SqliteJobStore(str(tmp_path / "jobs.sqlite3"))
+    job = Job(id="job-1", kind="conversion", expires_at=10.0)
+
+    async def run():
+        await store.put(job)
+        stored = await store.get(job.id)
+        expired = await store.expired(20.0)
+        await store.delete(job.id)
+        return stored, expired, await store.get(job.id)
+
+    stored, expired, deleted = asyncio.run(run())
+    assert stored.id == job.id and stored.kind == "conversion"
+    assert expired == [job.id]
+    assert deleted is None
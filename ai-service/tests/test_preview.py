@@ -0,0 +1,26 @@
+import asyncio
+
+from app.services.llm_service import LLMService
+
+BACKGROUND = {"type": "image", "left": 0, "top": 0, "width": 400, "height": 300, "scaleX": 1, "scaleY": 1,
+              "src": "https://assets.example.com/background.jpg"}
+RECT = {"type": "rect", "left": 20, "top": 30, "width": 100, "height": 50, "scaleX": 1, "scaleY": 1, "fill": "#f97316"}
+
+
+def test_preview_with_background_image():
+    service = LLMService()
+    canvas = {"width": 400, "height": 300, "background": "#ffffff", "backgroundImage": BACKGROUND, "objects": [RECT]}
+
+    html = asyncio.run(service.generate_from_canvas(canvas))
+
+    assert "background.jpg" in html
+    assert "#f97316" in html
+    assert service.fragment_counts["compiled"] == 2
+
+
+def test_preview_with_only_a_background_image():
+    canvas = {"width": 400, "height": 300, "backgroundImage": BACKGROUND, "objects": []}
+
+    html = asyncio.run(LLMService().generate_from_canvas(canvas))
+
+    assert "background.jpg" in html
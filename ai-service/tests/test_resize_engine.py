@@ -0,0 +1,14 @@
+from app.services.resize_engine import proportional_resize
+
+STYLE = ("<style>@import url('https://fonts.googleapis.com/css2?family=Roboto&display=swap');"
+         ".stage > p { font-family: Roboto; }</style>")
+DESIGN = (f'<div style="position:relative;width:400px;height:300px">{STYLE}'
+          '<p style="position:absolute;left:40px;top:30px;font-size:20px">Hi</p></div>')
+
+
+def test_resize_keeps_stylesheet():
+    html = proportional_resize(DESIGN, 800, 600)
+
+    assert STYLE in html
+    assert "width:800px" in html.replace(" ", "")
+    assert "font-size:40px" in html.replace(" ", "")